@@ -1,12 +1,20 @@
 #!/usr/bin/env python
 """
 Script de preparação para testes da Fase 2 - MQTT Consumer
-Cria dados de teste: Gateway + Dispositivos
+Cria dados de teste: Gateway + Dispositivos (+ leituras históricas opcionais)
+
+Uso:
+    python criar_dados_teste_fase2.py
+    python criar_dados_teste_fase2.py --leituras 10000   # leituras via COPY
 """
 
+import argparse
 import os
+import random
 import sys
 import django
+from datetime import timedelta
+from decimal import Decimal
 
 # Setup Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'prj_tds_new.settings')
@@ -14,11 +22,40 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 django.setup()
 
 from django.contrib.auth import get_user_model
-from tds_new.models import Conta, Gateway, Dispositivo
+from django.utils import timezone
+from tds_new.models import Conta, Gateway, Dispositivo, LeituraDispositivo
 
 User = get_user_model()
 
-def criar_dados_teste():
+def criar_leituras_exemplo(conta, gateway, dispositivos, quantidade):
+    """
+    Gera leituras históricas (1 por minuto, round-robin) gravadas via COPY
+
+    Rodar de novo sobre uma janela já populada repete chaves (dispositivo_id,
+    time): as duplicadas são ignoradas (índice único) em vez de abortar o COPY.
+
+    Returns:
+        int: Leituras efetivamente inseridas
+    """
+    agora = timezone.now().replace(second=0, microsecond=0)
+    unidades = {'MEDIDOR': 'kWh', 'SENSOR': '°C'}
+    
+    def gerar():
+        for i in range(quantidade):
+            dispositivo = dispositivos[i % len(dispositivos)]
+            yield LeituraDispositivo(
+                time=agora - timedelta(minutes=quantidade - i),
+                conta_id=conta.id,
+                gateway_id=gateway.id,
+                dispositivo_id=dispositivo.id,
+                valor=Decimal(str(round(random.uniform(10, 500), 2))),
+                unidade=unidades.get(dispositivo.tipo, 'unit'),
+            )
+    
+    return LeituraDispositivo.copy_bulk(gerar(), ignorar_duplicadas=True)
+
+
+def criar_dados_teste(leituras=0):
     """Cria dados de teste para validação do MQTT Consumer"""
     
     print("=" * 80)
@@ -27,7 +64,7 @@ def criar_dados_teste():
     print()
     
     # 1. Verificar/Criar Superuser
-    print("[1/4] Verificando superuser...")
+    print("[1/5] Verificando superuser...")
     try:
         user = User.objects.get(username='admin')
         print(f"  ✓ Superuser existe: {user.email}")
@@ -40,7 +77,7 @@ def criar_dados_teste():
         print(f"  ✓ Superuser criado: {user.email}")
     
     # 2. Verificar/Criar Conta
-    print("[2/4] Verificando conta...")
+    print("[2/5] Verificando conta...")
     conta, created = Conta.objects.get_or_create(
         name='Conta Teste Telemetria',
         defaults={
@@ -53,7 +90,7 @@ def criar_dados_teste():
         print(f"  ✓ Conta existe: {conta.name} (ID: {conta.id})")
     
     # 3. Verificar/Criar Gateway
-    print("[3/4] Verificando gateway...")
+    print("[3/5] Verificando gateway...")
     mac_address = 'aa:bb:cc:dd:ee:ff'
     gateway, created = Gateway.objects.get_or_create(
         mac=mac_address,
@@ -74,7 +111,7 @@ def criar_dados_teste():
         print(f"    Status: {'Online' if gateway.is_online else 'Offline'}")
     
     # 4. Verificar/Criar Dispositivos
-    print("[4/4] Verificando dispositivos...")
+    print("[4/5] Verificando dispositivos...")
     dispositivos_config = [
         {
             'codigo': 'D01',
@@ -127,6 +164,14 @@ def criar_dados_teste():
             print(f"  ✓ Dispositivo existe: {dispositivo.codigo} - {dispositivo.nome}")
         dispositivos_criados.append(dispositivo)
     
+    # 5. Leituras históricas (opcional)
+    print("[5/5] Leituras de exemplo...")
+    if leituras > 0:
+        total = criar_leituras_exemplo(conta, gateway, dispositivos_criados, leituras)
+        print(f"  ✓ {total} leituras gravadas via COPY ({leituras - total} duplicadas ignoradas)")
+    else:
+        print("  - Ignorado (use --leituras N para gerar)")
+    
     print()
     print("=" * 80)
     print("DADOS DE TESTE CRIADOS COM SUCESSO!")
@@ -147,8 +192,13 @@ def criar_dados_teste():
     print()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cria dados de teste da Fase 2')
+    parser.add_argument('--leituras', type=int, default=0,
+                        help='Quantidade de leituras históricas a gerar via COPY (padrão: 0)')
+    args = parser.parse_args()
+    
     try:
-        criar_dados_teste()
+        criar_dados_teste(leituras=args.leituras)
     except Exception as e:
         print(f"\n❌ ERRO: {e}")
         import traceback
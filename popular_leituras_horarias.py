@@ -45,7 +45,7 @@ LeituraDispositivo.objects.filter(
 ).delete()
 print("✓ Leituras antigas removidas\n")
 
-leituras_criadas = 0
+leituras = []
 hora_atual = hora_inicial
 
 while hora_atual <= hora_final:
@@ -62,8 +62,8 @@ while hora_atual <= hora_final:
         import random
         valor += random.uniform(-0.5, 0.5)
         
-        # Criar leitura
-        leitura = LeituraDispositivo.objects.create(
+        # Preparar leitura (gravada em lote via COPY ao final)
+        leitura = LeituraDispositivo(
             conta=conta,
             gateway=gateway,
             dispositivo=dispositivo,
@@ -72,13 +72,16 @@ while hora_atual <= hora_final:
             valor=Decimal(str(round(valor, 2))),
             payload_raw={'test': 'data'}
         )
-        leituras_criadas += 1
+        leituras.append(leitura)
         print(f"  {codigo} | {config['unidade']}: {leitura.valor}")
     
     print()
     hora_atual += timedelta(hours=1)
 
+# Reexecução na mesma janela repete (dispositivo_id, time): duplicadas ignoradas
+leituras_criadas = LeituraDispositivo.copy_bulk(leituras, ignorar_duplicadas=True)
+
 print(f"=== CONCLUÍDO ===")
-print(f"Total de leituras criadas: {leituras_criadas}")
+print(f"Total de leituras criadas: {leituras_criadas} ({len(leituras) - leituras_criadas} duplicadas ignoradas)")
 print(f"Horas populadas: {int((hora_final - hora_inicial).total_seconds() / 3600) + 1}")
 print(f"\nAgora o gráfico terá grid vertical a cada hora de {hora_inicial.strftime('%H:00')} até {hora_final.strftime('%H:00')}")
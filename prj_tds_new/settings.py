@@ -292,7 +292,7 @@ CSRF_COOKIE_SECURE = env.bool('CSRF_COOKIE_SECURE', default=False)
 # =============================================================================
 
 LANGUAGE_CODE = 'pt-br'
-TIME_ZONE = 'America/Sao_Paulo'
+TIME_ZONE = 'America/Sao_Paulo'  # Também o dia do agregado diário (scripts/create_consumo_horario_diario.sql)
 USE_I18N = True
 USE_TZ = True
 USE_THOUSAND_SEPARATOR = True
@@ -607,6 +607,149 @@ MQTT_KEYFILE = env('MQTT_KEYFILE', default='/app/certs/django-consumer-key.pem')
 # Keepalive (em segundos)
 MQTT_KEEPALIVE = env.int('MQTT_KEEPALIVE', default=60)
 
+# Escala horizontal do consumer: client ID = <prefixo>-<hostname>-<instância|pid>
+# e subscription $share/<grupo>/tds_new/devices/+/telemetry (broker reparte as
+# mensagens entre os consumers do grupo). Grupo vazio = subscription comum.
+MQTT_CLIENT_ID_PREFIX = env('MQTT_CLIENT_ID_PREFIX', default='django_tds_new_consumer')
+MQTT_SHARED_GROUP = env('MQTT_SHARED_GROUP', default='tds_new_consumers')
+
+# Presença: o consumer também assina tds_new/devices/+/status (LWT "offline",
+# birth "online" e heartbeats do gateway). Atualiza last_seen/is_online pelo
+# liveness writer, sem gravar leituras.
+MQTT_SUBSCRIBE_STATUS = env.bool('MQTT_SUBSCRIBE_STATUS', default=True)
+
+# Telemetria compacta: tds_new/devices/+/telemetry/cbor e .../msgpack com o
+# schema posicional [ts_epoch, [[codigo, valor, unidade], ...]].
+# Decodificadores: cbor2 e msgpack (requirements.txt); um formato cuja
+# biblioteca não importa não é assinado.
+MQTT_SUBSCRIBE_COMPACT = env.bool('MQTT_SUBSCRIBE_COMPACT', default=True)
+
+# Sessão durável: clean_session=False + PUBACK só após o commit das leituras
+# (at-least-once; sobrevive a crash entre recebimento e gravação). Com batch,
+# aumente max_inflight_messages no mosquitto.conf (padrão 20) para algo acima
+# de mensagens/s × TELEMETRY_BATCH_MAX_MS, senão o broker segura as entregas.
+MQTT_DURABLE_SESSION = env.bool('MQTT_DURABLE_SESSION', default=False)
+
+# Pool de workers do consumer: on_message apenas enfileira; N threads gravam.
+# 0 workers = processamento inline na thread de rede (comportamento antigo).
+MQTT_CONSUMER_WORKERS = env.int('MQTT_CONSUMER_WORKERS', default=4)
+MQTT_CONSUMER_QUEUE_SIZE = env.int('MQTT_CONSUMER_QUEUE_SIZE', default=10000)
+# Fila cheia: 'block' (espera, sem perda) ou 'drop' (descarta a mensagem nova;
+# incompatível com MQTT_DURABLE_SESSION)
+MQTT_CONSUMER_QUEUE_POLICY = env('MQTT_CONSUMER_QUEUE_POLICY', default='block')
+
+# Engine do consumer: 'paho' (padrão) ou 'asyncio' (aiomqtt, em requirements.txt).
+# Na engine asyncio, MQTT_ASYNC_BROKERS lista brokers e grupos de topics
+# (JSON: [{"host": "b1", "port": 1883, "topics": ["tds_new/devices/+/telemetry"]}];
+# vazio = MQTT_BROKER_HOST) e MQTT_ASYNC_CONNECTIONS conexões por broker.
+# MQTT_CONSUMER_QUEUE_SIZE limita as mensagens em processamento e a fila de
+# entrada de cada conexão; com a fila cheia a mensagem é descartada (o PUBACK
+# já foi enviado). Sem perda sob sobrecarga só com paho + --durable.
+MQTT_CONSUMER_ENGINE = env('MQTT_CONSUMER_ENGINE', default='paho')
+MQTT_ASYNC_BROKERS = env.json('MQTT_ASYNC_BROKERS', default=[])
+MQTT_ASYNC_CONNECTIONS = env.int('MQTT_ASYNC_CONNECTIONS', default=1)
+
+# =============================================================================
+# TELEMETRIA — INGESTÃO (consumer MQTT)
+# =============================================================================
+# TTL (segundos) do cache process-local de lookup (gateway, codigo) → dispositivo.
+# Signals de Dispositivo invalidam o cache antes do TTL no mesmo processo.
+TELEMETRY_LOOKUP_CACHE_TTL = env.int('TELEMETRY_LOOKUP_CACHE_TTL', default=300)
+# TTL (segundos) das entradas negativas (MAC não cadastrado) do cache de gateways.
+TELEMETRY_LOOKUP_NEGATIVE_TTL = env.int('TELEMETRY_LOOKUP_NEGATIVE_TTL', default=60)
+# Com USE_REDIS=True, os signals publicam invalidações no canal
+# 'tds_new:lookup_cache:invalidar', consumido pelo processo do consumer MQTT.
+
+# Micro-batching: leituras de várias mensagens são gravadas em um único commit.
+# Flush ao atingir BATCH_SIZE linhas ou BATCH_MAX_MS ms (o que vier primeiro).
+TELEMETRY_BATCH_SIZE = env.int('TELEMETRY_BATCH_SIZE', default=500)
+TELEMETRY_BATCH_MAX_MS = env.int('TELEMETRY_BATCH_MAX_MS', default=1000)
+# Backpressure: acima deste número de linhas pendentes os produtores bloqueiam.
+TELEMETRY_BATCH_MAX_PENDENTES = env.int('TELEMETRY_BATCH_MAX_PENDENTES', default=20000)
+# Tentativas de gravação de um lote antes de descartá-lo (erro logado).
+TELEMETRY_BATCH_MAX_RETRIES = env.int('TELEMETRY_BATCH_MAX_RETRIES', default=3)
+# last_seen/is_online de gateways e dispositivos: coalescido em memória e gravado
+# a cada N s em um UPDATE ... FROM (VALUES ...) por tabela (sem save()/full_clean)
+TELEMETRY_LIVENESS_FLUSH_S = env.int('TELEMETRY_LIVENESS_FLUSH_S', default=5)
+# Silêncio (s) até gateway/dispositivo ser marcado offline. O consumer varre um
+# min-heap de prazos a cada TELEMETRY_OFFLINE_SWEEP_S (caminho oficial) e
+# publica um heartbeat no cache. A task Celery tds_new.marcar_offline (a cada
+# minuto) só faz a varredura completa sem heartbeat (nenhum consumer no ar) ou
+# uma vez a cada TELEMETRY_OFFLINE_RECONCILIACAO_S. Requer cache compartilhado
+# (Redis/DatabaseCache); com LocMem a task varre a cada minuto.
+TELEMETRY_OFFLINE_GATEWAY_S = env.int('TELEMETRY_OFFLINE_GATEWAY_S', default=300)
+TELEMETRY_OFFLINE_DISPOSITIVO_S = env.int('TELEMETRY_OFFLINE_DISPOSITIVO_S', default=600)
+TELEMETRY_OFFLINE_SWEEP_S = env.int('TELEMETRY_OFFLINE_SWEEP_S', default=5)
+TELEMETRY_OFFLINE_RECONCILIACAO_S = env.int('TELEMETRY_OFFLINE_RECONCILIACAO_S', default=3600)
+# Auditoria do payload (substitui o payload_raw por leitura na hypertable):
+# off | on_error_only | sampled:N | full. Mensagens auditadas vão comprimidas
+# (zlib) para tds_new_payload_telemetria, uma linha por mensagem.
+# Override por conta: TELEMETRY_PAYLOAD_RAW_POR_CONTA='{"12": "full"}'.
+TELEMETRY_PAYLOAD_RAW = env('TELEMETRY_PAYLOAD_RAW', default='on_error_only')
+TELEMETRY_PAYLOAD_RAW_POR_CONTA = env.json('TELEMETRY_PAYLOAD_RAW_POR_CONTA', default={})
+TELEMETRY_PAYLOAD_AUDIT_FLUSH_S = env.int('TELEMETRY_PAYLOAD_AUDIT_FLUSH_S', default=5)
+TELEMETRY_PAYLOAD_AUDIT_ZLIB_LEVEL = env.int('TELEMETRY_PAYLOAD_AUDIT_ZLIB_LEVEL', default=6)
+# Formato do COPY FROM STDIN usado na gravação das leituras: 'text' ou 'binary'.
+TELEMETRY_COPY_FORMAT = env('TELEMETRY_COPY_FORMAT', default='text')
+
+# Decoder do payload JSON: auto (msgspec > orjson > json), msgspec, orjson ou json
+TELEMETRY_JSON_DECODER = env('TELEMETRY_JSON_DECODER', default='auto')
+
+# Idempotência em (dispositivo_id, time): COPY via staging + INSERT ... ON CONFLICT
+# DO NOTHING (requer scripts/add_unique_leitura_dispositivo_time.sql) e LRU
+# process-local das chaves recém-gravadas (0 desabilita o LRU)
+TELEMETRY_DEDUP_ON_CONFLICT = env.bool('TELEMETRY_DEDUP_ON_CONFLICT', default=True)
+TELEMETRY_DEDUP_LRU_SIZE = env.int('TELEMETRY_DEDUP_LRU_SIZE', default=100000)
+
+# Cache de últimas leituras mantido pela ingestão após cada commit: N leituras
+# mais recentes por conta + último valor por dispositivo (Redis com USE_REDIS,
+# senão o cache 'default' do Django). As APIs do dashboard só consultam a
+# hypertable no miss. 0 desabilita; TTL expira contas sem leituras.
+TELEMETRY_ULTIMAS_LEITURAS_N = env.int('TELEMETRY_ULTIMAS_LEITURAS_N', default=200)
+TELEMETRY_ULTIMAS_LEITURAS_TTL = env.int('TELEMETRY_ULTIMAS_LEITURAS_TTL', default=86400)
+
+# Dashboard em tempo real (SSE em /tds_new/telemetria/api/stream/): a ingestão
+# publica cada lote commitado no canal Redis tds_new:telemetria:<conta_id> e o
+# processo web repassa aos streams abertos. Requer USE_REDIS e servidor ASGI
+# (gunicorn -k uvicorn_worker.UvicornWorker prj_tds_new.asgi:application, ver
+# README "Produção"); sob WSGI o endpoint responde 204 e o dashboard usa polling.
+TELEMETRY_SSE_HEARTBEAT_S = env.int('TELEMETRY_SSE_HEARTBEAT_S', default=15)
+TELEMETRY_SSE_FILA = env.int('TELEMETRY_SSE_FILA', default=256)
+
+# =============================================================================
+# TIMESCALEDB — POLÍTICAS DA HYPERTABLE (manage.py timescale_policies)
+# =============================================================================
+# Aplicadas de forma declarativa: o comando compara com o banco e só altera o
+# que divergir. Intervalos em sintaxe PostgreSQL ('1 day', '6 hours', ...).
+# Vazio desabilita a política correspondente.
+# Intervalo dos chunks novos (os existentes não mudam)
+TIMESCALE_CHUNK_INTERVAL = env('TIMESCALE_CHUNK_INTERVAL', default='1 day')
+# Compressão nativa (segmentby dispositivo_id, orderby time DESC) dos chunks
+# mais antigos que este intervalo
+TIMESCALE_COMPRESS_AFTER = env('TIMESCALE_COMPRESS_AFTER', default='7 days')
+# Retenção das leituras brutas. Downsampling: os continuous aggregates mantêm
+# o histórico agregado após o drop dos chunks brutos (a janela de refresh deles
+# precisa ser menor que a retenção; o comando valida)
+TIMESCALE_RETENTION = env('TIMESCALE_RETENTION', default='')
+# Retenção por continuous aggregate, ex.:
+# '{"tds_new_consumo_horario": "90 days", "tds_new_consumo_diario": "5 years",
+#   "tds_new_consumo_mensal": "10 years"}'
+TIMESCALE_CAGG_RETENTION = env.json('TIMESCALE_CAGG_RETENTION', default={})
+# Tamanho-alvo de um chunk (dados + índices) para a sugestão de intervalo do
+# relatório. 0 = shared_buffers do PostgreSQL
+TIMESCALE_CHUNK_TARGET_MB = env.int('TIMESCALE_CHUNK_TARGET_MB', default=0)
+# Roteador de consultas (tds_new/services/query_router.py): validade em cache
+# da marca d'água (último bucket materializado) dos agregados horário/diário
+TELEMETRY_ROUTER_WATERMARK_TTL_S = env.int('TELEMETRY_ROUTER_WATERMARK_TTL_S', default=60)
+# Widgets de resumo do dashboard (total, dispositivos ativos, gateways online):
+# memoizados no cache 'default' por (conta, período, dispositivos)
+TELEMETRY_RESUMO_TTL_S = env.int('TELEMETRY_RESUMO_TTL_S', default=5)
+# Timeline com ?max_points=N (série detalhada reduzida por LTTB): teto de N
+TELEMETRY_TIMELINE_MAX_POINTS = env.int('TELEMETRY_TIMELINE_MAX_POINTS', default=1000)
+# Exportação de leituras (telemetria/exportar/ e manage.py exportar_leituras):
+# linhas por fetch do cursor nomeado e por bloco enviado
+TELEMETRY_EXPORT_CHUNK = env.int('TELEMETRY_EXPORT_CHUNK', default=5000)
+
 # =============================================================================
 # PKI — CERTIFICATE AUTHORITY (assinatura de certificados de dispositivos IoT)
 # =============================================================================
@@ -674,4 +817,10 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'tds_new.alertar_renovacoes_pendentes',
         'schedule': crontab(minute=0),  # minuto 0 de cada hora
     },
+    # Fallback do sweeper do consumer: varre a tabela só sem consumer no ar
+    # (ou na reconciliação horária); ver tds_new.services.liveness
+    'marcar-offline': {
+        'task': 'tds_new.marcar_offline',
+        'schedule': crontab(),  # todo minuto
+    },
 }
@@ -0,0 +1,51 @@
+-- =====================================================================
+-- Script: Unicidade de (dispositivo_id, time) em leitura_dispositivo
+-- =====================================================================
+-- Descrição: Remove leituras duplicadas (reentregas QoS 1 / retries do
+--            gateway) e cria índice único usado pelo ON CONFLICT DO NOTHING
+--            de LeituraDispositivo.copy_bulk(ignorar_duplicadas=True)
+-- Data: 2026-10-17
+--
+-- Comando: psql -U tsdb_django_d4j7g9 -d db_tds_new -f scripts/add_unique_leitura_dispositivo_time.sql
+-- =====================================================================
+
+-- 0. (Somente se houver chunks comprimidos e o DELETE/CREATE INDEX falhar)
+--    Descomprimir, aplicar o script e recomprimir depois:
+-- SELECT decompress_chunk(c, true) FROM show_chunks('tds_new_leitura_dispositivo') c;
+
+-- 1. Quantificar duplicatas antes da limpeza
+SELECT COUNT(*) AS linhas_duplicadas
+FROM (
+    SELECT dispositivo_id, time, COUNT(*) AS n
+    FROM tds_new_leitura_dispositivo
+    GROUP BY dispositivo_id, time
+    HAVING COUNT(*) > 1
+) d;
+
+-- 2. Manter apenas a primeira leitura (menor id) de cada (dispositivo_id, time)
+DELETE FROM tds_new_leitura_dispositivo l
+USING (
+    SELECT dispositivo_id, time, MIN(id) AS manter
+    FROM tds_new_leitura_dispositivo
+    GROUP BY dispositivo_id, time
+    HAVING COUNT(*) > 1
+) d
+WHERE l.dispositivo_id = d.dispositivo_id
+  AND l.time = d.time
+  AND l.id <> d.manter;
+
+-- 3. Índice único (inclui a coluna de particionamento, exigência da hypertable)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_leitura_dispositivo_time
+    ON tds_new_leitura_dispositivo (dispositivo_id, time);
+
+-- 4. Recalcular o continuous aggregate (SUM(valor) inflado pelas duplicatas)
+CALL refresh_continuous_aggregate('tds_new_consumo_mensal', NULL, NULL);
+
+-- 5. Recomprimir chunks elegíveis (se o passo 0 foi executado)
+-- SELECT compress_chunk(c, true)
+-- FROM show_chunks('tds_new_leitura_dispositivo', older_than => INTERVAL '7 days') c;
+
+-- Verificação
+SELECT indexname, indexdef
+FROM pg_indexes
+WHERE tablename = 'tds_new_leitura_dispositivo' AND indexname = 'uq_leitura_dispositivo_time';
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark: LeituraDispositivo.criar_leituras_lote (bulk_create) x copy_bulk (COPY)
+
+Grava N leituras sintéticas com cada estratégia dentro de uma transação que
+é desfeita ao final (o banco não é alterado) e mede linhas/segundo.
+
+Uso:
+    python scripts/benchmark_copy_bulk.py
+    python scripts/benchmark_copy_bulk.py --tamanhos 10000 100000 1000000 --gateway-mac aa:bb:cc:dd:ee:ff
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'prj_tds_new.settings')
+
+import django
+django.setup()
+
+from django.db import transaction
+from django.utils import timezone
+from tds_new.models import Dispositivo, Gateway, LeituraDispositivo
+
+
+def gerar_dados(gateway, dispositivos, quantidade):
+    """Dicts no formato aceito por criar_leituras_lote"""
+    inicio = timezone.now() - timedelta(seconds=quantidade)
+    for i in range(quantidade):
+        yield {
+            'time': inicio + timedelta(seconds=i),
+            'conta_id': gateway.conta_id,
+            'gateway_id': gateway.id,
+            'dispositivo_id': dispositivos[i % len(dispositivos)].id,
+            'valor': Decimal(i % 100000) / 100,
+            'unidade': 'kWh',
+            'payload_raw': {'dispositivo_codigo': 'D01', 'valor': i, 'unidade': 'kWh'},
+        }
+
+
+def medir(nome, funcao):
+    """Executa funcao() em transação desfeita ao final; retorna segundos"""
+    with transaction.atomic():
+        inicio = time.perf_counter()
+        funcao()
+        duracao = time.perf_counter() - inicio
+        transaction.set_rollback(True)
+    return duracao
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bulk_create x COPY')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--gateway-mac', default=None, help='Gateway usado nas leituras (padrão: primeiro)')
+    args = parser.parse_args()
+
+    gateways = Gateway.objects.all()
+    gateway = gateways.get(mac=args.gateway_mac) if args.gateway_mac else gateways.first()
+    if gateway is None:
+        print("❌ Nenhum gateway cadastrado (rode criar_dados_teste_fase2.py)")
+        sys.exit(1)
+
+    dispositivos = list(Dispositivo.objects.filter(gateway=gateway))
+    if not dispositivos:
+        print(f"❌ Gateway {gateway.codigo} sem dispositivos")
+        sys.exit(1)
+
+    print("=" * 80)
+    print(f"BENCHMARK COPY x bulk_create — gateway {gateway.codigo} ({len(dispositivos)} dispositivos)")
+    print("=" * 80)
+    print(f"{'linhas':>10} | {'estratégia':<22} | {'segundos':>9} | {'linhas/s':>12} | {'speedup':>7}")
+    print("-" * 80)
+
+    for quantidade in args.tamanhos:
+        estrategias = [
+            ('criar_leituras_lote', lambda: LeituraDispositivo.criar_leituras_lote(
+                gerar_dados(gateway, dispositivos, quantidade))),
+            ('copy_bulk (text)', lambda: LeituraDispositivo.copy_bulk(
+                (LeituraDispositivo(**d) for d in gerar_dados(gateway, dispositivos, quantidade)),
+                formato='text')),
+            ('copy_bulk (binary)', lambda: LeituraDispositivo.copy_bulk(
+                (LeituraDispositivo(**d) for d in gerar_dados(gateway, dispositivos, quantidade)),
+                formato='binary')),
+        ]
+
+        base = None
+        for nome, funcao in estrategias:
+            duracao = medir(nome, funcao)
+            base = base or duracao
+            print(
+                f"{quantidade:>10,} | {nome:<22} | {duracao:>9.2f} | "
+                f"{quantidade / duracao:>12,.0f} | {base / duracao:>6.1f}x"
+            )
+        print("-" * 80)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark: start_mqtt_consumer --engine paho x --engine asyncio
+
+Para cada engine sobe o consumer em um subprocesso, publica N mensagens de
+telemetria (QoS 1) o mais rápido possível e mede o tempo até todas as
+leituras estarem no banco. As leituras usam instantes no ano 2001 e são
+apagadas ao final de cada rodada.
+
+Requer broker MQTT ativo (settings.MQTT_BROKER_*) e, para asyncio, aiomqtt.
+
+Uso:
+    python scripts/benchmark_mqtt_engines.py
+    python scripts/benchmark_mqtt_engines.py --mensagens 50000 --leituras 8 --connections 4
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'prj_tds_new.settings')
+
+import django
+django.setup()
+
+import paho.mqtt.client as mqtt
+from tds_new.consumers.mqtt_config import MQTTConfig
+from tds_new.models import Dispositivo, Gateway, LeituraDispositivo
+
+INICIO_JANELA = datetime(2001, 1, 1, tzinfo=dt_timezone.utc)
+FIM_JANELA = datetime(2002, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def leituras_janela(gateway):
+    return LeituraDispositivo.objects.filter(
+        gateway_id=gateway.id, time__gte=INICIO_JANELA, time__lt=FIM_JANELA
+    )
+
+
+def publicar(gateway, codigos, quantidade, por_mensagem):
+    """Publica as mensagens (QoS 1) e retorna segundos gastos na publicação"""
+    client = mqtt.Client(client_id=f"benchmark-pub-{os.getpid()}", protocol=mqtt.MQTTv311)
+    if MQTTConfig.BROKER_USER:
+        client.username_pw_set(MQTTConfig.BROKER_USER, MQTTConfig.BROKER_PASSWORD)
+    client.max_inflight_messages_set(1000)
+    client.connect(MQTTConfig.BROKER_HOST, MQTTConfig.BROKER_PORT, MQTTConfig.KEEPALIVE)
+    client.loop_start()
+
+    topic = f"{MQTTConfig.TOPIC_PREFIX}/{gateway.mac}/telemetry"
+    inicio = time.perf_counter()
+    ultima = None
+    for i in range(quantidade):
+        payload = {
+            'gateway_mac': gateway.mac,
+            'timestamp': (INICIO_JANELA + timedelta(seconds=i)).isoformat().replace('+00:00', 'Z'),
+            'leituras': [
+                {'dispositivo_codigo': codigos[j % len(codigos)], 'valor': i % 1000, 'unidade': 'kWh'}
+                for j in range(por_mensagem)
+            ],
+        }
+        ultima = client.publish(topic, json.dumps(payload), qos=1)
+    ultima.wait_for_publish()
+    duracao = time.perf_counter() - inicio
+
+    client.loop_stop()
+    client.disconnect()
+    return duracao
+
+
+def rodar(engine, gateway, codigos, args):
+    """Sobe o consumer, publica e espera as leituras; retorna (segundos, linhas)"""
+    leituras_janela(gateway).delete()
+    esperado = args.mensagens * min(args.leituras, len(codigos))
+
+    comando = [
+        sys.executable, os.path.join(BASE_DIR, 'manage.py'), 'start_mqtt_consumer',
+        '--engine', engine, '--shared-group', f"benchmark_{engine}",
+    ]
+    if engine == 'asyncio':
+        comando += ['--connections', str(args.connections)]
+
+    consumer = subprocess.Popen(comando, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        time.sleep(args.aquecimento)
+        inicio = time.perf_counter()
+        publicar(gateway, codigos, args.mensagens, args.leituras)
+
+        linhas = 0
+        while time.perf_counter() - inicio < args.timeout:
+            linhas = leituras_janela(gateway).count()
+            if linhas >= esperado:
+                break
+            time.sleep(0.2)
+        return time.perf_counter() - inicio, linhas
+    finally:
+        consumer.terminate()
+        consumer.wait(30)
+        leituras_janela(gateway).delete()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark das engines do consumer MQTT')
+    parser.add_argument('--engines', nargs='+', default=['paho', 'asyncio'], choices=['paho', 'asyncio'])
+    parser.add_argument('--mensagens', type=int, default=20_000)
+    parser.add_argument('--leituras', type=int, default=8, help='Leituras por mensagem')
+    parser.add_argument('--connections', type=int, default=4, help='Conexões da engine asyncio')
+    parser.add_argument('--gateway-mac', default=None, help='Gateway usado (padrão: primeiro)')
+    parser.add_argument('--aquecimento', type=float, default=3.0, help='Segundos até o consumer assinar')
+    parser.add_argument('--timeout', type=float, default=300.0)
+    args = parser.parse_args()
+
+    gateways = Gateway.objects.all()
+    gateway = gateways.get(mac=args.gateway_mac) if args.gateway_mac else gateways.first()
+    if gateway is None:
+        print("❌ Nenhum gateway cadastrado (rode criar_dados_teste_fase2.py)")
+        sys.exit(1)
+
+    codigos = list(Dispositivo.objects.filter(gateway=gateway).values_list('codigo', flat=True))
+    if not codigos:
+        print(f"❌ Gateway {gateway.codigo} sem dispositivos")
+        sys.exit(1)
+
+    print("=" * 80)
+    print(f"BENCHMARK ENGINES — {args.mensagens:,} mensagens × {args.leituras} leituras (gateway {gateway.codigo})")
+    print("=" * 80)
+    print(f"{'engine':<10} | {'segundos':>9} | {'msgs/s':>10} | {'linhas/s':>10} | {'linhas':>10}")
+    print("-" * 80)
+
+    for engine in args.engines:
+        duracao, linhas = rodar(engine, gateway, codigos, args)
+        print(
+            f"{engine:<10} | {duracao:>9.2f} | {args.mensagens / duracao:>10,.0f} | "
+            f"{linhas / duracao:>10,.0f} | {linhas:>10,}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: payload JSON x payload compacto (CBOR / MessagePack)
+
+Para as mesmas leituras compara o tamanho no fio (bytes/mensagem) e o custo
+de decode + validação + timestamp por mensagem:
+  - JSON com chaves repetidas (topic .../telemetry, PayloadCodec)
+  - [ts_epoch, [[codigo, valor, unidade], ...]] em CBOR e MessagePack
+    (topics .../telemetry/cbor e .../telemetry/msgpack, decodificar_compacto)
+
+Formatos cuja lib não está instalada (cbor2, msgpack) são ignorados.
+
+Uso:
+    python scripts/benchmark_payload_compacto.py
+    python scripts/benchmark_payload_compacto.py --mensagens 200000 --leituras 32
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'prj_tds_new.settings')
+
+import django
+django.setup()
+
+from tds_new.services import payload_codec
+from tds_new.services.payload_codec import PayloadCodec, decodificar_compacto, parse_timestamp
+
+INICIO = datetime(2026, 2, 18, tzinfo=dt_timezone.utc)
+
+
+def gerar_leituras(quantidade, por_mensagem):
+    """(instante, [(codigo, valor, unidade), ...]) por mensagem"""
+    return [
+        (INICIO + timedelta(seconds=i), [(f"D{j:02d}", 1234.5678 + j, 'kWh') for j in range(por_mensagem)])
+        for i in range(quantidade)
+    ]
+
+
+def codificar_json(instante, leituras):
+    return json.dumps({
+        'gateway_mac': 'aa:bb:cc:dd:ee:ff',
+        'timestamp': instante.isoformat().replace('+00:00', 'Z'),
+        'leituras': [
+            {'dispositivo_codigo': codigo, 'valor': valor, 'unidade': unidade}
+            for codigo, valor, unidade in leituras
+        ],
+    }).encode('utf-8')
+
+
+def codificadores():
+    """Formato → função (instante, leituras) → bytes, para as libs instaladas"""
+    formatos = {'json': codificar_json}
+
+    if payload_codec.cbor2 is not None:
+        formatos['cbor'] = lambda instante, leituras: payload_codec.cbor2.dumps(
+            [int(instante.timestamp()), [list(item) for item in leituras]]
+        )
+    else:
+        print("(cbor2 não instalado — CBOR ignorado)")
+
+    if payload_codec.msgpack is not None:
+        formatos['msgpack'] = lambda instante, leituras: payload_codec.msgpack.packb(
+            [int(instante.timestamp()), [list(item) for item in leituras]]
+        )
+    else:
+        print("(msgpack não instalado — MessagePack ignorado)")
+
+    return formatos
+
+
+def medir(funcao, mensagens):
+    """Retorna microssegundos por mensagem"""
+    parse_timestamp.cache_clear()
+    inicio = time.perf_counter()
+    for dados in mensagens:
+        funcao(dados)
+    return (time.perf_counter() - inicio) / len(mensagens) * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmark de payload JSON x CBOR/MessagePack')
+    parser.add_argument('--mensagens', type=int, default=100_000)
+    parser.add_argument('--leituras', type=int, default=8, help='Leituras por mensagem')
+    args = parser.parse_args()
+
+    leituras = gerar_leituras(args.mensagens, args.leituras)
+    codec = PayloadCodec()
+
+    def fluxo_json(dados):
+        payload = codec.decodificar_telemetria(dados)
+        return parse_timestamp(payload['timestamp']), payload['leituras']
+
+    print("=" * 78)
+    print(f"PAYLOAD JSON x COMPACTO — {args.mensagens:,} mensagens × {args.leituras} leituras")
+    print("=" * 78)
+    print(f"{'formato':<22} | {'bytes/msg':>9} | {'redução':>7} | {'µs/msg':>8} | {'msgs/s':>11} | {'speedup':>7}")
+    print("-" * 78)
+
+    base_bytes = base_micros = None
+    for formato, codificar in codificadores().items():
+        mensagens = [codificar(instante, itens) for instante, itens in leituras]
+        tamanho = sum(len(m) for m in mensagens) / len(mensagens)
+
+        if formato == 'json':
+            nome, funcao = f"json (codec {codec.backend})", fluxo_json
+        else:
+            nome, funcao = formato, lambda dados, formato=formato: decodificar_compacto(dados, formato)
+
+        micros = medir(funcao, mensagens)
+        base_bytes = base_bytes or tamanho
+        base_micros = base_micros or micros
+        print(
+            f"{nome:<22} | {tamanho:>9.0f} | {1 - tamanho / base_bytes:>6.0%} | {micros:>8.2f} | "
+            f"{1_000_000 / micros:>11,.0f} | {base_micros / micros:>6.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: parse + validação de um payload de telemetria por mensagem
+
+Compara o caminho antigo do consumer (json.loads + json.dumps(indent=2) do log
+de debug + validação em loops + replace/fromisoformat) com o PayloadCodec em
+cada backend instalado (json, orjson, msgspec).
+
+Uso:
+    python scripts/benchmark_payload_parse.py
+    python scripts/benchmark_payload_parse.py --mensagens 200000 --leituras 32
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'prj_tds_new.settings')
+
+import django
+django.setup()
+
+from django.utils import timezone
+from tds_new.services import payload_codec
+from tds_new.services.payload_codec import PayloadCodec, parse_timestamp
+
+
+def gerar_mensagens(quantidade, por_mensagem):
+    """Payloads JSON (bytes) com instantes distintos, como chegam do broker"""
+    inicio = datetime(2026, 2, 18, tzinfo=dt_timezone.utc)
+    return [
+        json.dumps({
+            'gateway_mac': 'aa:bb:cc:dd:ee:ff',
+            'timestamp': (inicio + timedelta(seconds=i)).isoformat().replace('+00:00', 'Z'),
+            'leituras': [
+                {'dispositivo_codigo': f"D{j:02d}", 'valor': 1234.5678 + j, 'unidade': 'kWh'}
+                for j in range(por_mensagem)
+            ],
+        }).encode('utf-8')
+        for i in range(quantidade)
+    ]
+
+
+def caminho_legado(dados):
+    """Reprodução do fluxo anterior (on_message + _validar_schema + _parse_timestamp)"""
+    payload = json.loads(dados.decode('utf-8'))
+    json.dumps(payload, indent=2)  # f-string do logger.debug avaliada mesmo sem DEBUG
+
+    for campo in ['gateway_mac', 'timestamp', 'leituras']:
+        if campo not in payload:
+            return None
+    if not isinstance(payload['leituras'], list) or len(payload['leituras']) == 0:
+        return None
+    for item in payload['leituras']:
+        for campo in ['dispositivo_codigo', 'valor', 'unidade']:
+            if campo not in item:
+                return None
+
+    dt = timezone.datetime.fromisoformat(payload['timestamp'].replace('Z', '+00:00'))
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return payload, dt
+
+
+def medir(funcao, mensagens):
+    """Retorna microssegundos por mensagem"""
+    parse_timestamp.cache_clear()
+    inicio = time.perf_counter()
+    for dados in mensagens:
+        funcao(dados)
+    return (time.perf_counter() - inicio) / len(mensagens) * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmark de parse + validação de payload')
+    parser.add_argument('--mensagens', type=int, default=100_000)
+    parser.add_argument('--leituras', type=int, default=8, help='Leituras por mensagem')
+    args = parser.parse_args()
+
+    mensagens = gerar_mensagens(args.mensagens, args.leituras)
+
+    estrategias = [('legado (json + dumps debug)', caminho_legado)]
+    for backend in payload_codec.BACKENDS:
+        try:
+            codec = PayloadCodec(backend)
+        except ValueError:
+            print(f"(backend {backend} não instalado — ignorado)")
+            continue
+
+        def fluxo(dados, codec=codec):
+            payload = codec.decodificar_telemetria(dados)
+            return payload, parse_timestamp(payload['timestamp'])
+
+        estrategias.append((f"codec {backend}", fluxo))
+
+    print("=" * 70)
+    print(f"PARSE + VALIDAÇÃO — {args.mensagens:,} mensagens × {args.leituras} leituras")
+    print("=" * 70)
+    print(f"{'estratégia':<30} | {'µs/msg':>9} | {'msgs/s':>12} | {'speedup':>7}")
+    print("-" * 70)
+
+    base = None
+    for nome, funcao in estrategias:
+        micros = medir(funcao, mensagens)
+        base = base or micros
+        print(f"{nome:<30} | {micros:>9.2f} | {1_000_000 / micros:>12,.0f} | {base / micros:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Comparação de armazenamento e taxa de inserção por política de payload_raw
+
+Para cada modo grava as mesmas N mensagens (COPY em lotes, como o
+LeituraBatchWriter) e mede:
+  - linhas/s de inserção (leituras + auditoria)
+  - bytes por leitura na hypertable (soma de pg_column_size das linhas)
+  - bytes da auditoria (tds_new_payload_telemetria)
+
+Modos:
+  legado         → payload_raw JSON em cada leitura (comportamento anterior)
+  off, on_error_only, sampled:N, full → TELEMETRY_PAYLOAD_RAW
+
+As leituras usam instantes no ano 2001 e são apagadas ao final de cada modo.
+
+Uso:
+    python scripts/benchmark_payload_raw.py
+    python scripts/benchmark_payload_raw.py --mensagens 20000 --erros 0.01 --amostra 100
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'prj_tds_new.settings')
+
+import django
+django.setup()
+
+from django.db import connection
+from tds_new.models import Dispositivo, Gateway, LeituraDispositivo, PayloadTelemetria
+from tds_new.services.lookup_cache import GatewayInfo
+from tds_new.services.payload_audit import AuditoriaPayloadWriter
+
+INICIO_JANELA = datetime(2001, 1, 1, tzinfo=dt_timezone.utc)
+FIM_JANELA = datetime(2002, 1, 1, tzinfo=dt_timezone.utc)
+MENSAGENS_POR_COPY = 50
+
+
+def limpar(gateway):
+    LeituraDispositivo.objects.filter(gateway_id=gateway.id, time__gte=INICIO_JANELA, time__lt=FIM_JANELA).delete()
+    PayloadTelemetria.objects.filter(gateway_id=gateway.id, time__gte=INICIO_JANELA, time__lt=FIM_JANELA).delete()
+
+
+def bytes_gravados(tabela, gateway):
+    """Soma de pg_column_size das linhas da janela (independe de bloat/dead tuples)"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(pg_column_size(t.*)), 0) FROM {tabela} AS t "
+            f"WHERE t.gateway_id = %s AND t.time >= %s AND t.time < %s",
+            [gateway.id, INICIO_JANELA, FIM_JANELA]
+        )
+        return cursor.fetchone()
+
+
+def gerar_mensagens(gateway, dispositivos, quantidade, taxa_erros):
+    """(timestamp, bytes JSON, itens, com_erro) por mensagem"""
+    sorteio = random.Random(42)
+    mensagens = []
+    for i in range(quantidade):
+        timestamp = INICIO_JANELA + timedelta(seconds=i)
+        itens = [
+            {'dispositivo_codigo': codigo, 'valor': round(sorteio.uniform(0, 10_000), 4), 'unidade': 'kWh'}
+            for codigo in dispositivos
+        ]
+        dados = json.dumps({
+            'gateway_mac': gateway.mac,
+            'timestamp': timestamp.isoformat().replace('+00:00', 'Z'),
+            'leituras': itens,
+        }).encode('utf-8')
+        mensagens.append((timestamp, dados, itens, sorteio.random() < taxa_erros))
+    return mensagens
+
+
+def rodar(modo, gateway, dispositivos, mensagens):
+    """Grava as mensagens no modo dado; retorna segundos gastos"""
+    info = GatewayInfo(gateway.id, gateway.conta_id, gateway.codigo, gateway.mac)
+    auditoria = None if modo == 'legado' else AuditoriaPayloadWriter(politica=modo, por_conta={})
+    if auditoria is not None:
+        auditoria.iniciar()
+
+    inicio = time.perf_counter()
+    lote = []
+    for n, (timestamp, dados, itens, com_erro) in enumerate(mensagens, start=1):
+        for item in itens:
+            lote.append(LeituraDispositivo(
+                time=timestamp,
+                conta_id=gateway.conta_id,
+                gateway_id=gateway.id,
+                dispositivo_id=dispositivos[item['dispositivo_codigo']],
+                valor=Decimal(str(item['valor'])),
+                unidade=item['unidade'],
+                payload_raw=item if modo == 'legado' else None,
+            ))
+        if auditoria is not None:
+            auditoria.registrar(info, dados, timestamp=timestamp, leituras_ignoradas=int(com_erro))
+        if n % MENSAGENS_POR_COPY == 0:
+            LeituraDispositivo.copy_bulk(lote)
+            lote = []
+
+    if lote:
+        LeituraDispositivo.copy_bulk(lote)
+    if auditoria is not None:
+        auditoria.parar()
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Armazenamento e inserção por política de payload_raw')
+    parser.add_argument('--mensagens', type=int, default=10_000)
+    parser.add_argument('--erros', type=float, default=0.01, help='Fração de mensagens com leitura ignorada')
+    parser.add_argument('--amostra', type=int, default=100, help='N do modo sampled:N')
+    parser.add_argument('--gateway-mac', default=None, help='Gateway usado (padrão: primeiro)')
+    args = parser.parse_args()
+
+    gateways = Gateway.objects.all()
+    gateway = gateways.get(mac=args.gateway_mac) if args.gateway_mac else gateways.first()
+    if gateway is None:
+        print("❌ Nenhum gateway cadastrado (rode criar_dados_teste_fase2.py)")
+        sys.exit(1)
+
+    dispositivos = dict(Dispositivo.objects.filter(gateway=gateway).values_list('codigo', 'id'))
+    if not dispositivos:
+        print(f"❌ Gateway {gateway.codigo} sem dispositivos")
+        sys.exit(1)
+
+    mensagens = gerar_mensagens(gateway, dispositivos, args.mensagens, args.erros)
+    total_leituras = args.mensagens * len(dispositivos)
+    modos = ['legado', 'off', 'on_error_only', f"sampled:{args.amostra}", 'full']
+
+    print("=" * 96)
+    print(
+        f"PAYLOAD_RAW — {args.mensagens:,} mensagens × {len(dispositivos)} leituras "
+        f"(gateway {gateway.codigo}, {args.erros:.1%} com erro)"
+    )
+    print("=" * 96)
+    print(
+        f"{'modo':<14} | {'leituras/s':>11} | {'B/leitura':>9} | {'hypertable':>11} | "
+        f"{'auditadas':>9} | {'auditoria':>10} | {'total':>11} | {'vs legado':>9}"
+    )
+    print("-" * 96)
+
+    base = None
+    for modo in modos:
+        limpar(gateway)
+        try:
+            duracao = rodar(modo, gateway, dispositivos, mensagens)
+            _, bytes_leituras = bytes_gravados(LeituraDispositivo._meta.db_table, gateway)
+            auditadas, bytes_auditoria = bytes_gravados(PayloadTelemetria._meta.db_table, gateway)
+        finally:
+            limpar(gateway)
+
+        total = bytes_leituras + bytes_auditoria
+        base = base or total
+        print(
+            f"{modo:<14} | {total_leituras / duracao:>11,.0f} | {bytes_leituras / total_leituras:>9.1f} | "
+            f"{bytes_leituras / 1024:>9,.0f}kB | {auditadas:>9,} | {bytes_auditoria / 1024:>8,.0f}kB | "
+            f"{total / 1024:>9,.0f}kB | {total / base:>8.0%}"
+        )
+
+
+if __name__ == '__main__':
+    main()
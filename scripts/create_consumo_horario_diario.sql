@@ -0,0 +1,90 @@
+-- =====================================================================
+-- Script: Continuous aggregates horário e diário das leituras
+-- =====================================================================
+-- Descrição: Cria tds_new_consumo_horario e tds_new_consumo_diario
+--            (soma, contagem, mínimo e máximo por dispositivo), usados pelo
+--            roteador de consultas (tds_new/services/query_router.py) no
+--            lugar de agregações sobre as leituras brutas.
+--            materialized_only: o roteador lê a cauda ainda não materializada
+--            direto da hypertable (sem UNION implícito do real-time aggregate).
+--            O dia do agregado diário é o de TIME_ZONE (America/Sao_Paulo):
+--            ao mudar TIME_ZONE, recrie a view com o mesmo fuso.
+--            View criada com buckets UTC (versão anterior deste script):
+--                DROP MATERIALIZED VIEW tds_new_consumo_diario;
+--            e rode o script de novo.
+-- Data: 2026-10-17
+--
+-- Comando: psql -U tsdb_django_d4j7g9 -d db_tds_new -f scripts/create_consumo_horario_diario.sql
+-- =====================================================================
+
+-- 1. Agregado horário
+CREATE MATERIALIZED VIEW IF NOT EXISTS tds_new_consumo_horario
+WITH (timescaledb.continuous, timescaledb.materialized_only = true) AS
+SELECT
+    time_bucket('1 hour', time) AS bucket,
+    conta_id,
+    dispositivo_id,
+    SUM(valor) AS soma,
+    COUNT(*) AS contagem,
+    MIN(valor) AS minimo,
+    MAX(valor) AS maximo
+FROM tds_new_leitura_dispositivo
+GROUP BY bucket, conta_id, dispositivo_id
+WITH NO DATA;
+
+CREATE INDEX IF NOT EXISTS idx_consumo_horario_conta_bucket
+    ON tds_new_consumo_horario (conta_id, bucket DESC);
+
+COMMENT ON MATERIALIZED VIEW tds_new_consumo_horario IS 'Continuous aggregate horário (soma, contagem, mín, máx) por dispositivo';
+
+-- 2. Agregado diário (dia local, meia-noite de America/Sao_Paulo)
+CREATE MATERIALIZED VIEW IF NOT EXISTS tds_new_consumo_diario
+WITH (timescaledb.continuous, timescaledb.materialized_only = true) AS
+SELECT
+    time_bucket('1 day', time, 'America/Sao_Paulo') AS bucket,
+    conta_id,
+    dispositivo_id,
+    SUM(valor) AS soma,
+    COUNT(*) AS contagem,
+    MIN(valor) AS minimo,
+    MAX(valor) AS maximo
+FROM tds_new_leitura_dispositivo
+GROUP BY bucket, conta_id, dispositivo_id
+WITH NO DATA;
+
+CREATE INDEX IF NOT EXISTS idx_consumo_diario_conta_bucket
+    ON tds_new_consumo_diario (conta_id, bucket DESC);
+
+COMMENT ON MATERIALIZED VIEW tds_new_consumo_diario IS 'Continuous aggregate diário (soma, contagem, mín, máx) por dispositivo';
+
+-- 3. Políticas de refresh
+--    start_offset precisa ficar abaixo de TIMESCALE_RETENTION (validado por
+--    manage.py timescale_policies antes de aplicar a retenção)
+SELECT add_continuous_aggregate_policy(
+    'tds_new_consumo_horario',
+    start_offset => INTERVAL '3 days',
+    end_offset => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '15 minutes',
+    if_not_exists => TRUE
+);
+
+SELECT add_continuous_aggregate_policy(
+    'tds_new_consumo_diario',
+    start_offset => INTERVAL '7 days',
+    end_offset => INTERVAL '1 day',
+    schedule_interval => INTERVAL '1 hour',
+    if_not_exists => TRUE
+);
+
+-- 4. Materialização inicial do histórico
+CALL refresh_continuous_aggregate('tds_new_consumo_horario', NULL, NULL);
+CALL refresh_continuous_aggregate('tds_new_consumo_diario', NULL, NULL);
+
+-- 5. Permissões
+GRANT SELECT ON tds_new_consumo_horario TO tsdb_django_d4j7g9;
+GRANT SELECT ON tds_new_consumo_diario TO tsdb_django_d4j7g9;
+
+-- Verificação
+SELECT view_name, materialized_only
+FROM timescaledb_information.continuous_aggregates
+WHERE view_name IN ('tds_new_consumo_horario', 'tds_new_consumo_diario');
@@ -32,9 +32,9 @@ SELECT create_hypertable('tds_new_leitura_dispositivo', 'time',
 CREATE INDEX IF NOT EXISTS idx_leitura_dispositivo_id_time 
     ON tds_new_leitura_dispositivo(dispositivo_id, time DESC);
 
--- 5. Criar índice composto para consultas por dispositivo
-CREATE INDEX IF NOT EXISTS idx_leitura_dispositivo_id_time 
-    ON tds_new_leitura_dispositivo(dispositivo_id, time DESC);
+-- 5. Unicidade (dispositivo_id, time): ingestão idempotente (ON CONFLICT DO NOTHING)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_leitura_dispositivo_time 
+    ON tds_new_leitura_dispositivo(dispositivo_id, time);
 
 -- 6. Habilitar compressão automática (chunks mais antigos que 7 dias)
 ALTER TABLE tds_new_leitura_dispositivo SET (
@@ -0,0 +1,56 @@
+-- =====================================================================
+-- Script: Continuous aggregate horário de medidores (primeira/última leitura)
+-- =====================================================================
+-- Descrição: Cria tds_new_medidor_horario: primeira e última leitura de cada
+--            hora por dispositivo (first/last por time) e o máximo da hora.
+--            Base do motor de consumo (tds_new/services/consumo.py): em
+--            medidores acumulados (kWh, m³) o consumo é a diferença entre
+--            leituras, não a soma delas. O consumo de um dia ou mês sai de
+--            O(horas) linhas desta view, com tratamento de zeramento do
+--            contador entre e dentro das horas.
+--            materialized_only: a cauda não materializada é lida da
+--            hypertable pelo próprio motor.
+-- Data: 2026-10-17
+--
+-- Comando: psql -U tsdb_django_d4j7g9 -d db_tds_new -f scripts/create_medidor_horario.sql
+-- =====================================================================
+
+-- 1. Agregado horário de extremos
+CREATE MATERIALIZED VIEW IF NOT EXISTS tds_new_medidor_horario
+WITH (timescaledb.continuous, timescaledb.materialized_only = true) AS
+SELECT
+    time_bucket('1 hour', time) AS bucket,
+    conta_id,
+    dispositivo_id,
+    first(valor, time) AS primeiro,
+    last(valor, time) AS ultimo,
+    MAX(valor) AS maximo,
+    COUNT(*) AS contagem
+FROM tds_new_leitura_dispositivo
+GROUP BY bucket, conta_id, dispositivo_id
+WITH NO DATA;
+
+CREATE INDEX IF NOT EXISTS idx_medidor_horario_conta_bucket
+    ON tds_new_medidor_horario (conta_id, bucket DESC);
+
+COMMENT ON MATERIALIZED VIEW tds_new_medidor_horario IS 'Continuous aggregate horário (primeira, última e máxima leitura) por dispositivo';
+
+-- 2. Política de refresh (mesma janela do tds_new_consumo_horario)
+SELECT add_continuous_aggregate_policy(
+    'tds_new_medidor_horario',
+    start_offset => INTERVAL '3 days',
+    end_offset => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '15 minutes',
+    if_not_exists => TRUE
+);
+
+-- 3. Materialização inicial do histórico
+CALL refresh_continuous_aggregate('tds_new_medidor_horario', NULL, NULL);
+
+-- 4. Permissões
+GRANT SELECT ON tds_new_medidor_horario TO tsdb_django_d4j7g9;
+
+-- Verificação
+SELECT view_name, materialized_only
+FROM timescaledb_information.continuous_aggregates
+WHERE view_name = 'tds_new_medidor_horario';
@@ -51,10 +51,17 @@ ON tds_new_leitura_dispositivo (gateway_id, time DESC);
 CREATE INDEX IF NOT EXISTS idx_leitura_conta_dispositivo_time 
 ON tds_new_leitura_dispositivo (conta_id, dispositivo_id, time DESC);
 
+-- Unicidade por dispositivo e instante (ingestão idempotente: reentregas QoS 1
+-- caem no ON CONFLICT DO NOTHING). Bancos existentes: add_unique_leitura_dispositivo_time.sql
+CREATE UNIQUE INDEX IF NOT EXISTS uq_leitura_dispositivo_time 
+ON tds_new_leitura_dispositivo (dispositivo_id, time);
+
 -- ============================================================================
 -- 3. POLÍTICAS DE RETENÇÃO (OPCIONAL - Comentado por padrão)
 -- ============================================================================
--- Descomentar para ativar política de retenção automática
+-- Compressão, retenção e downsampling são aplicados por
+--   python manage.py timescale_policies
+-- a partir de settings (TIMESCALE_*). O bloco abaixo fica como referência.
 
 -- Manter dados dos últimos 2 anos (730 dias)
 -- SELECT add_retention_policy(
@@ -104,6 +111,18 @@ SELECT add_continuous_aggregate_policy(
 -- Popular a view com dados existentes (se houver)
 CALL refresh_continuous_aggregate('tds_new_consumo_mensal', NULL, NULL);
 
+-- ============================================================================
+-- 6.1 CONTINUOUS AGGREGATES HORÁRIO E DIÁRIO (roteador de consultas)
+-- ============================================================================
+
+\ir create_consumo_horario_diario.sql
+
+-- ============================================================================
+-- 6.2 CONTINUOUS AGGREGATE HORÁRIO DE MEDIDORES (motor de consumo)
+-- ============================================================================
+
+\ir create_medidor_horario.sql
+
 -- ============================================================================
 -- 7. VALIDAÇÃO DA CONFIGURAÇÃO
 -- ============================================================================
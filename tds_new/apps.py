@@ -6,6 +6,5 @@ class TdsNewConfig(AppConfig):
     name = 'tds_new'
 
     def ready(self):
-        # Signals serão importados aqui quando implementados
-        # import tds_new.signals
-        pass
+        # Invalidação dos caches de ingestão (lookup de dispositivos)
+        import tds_new.signals  # noqa: F401
@@ -0,0 +1,249 @@
+# ==============================================================================
+# TDS New - MQTT Telemetry Consumer (engine asyncio)
+# ==============================================================================
+# Arquivo: tds_new/consumers/mqtt_async.py
+# Responsabilidade: Várias conexões MQTT em um único event loop (aiomqtt)
+# ==============================================================================
+
+import asyncio
+import logging
+import signal
+import ssl
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.db import close_old_connections
+
+from tds_new.consumers.mqtt_config import MQTTConfig
+from tds_new.consumers.mqtt_telemetry import processar_mensagem
+
+try:
+    import aiomqtt
+except ImportError:  # requirements.txt; só --engine=asyncio depende dele
+    aiomqtt = None
+
+logger = logging.getLogger('mqtt_consumer')
+
+# Uma conexão MQTT: broker + grupo de topics assinados por ela
+ConexaoBroker = namedtuple('ConexaoBroker', ['host', 'port', 'topics', 'client_id'])
+
+# ==============================================================================
+# CONSUMER ASYNCIO
+# ==============================================================================
+
+class AsyncTelemetryConsumer:
+    """
+    Consumer de telemetria com N conexões MQTT multiplexadas em um event loop
+
+    Cada conexão (broker + grupo de topics) é uma task asyncio com reconexão
+    própria; nenhuma thread fica presa a socket. O caminho de gravação é o
+    mesmo da engine paho: processar_mensagem() roda em um ThreadPoolExecutor
+    (ORM síncrono) e enfileira no LeituraBatchWriter, que faz o COPY em lote
+    na sua própria thread.
+
+    Limite de memória:
+        no máximo `concorrencia` mensagens em processamento e, por conexão,
+        `concorrencia` mensagens na fila de entrada do aiomqtt. A leitura do
+        socket não para: o paho continua lendo pelo event loop e confirma o
+        QoS 1 ao receber. Com a fila cheia o aiomqtt descarta a mensagem
+        ("Message queue is full", logger mqtt_consumer.aiomqtt) e ela é
+        perdida. Para carga acima da vazão do writer sem perda, use a engine
+        paho com --durable.
+
+    Limitação:
+        aiomqtt não expõe ack manual, portanto não há modo durável aqui
+        (PUBACK automático, como a engine paho sem --durable).
+    """
+
+    def __init__(self, conexoes, writer=None, concorrencia=None, threads=None):
+        """
+        Args:
+            conexoes (list[ConexaoBroker]): Conexões a abrir (ver conexoes_padrao())
+            writer (LeituraBatchWriter): Writer em lote (None = commit por mensagem)
+            concorrencia (int): Mensagens em processamento simultâneo
+            threads (int): Threads do executor de ORM (padrão: MQTTConfig.WORKERS)
+        """
+        if aiomqtt is None:
+            raise RuntimeError("aiomqtt não instalado (requirements.txt). Execute:  pip install -r requirements.txt")
+
+        self.conexoes = list(conexoes)
+        self.writer = writer
+        self.threads = threads or MQTTConfig.WORKERS or 1
+        self.concorrencia = concorrencia or MQTTConfig.QUEUE_SIZE
+        self._executor = None
+        self._semaforo = None
+        self._tarefas = set()
+        self._stats = {'recebidas': 0, 'processadas': 0, 'erros': 0}
+
+    # ==========================================================================
+    # CICLO DE VIDA
+    # ==========================================================================
+
+    def executar(self):
+        """Bloqueia até Ctrl+C / SIGTERM"""
+        asyncio.run(self.executar_async())
+
+    async def executar_async(self):
+        """Abre todas as conexões e processa mensagens até ser cancelado"""
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='mqtt-async-orm')
+        self._semaforo = asyncio.Semaphore(self.concorrencia)
+
+        # SIGTERM cancela as conexões e cai no encerramento gracioso abaixo
+        # (Ctrl+C já faz isso via asyncio.run; no Windows não há add_signal_handler)
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+        logger.info(
+            f"[ASYNC] {len(self.conexoes)} conexões, {self.threads} threads de ORM, "
+            f"concorrência={self.concorrencia}"
+        )
+
+        try:
+            await asyncio.gather(*(self._conexao(c) for c in self.conexoes))
+        finally:
+            # Mensagens já recebidas terminam de ser processadas
+            if self._tarefas:
+                await asyncio.gather(*self._tarefas, return_exceptions=True)
+            self._executor.shutdown(wait=True)
+            logger.info(f"[ASYNC] Consumer encerrado: {self.estatisticas()}")
+
+    def estatisticas(self):
+        """
+        Returns:
+            dict: recebidas, processadas, erros, em_processamento
+        """
+        stats = dict(self._stats)
+        stats['em_processamento'] = len(self._tarefas)
+        return stats
+
+    # ==========================================================================
+    # CONEXÕES
+    # ==========================================================================
+
+    async def _conexao(self, conexao):
+        """Mantém uma conexão ativa (reconexão com backoff) e consome suas mensagens"""
+        espera = MQTTConfig.RECONNECT_DELAY_MIN
+
+        while True:
+            try:
+                async with self._criar_cliente(conexao) as client:
+                    for topic in conexao.topics:
+                        await client.subscribe(topic, qos=MQTTConfig.QOS_SUBSCRIBE)
+                        logger.info(f"[LISTEN] {conexao.client_id}: {topic} (QoS {MQTTConfig.QOS_SUBSCRIBE})")
+
+                    espera = MQTTConfig.RECONNECT_DELAY_MIN
+                    async for message in client.messages:
+                        await self._despachar(str(message.topic), message.payload)
+
+            except aiomqtt.MqttError as e:
+                logger.warning(
+                    f"[WARN] {conexao.client_id}@{conexao.host}:{conexao.port} desconectado ({e}); "
+                    f"reconectando em {espera}s"
+                )
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, MQTTConfig.RECONNECT_DELAY_MAX)
+
+    def _criar_cliente(self, conexao):
+        tls_context = None
+        if MQTTConfig.USE_TLS:
+            tls_context = ssl.create_default_context(cafile=MQTTConfig.CA_CERTS)
+            tls_context.load_cert_chain(MQTTConfig.CERTFILE, MQTTConfig.KEYFILE)
+
+        return aiomqtt.Client(
+            hostname=conexao.host,
+            port=conexao.port,
+            username=MQTTConfig.BROKER_USER,
+            password=MQTTConfig.BROKER_PASSWORD,
+            identifier=conexao.client_id,
+            keepalive=MQTTConfig.KEEPALIVE,
+            tls_context=tls_context,
+            clean_session=True,
+            # Sem limite (padrão None) a fila cresce sem teto enquanto o semáforo espera
+            max_queued_incoming_messages=self.concorrencia,
+            logger=logging.getLogger('mqtt_consumer.aiomqtt'),
+        )
+
+    # ==========================================================================
+    # PROCESSAMENTO
+    # ==========================================================================
+
+    async def _despachar(self, topic, payload):
+        """Agenda o processamento; espera se a concorrência máxima foi atingida"""
+        await self._semaforo.acquire()
+        self._stats['recebidas'] += 1
+
+        tarefa = asyncio.get_running_loop().run_in_executor(
+            self._executor, partial(self._processar, topic, payload)
+        )
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._concluir)
+
+    def _processar(self, topic, payload):
+        """Executado no executor (thread com conexão Django própria)"""
+        try:
+            processar_mensagem(topic, payload, writer=self.writer)
+        except Exception:
+            close_old_connections()
+            raise
+
+    def _concluir(self, tarefa):
+        self._tarefas.discard(tarefa)
+        self._semaforo.release()
+
+        if tarefa.cancelled():
+            return
+        if tarefa.exception() is not None:
+            self._stats['erros'] += 1
+            logger.error(f"[CRITICAL] Erro no processamento assíncrono: {tarefa.exception()}")
+        else:
+            self._stats['processadas'] += 1
+
+
+# ==============================================================================
+# CONFIGURAÇÃO DAS CONEXÕES
+# ==============================================================================
+
+def conexoes_padrao(conexoes_por_broker=1, shared_group=None, host=None, port=None, instancia=None):
+    """
+    Monta a lista de conexões a partir de settings
+
+    settings.MQTT_ASYNC_BROKERS (lista de dicts) define brokers e grupos de
+    topics: [{'host': 'b1', 'port': 1883, 'topics': ['tds_new/devices/+/telemetry']}].
+    Vazio = o broker de MQTT_BROKER_HOST com os topics padrão (telemetria,
+    telemetria compacta e status; ver MQTTConfig.get_subscribe_topics()).
+
+    Com várias conexões por broker os topics são assinados via
+    $share/<grupo>/..., e o broker reparte as mensagens entre elas.
+
+    Args:
+        conexoes_por_broker (int): Conexões abertas para cada broker
+        shared_group (str): Grupo de shared subscription (padrão: MQTTConfig.SHARED_GROUP)
+        host (str), port (int): Override do broker padrão (--broker/--port)
+        instancia (int): Índice da instância, usado nos client IDs
+
+    Returns:
+        list[ConexaoBroker]
+    """
+    brokers = MQTTConfig.ASYNC_BROKERS or [{
+        'host': host or MQTTConfig.BROKER_HOST,
+        'port': port or (MQTTConfig.BROKER_PORT_TLS if MQTTConfig.USE_TLS else MQTTConfig.BROKER_PORT),
+    }]
+
+    base_id = MQTTConfig.get_client_id(instancia)
+    conexoes = []
+    for b, broker in enumerate(brokers):
+        if broker.get('topics'):
+            topics = [MQTTConfig.get_subscribe_topic(topic, grupo=shared_group) for topic in broker['topics']]
+        else:
+            topics = MQTTConfig.get_subscribe_topics(grupo=shared_group)
+        for c in range(conexoes_por_broker):
+            conexoes.append(ConexaoBroker(
+                host=broker['host'],
+                port=broker.get('port', MQTTConfig.BROKER_PORT),
+                topics=topics,
+                client_id=f"{base_id}-a{b}c{c}",
+            ))
+    return conexoes
@@ -6,6 +6,7 @@
 # ==============================================================================
 
 import os
+import socket
 from django.conf import settings
 
 # ==============================================================================
@@ -24,15 +25,31 @@ class MQTTConfig:
     BROKER_USER = getattr(settings, 'MQTT_BROKER_USER', None)
     BROKER_PASSWORD = getattr(settings, 'MQTT_BROKER_PASSWORD', None)
     
-    # Cliente
-    CLIENT_ID = "django_tds_new_consumer"
+    # Cliente (ID único por instância: o broker derruba conexões com ID repetido)
+    CLIENT_ID_PREFIX = getattr(settings, 'MQTT_CLIENT_ID_PREFIX', 'django_tds_new_consumer')
     KEEPALIVE = getattr(settings, 'MQTT_KEEPALIVE', 60)
     
     # Topics
     TOPIC_PREFIX = getattr(settings, 'MQTT_TOPIC_PREFIX', 'tds_new/devices')
     TOPIC_TELEMETRY = f"{TOPIC_PREFIX}/+/telemetry"  # Wildcard para todos os gateways
+    TOPIC_TELEMETRY_COMPACTA = f"{TOPIC_PREFIX}/+/telemetry/{{formato}}"  # formato: cbor | msgpack
+    TOPIC_STATUS = f"{TOPIC_PREFIX}/+/status"  # LWT, birth e heartbeat dos gateways
     TOPIC_COMMANDS = f"{TOPIC_PREFIX}/+/commands/#"  # Para enviar comandos (futuro)
     
+    # Shared subscription ($share/<grupo>/...): o broker distribui as mensagens
+    # entre os consumers do grupo. Vazio = subscription comum (instância única)
+    SHARED_GROUP = getattr(settings, 'MQTT_SHARED_GROUP', 'tds_new_consumers')
+    
+    # Presença via topic de status (online/offline sem gravar leituras)
+    SUBSCRIBE_STATUS = getattr(settings, 'MQTT_SUBSCRIBE_STATUS', True)
+    
+    # Telemetria compacta (CBOR/MessagePack posicional) em topic paralelo
+    SUBSCRIBE_COMPACT = getattr(settings, 'MQTT_SUBSCRIBE_COMPACT', True)
+    
+    # Sessão durável (clean_session=False + ack manual após commit): o broker
+    # guarda as mensagens QoS 1 enquanto a instância está fora do ar
+    DURABLE_SESSION = getattr(settings, 'MQTT_DURABLE_SESSION', False)
+    
     # QoS (Quality of Service)
     QOS_SUBSCRIBE = 1  # At least once
     QOS_PUBLISH = 1    # At least once
@@ -45,10 +62,80 @@ class MQTTConfig:
     CERTFILE = getattr(settings, 'MQTT_CERTFILE', '/app/certs/django-consumer-cert.pem')
     KEYFILE = getattr(settings, 'MQTT_KEYFILE', '/app/certs/django-consumer-key.pem')
     
+    # Pool de workers (processamento fora da thread de rede do Paho)
+    WORKERS = getattr(settings, 'MQTT_CONSUMER_WORKERS', 4)
+    QUEUE_SIZE = getattr(settings, 'MQTT_CONSUMER_QUEUE_SIZE', 10000)
+    QUEUE_POLICY = getattr(settings, 'MQTT_CONSUMER_QUEUE_POLICY', 'block')  # block | drop
+    
+    # Engine do consumer: 'paho' (thread de rede + callbacks) ou 'asyncio' (aiomqtt)
+    ENGINE = getattr(settings, 'MQTT_CONSUMER_ENGINE', 'paho')
+    
+    # Engine asyncio: brokers/grupos de topics e conexões por broker
+    ASYNC_BROKERS = getattr(settings, 'MQTT_ASYNC_BROKERS', [])
+    ASYNC_CONNECTIONS = getattr(settings, 'MQTT_ASYNC_CONNECTIONS', 1)
+    
     # Reconnect settings
     RECONNECT_DELAY_MIN = 1   # segundos
     RECONNECT_DELAY_MAX = 120  # segundos
     
+    @classmethod
+    def get_client_id(cls, instancia=None, estavel=False):
+        """
+        Client ID único por processo/host
+        
+        Args:
+            instancia (int): Índice da instância (modo --instances); None = usa o PID
+            estavel (bool): Sessão durável: sem instância usa 0 em vez do PID,
+                para o broker reconhecer a mesma sessão após um reinício
+        
+        Returns:
+            str: ex. 'django_tds_new_consumer-srv01-2'
+        """
+        if instancia is None and estavel:
+            instancia = 0
+        sufixo = instancia if instancia is not None else os.getpid()
+        return f"{cls.CLIENT_ID_PREFIX}-{socket.gethostname()}-{sufixo}"
+    
+    @classmethod
+    def get_subscribe_topic(cls, topic=None, grupo=None):
+        """
+        Topic de subscribe, prefixado com $share/<grupo>/ se houver grupo
+        
+        Args:
+            topic (str): Filtro base (padrão: TOPIC_TELEMETRY)
+            grupo (str): Grupo de shared subscription (padrão: SHARED_GROUP)
+        """
+        topic = topic or cls.TOPIC_TELEMETRY
+        grupo = cls.SHARED_GROUP if grupo is None else grupo
+        if grupo:
+            return f"$share/{grupo}/{topic}"
+        return topic
+    
+    @classmethod
+    def get_subscribe_topics(cls, grupo=None):
+        """
+        Topics assinados pelo consumer: telemetria (+ compacta) + status, conforme settings
+        
+        Telemetria compacta: um topic por formato cujo decodificador está
+        instalado (payload_codec.formatos_compactos_disponiveis).
+        
+        Args:
+            grupo (str): Grupo de shared subscription (padrão: SHARED_GROUP)
+        
+        Returns:
+            list[str]
+        """
+        topics = [cls.TOPIC_TELEMETRY]
+        if cls.SUBSCRIBE_COMPACT:
+            from tds_new.services.payload_codec import formatos_compactos_disponiveis
+            topics += [
+                cls.TOPIC_TELEMETRY_COMPACTA.format(formato=formato)
+                for formato in formatos_compactos_disponiveis()
+            ]
+        if cls.SUBSCRIBE_STATUS:
+            topics.append(cls.TOPIC_STATUS)
+        return [cls.get_subscribe_topic(topic, grupo=grupo) for topic in topics]
+    
     @classmethod
     def get_broker_url(cls):
         """Retorna URL do broker para logs"""
@@ -64,6 +151,9 @@ class MQTTConfig:
         if not cls.BROKER_HOST:
             errors.append("MQTT_BROKER_HOST não configurado")
         
+        if cls.SHARED_GROUP and any(c in cls.SHARED_GROUP for c in '/+#'):
+            errors.append(f"MQTT_SHARED_GROUP não pode conter '/', '+' ou '#': {cls.SHARED_GROUP}")
+        
         if cls.USE_TLS:
             if not os.path.exists(cls.CA_CERTS):
                 errors.append(f"Certificado CA não encontrado: {cls.CA_CERTS}")
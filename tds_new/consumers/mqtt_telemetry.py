@@ -6,23 +6,123 @@
 # ==============================================================================
 
 import paho.mqtt.client as mqtt
-import json
 import logging
+import threading
+from collections import deque
 from django.utils import timezone
 from tds_new.consumers.mqtt_config import MQTTConfig
-from tds_new.models import Gateway
+from tds_new.services.liveness import gateway_liveness
+from tds_new.services.lookup_cache import gateway_cache
+from tds_new.services.payload_audit import get_auditoria
+from tds_new.services.payload_codec import FORMATOS_COMPACTOS, decodificar_compacto, get_codec
 from tds_new.services.telemetry_processor import TelemetryProcessorService
 
 logger = logging.getLogger('mqtt_consumer')
 
+# Payloads aceitos no topic de status (texto puro ou JSON {"status": ...})
+STATUS_ONLINE = frozenset({'online', 'birth', 'heartbeat', 'alive', '1'})
+STATUS_OFFLINE = frozenset({'offline', 'lwt', 'dead', '0'})
+
+# ==============================================================================
+# CONFIRMAÇÃO MANUAL (MODO DURÁVEL)
+# ==============================================================================
+
+class ConfirmacoesOrdenadas:
+    """
+    Envia os PUBACKs do modo durável na ordem de chegada das mensagens
+
+    O MQTT 3.1.1 (4.6) pede que mensagens QoS 1 sejam confirmadas na ordem
+    em que chegaram, mas com worker pool e writer em lote as confirmações
+    ficam prontas fora de ordem. Cada mensagem recebe uma Confirmacao ao
+    chegar (registrar, na thread de rede); o PUBACK só sai quando todas as
+    anteriores foram confirmadas ou abandonadas.
+
+    Abandonar = liberar a posição sem PUBACK: a mensagem fica pendente no
+    broker e é reentregue na próxima sessão (erro de banco, lote descartado
+    no encerramento). Ao reconectar as pendentes são esquecidas: o broker
+    reenvia tudo que não foi confirmado e os mids antigos não valem na
+    conexão nova.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._lock = threading.Lock()
+        self._fila = deque()
+
+    def registrar(self, msg):
+        """Reserva a posição da mensagem (chamado no on_message, em ordem de chegada)"""
+        confirmacao = Confirmacao(self, msg.mid, msg.qos)
+        with self._lock:
+            self._fila.append(confirmacao)
+        return confirmacao
+
+    def reiniciar(self):
+        """Esquece as confirmações pendentes da conexão anterior"""
+        with self._lock:
+            for confirmacao in self._fila:
+                confirmacao.estado = False
+            pendentes = len(self._fila)
+            self._fila.clear()
+        if pendentes:
+            logger.info(f"[ACK] {pendentes} mensagens sem PUBACK da sessão anterior (serão reentregues)")
+
+    def pendentes(self):
+        with self._lock:
+            return len(self._fila)
+
+    def _concluir(self, confirmacao, confirmada):
+        with self._lock:
+            if confirmacao.estado is not None:
+                return  # Já concluída (ou sessão reiniciada)
+            confirmacao.estado = confirmada
+            while self._fila and self._fila[0].estado is not None:
+                primeira = self._fila.popleft()
+                if primeira.estado:
+                    self.client.ack(primeira.mid, primeira.qos)
+
+
+class Confirmacao:
+    """
+    Confirmação de uma mensagem: chamar = PUBACK (na vez dela),
+    abandonar() = sem PUBACK (o broker reentrega). Só a primeira conta.
+    """
+
+    __slots__ = ('_ordem', 'mid', 'qos', 'estado')
+
+    def __init__(self, ordem, mid, qos):
+        self._ordem = ordem
+        self.mid = mid
+        self.qos = qos
+        self.estado = None  # None = pendente, True = confirmada, False = abandonada
+
+    def __call__(self):
+        self._ordem._concluir(self, True)
+
+    def abandonar(self):
+        self._ordem._concluir(self, False)
+
+
 # ==============================================================================
 # CLIENTE MQTT - CONFIGURAÇÃO E CALLBACKS
 # ==============================================================================
 
-def create_mqtt_client():
+def create_mqtt_client(writer=None, pool=None, client_id=None, shared_group=None, durable=False):
     """
     Cria e configura cliente MQTT com callbacks
     
+    Args:
+        writer (LeituraBatchWriter): Writer em lote compartilhado pelos callbacks
+            (None = commit por mensagem). Exposto aos callbacks via userdata.
+        pool (MensagemWorkerPool): Pool de workers que processa as mensagens
+            fora da thread de rede (None = processamento inline no on_message)
+        client_id (str): Client ID MQTT (padrão: MQTTConfig.get_client_id())
+        shared_group (str): Grupo de shared subscription (padrão: MQTTConfig.SHARED_GROUP;
+            '' = subscription comum)
+        durable (bool): Sessão persistente (clean_session=False) com ack manual:
+            o PUBACK só é enviado após o commit das leituras (at-least-once),
+            na ordem de chegada (ConfirmacoesOrdenadas em userdata['acks']).
+            Requer client_id estável entre reinícios.
+    
     Returns:
         mqtt.Client: Cliente MQTT configurado
     """
@@ -33,12 +133,20 @@ def create_mqtt_client():
         logger.error(f"[ERROR] Configuração MQTT inválida: {e}")
         raise
     
+    client_id = client_id or MQTTConfig.get_client_id()
+    topics = MQTTConfig.get_subscribe_topics(grupo=shared_group)
+    
     # Criar cliente MQTT (protocolo v3.1.1)
+    userdata = {'writer': writer, 'pool': pool, 'topics': topics, 'durable': durable, 'acks': None}
     client = mqtt.Client(
-        client_id=MQTTConfig.CLIENT_ID,
+        client_id=client_id,
         protocol=mqtt.MQTTv311,
-        clean_session=True  # TODO: False para QoS 1 persistente (após fix de múltiplas instâncias)
+        clean_session=not durable,
+        userdata=userdata,
+        manual_ack=durable
     )
+    if durable:
+        userdata['acks'] = ConfirmacoesOrdenadas(client)
     
     # Configurar TLS/mTLS (se habilitado)
     if MQTTConfig.USE_TLS:
@@ -78,7 +186,7 @@ def create_mqtt_client():
         max_delay=MQTTConfig.RECONNECT_DELAY_MAX
     )
     
-    logger.info(f"📡 Cliente MQTT configurado: {MQTTConfig.CLIENT_ID}")
+    logger.info(f"📡 Cliente MQTT configurado: {client_id} ({'sessão durável' if durable else 'clean session'})")
     logger.info(f"🔗 Broker: {MQTTConfig.get_broker_url()}")
     
     return client
@@ -94,7 +202,7 @@ def on_connect(client, userdata, flags, rc):
     
     Args:
         client: Instância do cliente MQTT
-        userdata: Dados do usuário (não usado)
+        userdata: Dados do usuário (dict com 'topics' de subscribe)
         flags: Flags de resposta do broker
         rc: Result code (0 = sucesso)
     """
@@ -102,14 +210,21 @@ def on_connect(client, userdata, flags, rc):
         logger.info("[OK] Conectado ao broker MQTT com sucesso")
         logger.info(f"[INFO] Flags: {flags}")
         
-        # Subscribe ao topic de telemetria (wildcard para todos os gateways)
-        topic = MQTTConfig.TOPIC_TELEMETRY
+        # Modo durável: confirmações pendentes da conexão anterior não valem mais
+        acks = (userdata or {}).get('acks')
+        if acks is not None:
+            acks.reiniciar()
+        
+        # Subscribe aos topics de telemetria e status (wildcard para todos os
+        # gateways, via $share/<grupo>/ quando há várias instâncias)
+        topics = (userdata or {}).get('topics') or MQTTConfig.get_subscribe_topics()
         qos = MQTTConfig.QOS_SUBSCRIBE
         
-        result, mid = client.subscribe(topic, qos=qos)
+        result, mid = client.subscribe([(topic, qos) for topic in topics])
         
         if result == mqtt.MQTT_ERR_SUCCESS:
-            logger.info(f"[LISTEN] Subscribe solicitado: {topic} (QoS {qos})")
+            for topic in topics:
+                logger.info(f"[LISTEN] Subscribe solicitado: {topic} (QoS {qos})")
             logger.info(f"   Message ID: {mid}")
         else:
             logger.error(f"[ERROR] Erro ao solicitar subscribe: {result}")
@@ -135,12 +250,13 @@ def on_subscribe(client, userdata, mid, granted_qos):
     
     Args:
         client: Instância do cliente MQTT
-        userdata: Dados do usuário (não usado)
+        userdata: Dados do usuário (dict com 'topics' de subscribe)
         mid: Message ID do subscribe
-        granted_qos: QoS garantido pelo broker
+        granted_qos: QoS garantido pelo broker (um por topic)
     """
-    logger.info(f"[OK] Subscribe confirmado (mid={mid}, QoS={granted_qos[0]})")
-    logger.info(f"[LISTEN] Aguardando mensagens em: {MQTTConfig.TOPIC_TELEMETRY}")
+    logger.info(f"[OK] Subscribe confirmado (mid={mid}, QoS={list(granted_qos)})")
+    topics = (userdata or {}).get('topics') or MQTTConfig.get_subscribe_topics()
+    logger.info(f"[LISTEN] Aguardando mensagens em: {', '.join(topics)}")
 
 
 # ==============================================================================
@@ -151,76 +267,242 @@ def on_message(client, userdata, msg):
     """
     Callback chamado quando mensagem é recebida
     
+    Com worker pool (userdata['pool']), a thread de rede do Paho apenas
+    enfileira a mensagem; caso contrário processa inline.
+    
+    Em modo durável (ack manual) a mensagem leva junto sua confirmação,
+    registrada aqui (ordem de chegada) e chamada somente após o commit das
+    leituras.
+    
     Args:
         client: Instância do cliente MQTT
-        userdata: Dados do usuário (não usado)
+        userdata: {'writer': LeituraBatchWriter | None, 'pool': MensagemWorkerPool | None,
+                   'durable': bool, 'acks': ConfirmacoesOrdenadas | None}
         msg: Mensagem MQTT (topic + payload)
     """
+    userdata = userdata or {}
+    pool = userdata.get('pool')
+    
+    ack = None
+    if userdata.get('acks') is not None:
+        ack = userdata['acks'].registrar(msg)
+    
+    if pool is not None:
+        pool.enviar(msg.topic, msg.payload, ack=ack)
+        return
+    
+    processar_mensagem(msg.topic, msg.payload, writer=userdata.get('writer'), ack=ack)
+
+
+# ==============================================================================
+# PROCESSAMENTO DE MENSAGEM (INLINE OU NOS WORKERS)
+# ==============================================================================
+
+def processar_mensagem(topic, payload_bytes, writer=None, ack=None):
+    """
+    Valida topic, resolve gateway, decodifica JSON e delega ao service layer
+    
+    Mensagens do topic de status vão para processar_status() (presença,
+    sem gravar leituras); .../telemetry/cbor e .../telemetry/msgpack trazem
+    o payload posicional compacto (payload_codec.decodificar_compacto).
+    
+    Confirmação (ack):
+        - mensagens inválidas (topic, gateway desconhecido, JSON, schema) são
+          confirmadas na hora: reentregá-las não mudaria o resultado
+        - leituras commitadas inline → confirmadas ao retornar do service
+        - leituras enfileiradas → confirmadas pelo writer após o flush
+        - erros de banco → abandonadas: sem PUBACK (o broker reentrega na
+          próxima sessão), sem segurar o PUBACK das mensagens seguintes
+    
+    Args:
+        topic (str): Topic MQTT (tds_new/devices/<MAC>/telemetry[/cbor|/msgpack] | status)
+        payload_bytes (bytes): Payload bruto da mensagem
+        writer (LeituraBatchWriter): Writer em lote (None = commit por mensagem)
+        ack (Confirmacao): Confirmação MQTT manual (None = ack automático do Paho)
+    """
+    confirmar = ack or (lambda: None)
+    enfileirado = False
+    
     try:
         # Log de recebimento
-        logger.info(f"[MSG] Mensagem recebida: {msg.topic} ({len(msg.payload)} bytes)")
+        logger.info(f"[MSG] Mensagem recebida: {topic} ({len(payload_bytes)} bytes)")
         
         # Extrair MAC address do topic
-        # Formato esperado: tds_new/devices/<MAC>/telemetry
-        parts = msg.topic.split('/')
+        # Formato esperado: tds_new/devices/<MAC>/telemetry (ou /status,
+        # ou /telemetry/<formato> para payload compacto)
+        parts = topic.split('/')
         
-        if len(parts) != 4:
-            logger.error(f"[ERROR] Topic inválido: {msg.topic} (esperado 4 partes, recebido {len(parts)})")
+        if len(parts) not in (4, 5):
+            logger.error(f"[ERROR] Topic inválido: {topic} (esperado 4 ou 5 partes, recebido {len(parts)})")
+            confirmar()
             return
         
-        if parts[0] != 'tds_new' or parts[1] != 'devices' or parts[3] != 'telemetry':
-            logger.error(f"[ERROR] Formato de topic incorreto: {msg.topic}")
+        formato = parts[4] if len(parts) == 5 else None
+        
+        if (
+            parts[0] != 'tds_new' or parts[1] != 'devices'
+            or parts[3] not in ('telemetry', 'status')
+            or (formato is not None and (parts[3] != 'telemetry' or formato not in FORMATOS_COMPACTOS))
+        ):
+            logger.error(f"[ERROR] Formato de topic incorreto: {topic}")
+            confirmar()
             return
         
         mac_address = parts[2]
         logger.debug(f"[DEBUG] MAC extraído do topic: {mac_address}")
         
-        # Lookup de Gateway (resolve conta_id)
+        # Lookup de Gateway (resolve conta_id) via cache MAC → GatewayInfo
         try:
-            gateway = Gateway.objects.select_related('conta').get(mac=mac_address)
-            logger.debug(f"[OK] Gateway encontrado: {gateway.codigo} (conta={gateway.conta.name})")
-        except Gateway.DoesNotExist:
+            gateway = gateway_cache.buscar(mac_address)
+        except Exception as e:
+            logger.error(f"[ERROR] Erro ao buscar gateway: {e}")
+            if ack is not None:
+                ack.abandonar()
+            return
+        
+        if gateway is None:
             logger.warning(f"[WARN] Gateway não encontrado: {mac_address}")
             logger.warning(f"   Sugestão: Cadastrar gateway com MAC {mac_address} no sistema")
+            confirmar()
             return
-        except Exception as e:
-            logger.error(f"[ERROR] Erro ao buscar gateway: {e}")
+        
+        logger.debug(f"[OK] Gateway encontrado: {gateway.codigo} (conta_id={gateway.conta_id})")
+        
+        # Presença (LWT/birth/heartbeat): só o liveness writer, nenhuma leitura
+        if parts[3] == 'status':
+            processar_status(gateway, payload_bytes)
+            confirmar()
             return
         
-        # Parse JSON payload
+        # Parse do payload: compacto (CBOR/MessagePack) ou JSON (orjson/msgspec quando instalados)
         try:
-            payload = json.loads(msg.payload.decode('utf-8'))
-            logger.debug(f"[DATA] Payload JSON: {json.dumps(payload, indent=2)}")
-        except json.JSONDecodeError as e:
-            logger.error(f"[ERROR] JSON inválido: {e}")
-            logger.error(f"   Payload recebido: {msg.payload[:200]}")  # Primeiros 200 bytes
+            if formato is not None:
+                timestamp, leituras = decodificar_compacto(payload_bytes, formato)
+            else:
+                payload = get_codec().decodificar_telemetria(payload_bytes)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"[DATA] Payload JSON: {payload_bytes[:2000]!r}")
+        except ValueError as e:
+            logger.error(f"[ERROR] {'Payload ' + formato if formato else 'JSON'} inválido: {e}")
+            logger.error(f"   Payload recebido: {payload_bytes[:200]}")  # Primeiros 200 bytes
+            _auditar(gateway, payload_bytes, formato, erro=str(e))
+            confirmar()
             return
         except Exception as e:
             logger.error(f"[ERROR] Erro ao decodificar payload: {e}")
+            _auditar(gateway, payload_bytes, formato, erro=str(e))
+            confirmar()
             return
         
         # Processar telemetria via service layer
         try:
             service = TelemetryProcessorService(
                 conta_id=gateway.conta_id,
-                gateway=gateway
+                gateway=gateway,
+                writer=writer
             )
             
-            resultado = service.processar_telemetria(payload)
+            if formato is not None:
+                resultado = service.processar_telemetria_compacta(timestamp, leituras, ack=ack)
+            else:
+                resultado = service.processar_telemetria(payload, ack=ack)
+            
+            # Enfileirado: o writer confirma após o commit do lote
+            enfileirado = bool(resultado.get('enfileirado'))
+            if not enfileirado:
+                confirmar()
             
-            logger.info(f"[OK] Telemetria processada com sucesso:")
+            _auditar(
+                gateway, payload_bytes, formato,
+                timestamp=resultado['timestamp'],
+                leituras_ignoradas=resultado['leituras_ignoradas']
+            )
+            
+            logger.info(
+                f"[OK] Telemetria {'enfileirada' if resultado.get('enfileirado') else 'processada'} com sucesso:"
+            )
             logger.info(f"   - Leituras criadas: {resultado['leituras_criadas']}")
+            if resultado.get('leituras_duplicadas'):
+                logger.info(f"   - Leituras duplicadas descartadas: {resultado['leituras_duplicadas']}")
             logger.info(f"   - Timestamp: {resultado['timestamp']}")
             logger.info(f"   - Gateway: {gateway.codigo}")
-            logger.info(f"   - Conta: {gateway.conta.name}")
+            logger.info(f"   - Conta ID: {gateway.conta_id}")
             
         except ValueError as e:
             logger.error(f"[ERROR] Validação falhou: {e}")
+            _auditar(gateway, payload_bytes, formato, erro=str(e))
+            confirmar()
         except Exception as e:
             logger.exception(f"[CRITICAL] Erro ao processar telemetria: {e}")
+            if ack is not None and not enfileirado:
+                ack.abandonar()
     
     except Exception as e:
-        logger.exception(f"[CRITICAL] Erro crítico no callback on_message: {e}")
+        logger.exception(f"[CRITICAL] Erro crítico ao processar mensagem: {e}")
+        if ack is not None and not enfileirado:
+            ack.abandonar()
+
+
+def _auditar(gateway, payload_bytes, formato, **kwargs):
+    """Auditoria do payload conforme a política da conta (nunca interrompe a ingestão)"""
+    try:
+        get_auditoria().registrar(gateway, payload_bytes, formato or 'json', **kwargs)
+    except Exception as e:
+        logger.error(f"[ERROR] Falha ao auditar payload de {gateway.codigo}: {e}")
+
+
+def interpretar_status(payload_bytes):
+    """
+    Traduz o payload do topic de status
+    
+    Aceita texto puro ("online", "offline", "heartbeat", ...) ou JSON
+    {"status": "online"}.
+    
+    Returns:
+        str | None: 'online', 'offline' ou None (vazio/desconhecido; ex: limpeza
+            de mensagem retida)
+    """
+    texto = payload_bytes.strip()
+    if texto[:1] in (b'{', '{'):
+        dados = get_codec().decodificar(texto)
+        texto = dados.get('status', '') if isinstance(dados, dict) else ''
+    if isinstance(texto, bytes):
+        texto = texto.decode('utf-8', errors='replace')
+    
+    texto = str(texto).strip().lower()
+    if texto in STATUS_ONLINE:
+        return 'online'
+    if texto in STATUS_OFFLINE:
+        return 'offline'
+    return None
+
+
+def processar_status(gateway, payload_bytes):
+    """
+    Presença do gateway a partir do topic de status
+    
+    O instante é o de chegada da mensagem. Online/heartbeat avançam last_seen
+    e offline (LWT) marca is_online=False; ambos vão no próximo flush
+    coalescido do liveness writer, sem tocar na hypertable de leituras.
+    
+    Args:
+        gateway (GatewayInfo): Gateway resolvido pelo MAC do topic
+        payload_bytes (bytes): Payload bruto
+    """
+    try:
+        status = interpretar_status(payload_bytes)
+    except ValueError as e:
+        logger.warning(f"[WARN] Status inválido de {gateway.codigo}: {e}")
+        return
+    
+    if status == 'online':
+        gateway_liveness.registrar(gateway.id)
+        logger.debug(f"[STATUS] {gateway.codigo}: online")
+    elif status == 'offline':
+        gateway_liveness.registrar_desconexao(gateway.id)
+        logger.info(f"[STATUS] {gateway.codigo}: offline (LWT)")
+    elif payload_bytes:
+        logger.warning(f"[WARN] Status desconhecido de {gateway.codigo}: {payload_bytes[:50]}")
 
 
 # ==============================================================================
@@ -0,0 +1,149 @@
+# ==============================================================================
+# TDS New - MQTT Consumer Supervisor
+# ==============================================================================
+# Arquivo: tds_new/consumers/supervisor.py
+# Responsabilidade: Executar N instâncias do consumer em uma mesma máquina
+# ==============================================================================
+
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger('mqtt_consumer')
+
+# ==============================================================================
+# SUPERVISOR DE PROCESSOS
+# ==============================================================================
+
+class ConsumerSupervisor:
+    """
+    Sobe N processos `manage.py start_mqtt_consumer --instance-id i` e os
+    reinicia se terminarem inesperadamente
+
+    Cada instância tem client ID próprio e assina o mesmo $share/<grupo>/...,
+    então o broker reparte as mensagens entre elas. Usa subprocess (não fork)
+    para funcionar igual em Linux e Windows.
+
+    Encerramento:
+        SIGINT/SIGTERM no supervisor → SIGTERM (Windows: CTRL_BREAK) nas
+        instâncias, que fazem o shutdown gracioso (flush do writer).
+    """
+
+    REINICIO_DELAY_MAX = 60     # segundos entre reinícios de uma instância instável
+    EXECUCAO_ESTAVEL = 60       # segundos rodando para zerar o backoff
+
+    def __init__(self, instancias, argumentos=None):
+        """
+        Args:
+            instancias (int): Número de processos consumer
+            argumentos (list[str]): Argumentos repassados a cada instância
+        """
+        self.instancias = instancias
+        self.argumentos = list(argumentos or [])
+        self._processos = {}    # índice -> Popen
+        self._iniciado_em = {}  # índice -> monotonic do último start
+        self._falhas = {}       # índice -> falhas consecutivas
+        self._ativo = False
+
+    def _comando(self, indice):
+        manage_py = os.path.join(str(settings.BASE_DIR), 'manage.py')
+        return [
+            sys.executable, manage_py, 'start_mqtt_consumer',
+            *self.argumentos,
+            '--instance-id', str(indice),
+        ]
+
+    def _iniciar_instancia(self, indice):
+        # Grupo/sessão próprios: Ctrl+C chega só ao supervisor, que repassa
+        # o encerramento a cada instância (uma única vez)
+        if os.name == 'nt':
+            kwargs = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            kwargs = {'start_new_session': True}
+
+        processo = subprocess.Popen(self._comando(indice), **kwargs)
+        self._processos[indice] = processo
+        self._iniciado_em[indice] = time.monotonic()
+        logger.info(f"[SUPERVISOR] Instância {indice} iniciada (pid={processo.pid})")
+
+    def _sinalizar(self, processo):
+        if processo.poll() is not None:
+            return
+        try:
+            if os.name == 'nt':
+                processo.send_signal(signal.CTRL_BREAK_EVENT)
+            else:
+                processo.terminate()
+        except OSError:
+            pass
+
+    # ==========================================================================
+    # CICLO DE VIDA
+    # ==========================================================================
+
+    def executar(self):
+        """Inicia as instâncias e as monitora até receber SIGINT/SIGTERM"""
+        self._ativo = True
+
+        def parar(sig, frame):
+            self._ativo = False
+
+        signal.signal(signal.SIGINT, parar)
+        signal.signal(signal.SIGTERM, parar)
+
+        for indice in range(self.instancias):
+            self._iniciar_instancia(indice)
+            self._falhas[indice] = 0
+
+        proximo_inicio = {}
+        try:
+            while self._ativo:
+                agora = time.monotonic()
+
+                for indice, processo in list(self._processos.items()):
+                    if processo is None:
+                        if agora >= proximo_inicio.get(indice, 0):
+                            self._iniciar_instancia(indice)
+                        continue
+
+                    codigo = processo.poll()
+                    if codigo is None:
+                        continue
+
+                    if agora - self._iniciado_em[indice] >= self.EXECUCAO_ESTAVEL:
+                        self._falhas[indice] = 0
+                    self._falhas[indice] += 1
+                    espera = min(2 ** self._falhas[indice], self.REINICIO_DELAY_MAX)
+
+                    logger.warning(
+                        f"[SUPERVISOR] Instância {indice} terminou (código={codigo}); "
+                        f"reiniciando em {espera}s"
+                    )
+                    self._processos[indice] = None
+                    proximo_inicio[indice] = agora + espera
+
+                time.sleep(1)
+        finally:
+            self.encerrar()
+
+    def encerrar(self, timeout=30):
+        """Pede shutdown gracioso às instâncias e força após o timeout"""
+        processos = [p for p in self._processos.values() if p is not None]
+        for processo in processos:
+            self._sinalizar(processo)
+
+        limite = time.monotonic() + timeout
+        for processo in processos:
+            try:
+                processo.wait(max(limite - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                logger.warning(f"[SUPERVISOR] pid={processo.pid} não encerrou; forçando")
+                processo.kill()
+
+        self._processos = {}
+        logger.info("[SUPERVISOR] Instâncias encerradas")
@@ -0,0 +1,185 @@
+# ==============================================================================
+# TDS New - MQTT Worker Pool
+# ==============================================================================
+# Arquivo: tds_new/consumers/worker_pool.py
+# Responsabilidade: Desacoplar a thread de rede do Paho das gravações no banco
+# ==============================================================================
+
+import logging
+import queue
+import threading
+import time
+
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger('mqtt_consumer')
+
+# ==============================================================================
+# POOL DE WORKERS COM FILA LIMITADA
+# ==============================================================================
+
+class MensagemWorkerPool:
+    """
+    Fila limitada entre on_message e um pool de threads de processamento
+
+    A thread de rede do Paho apenas enfileira (topic, payload) e retorna;
+    parsing JSON, lookups e commits rodam nos workers, cada um com sua
+    própria conexão Django (conexões são thread-local). Assim um commit lento
+    não atrasa PINGREQ/PUBACK e o broker não derruba o consumer.
+
+    Políticas com fila cheia:
+        block → on_message espera por espaço (não perde mensagens, mas a
+                thread de rede fica parada enquanto a fila não esvazia)
+        drop  → a mensagem nova é descartada e contabilizada em 'descartadas'
+                (incompatível com o modo durável: start_mqtt_consumer recusa
+                --durable com --queue-policy drop)
+
+    Em modo durável, mensagem descartada ou com erro no worker tem a
+    confirmação abandonada (ack.abandonar()): não segura o PUBACK das
+    mensagens seguintes e o broker a reentrega na próxima sessão.
+    """
+
+    POLITICAS = ('block', 'drop')
+
+    def __init__(self, processador, workers=4, tamanho_fila=10000, politica='block'):
+        """
+        Args:
+            processador (callable): processador(topic, payload, ack=None) executado nos workers
+            workers (int): Número de threads de processamento
+            tamanho_fila (int): Capacidade máxima da fila de mensagens
+            politica (str): 'block' ou 'drop' (comportamento com fila cheia)
+        """
+        if politica not in self.POLITICAS:
+            raise ValueError(f"Política de fila inválida: {politica} (use {', '.join(self.POLITICAS)})")
+        if workers < 1:
+            raise ValueError("O pool requer ao menos 1 worker")
+
+        self.processador = processador
+        self.workers = workers
+        self.politica = politica
+        self.tamanho_fila = tamanho_fila
+        self._fila = queue.Queue(maxsize=tamanho_fila)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._ultimo_aviso_descarte = 0.0
+
+        self._stats = {
+            'recebidas': 0,
+            'processadas': 0,
+            'erros': 0,
+            'descartadas': 0,
+        }
+
+    # ==========================================================================
+    # CICLO DE VIDA
+    # ==========================================================================
+
+    def iniciar(self):
+        """Inicia as threads de processamento"""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f'mqtt-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        logger.info(
+            f"[POOL] {self.workers} workers iniciados "
+            f"(fila={self._fila.maxsize}, política={self.politica})"
+        )
+
+    def parar(self, timeout=30):
+        """Processa o que restou na fila e encerra os workers"""
+        for _ in self._threads:
+            self._fila.put(None)  # sentinela de encerramento
+
+        limite = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(limite - time.monotonic(), 0))
+        self._threads = []
+
+        logger.info(f"[POOL] Workers encerrados: {self.estatisticas()}")
+
+    # ==========================================================================
+    # PRODUTOR (THREAD DE REDE DO PAHO)
+    # ==========================================================================
+
+    def enviar(self, topic, payload, ack=None):
+        """
+        Enfileira uma mensagem aplicando a política de fila cheia
+
+        Args:
+            topic (str): Topic MQTT
+            payload (bytes): Payload bruto (decodificado no worker)
+            ack (Confirmacao): Confirmação manual (PUBACK) repassada ao processador
+
+        Returns:
+            bool: False se a mensagem foi descartada
+        """
+        with self._lock:
+            self._stats['recebidas'] += 1
+
+        if self.politica == 'block':
+            self._fila.put((topic, payload, ack))
+            return True
+
+        try:
+            self._fila.put_nowait((topic, payload, ack))
+            return True
+        except queue.Full:
+            if ack is not None:
+                ack.abandonar()
+            with self._lock:
+                self._stats['descartadas'] += 1
+                avisar = time.monotonic() - self._ultimo_aviso_descarte >= 10
+                if avisar:
+                    self._ultimo_aviso_descarte = time.monotonic()
+            if avisar:
+                logger.warning(
+                    f"[POOL] Fila cheia ({self._fila.maxsize}): mensagens descartadas "
+                    f"(total={self._stats['descartadas']})"
+                )
+            return False
+
+    def estatisticas(self):
+        """
+        Returns:
+            dict: recebidas, processadas, erros, descartadas, fila (tamanho atual)
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['fila'] = self._fila.qsize()
+        return stats
+
+    # ==========================================================================
+    # WORKERS
+    # ==========================================================================
+
+    def _loop(self):
+        """Consome a fila até receber a sentinela"""
+        ultima_manutencao = time.monotonic()
+
+        try:
+            while True:
+                item = self._fila.get()
+                if item is None:
+                    return
+
+                topic, payload, ack = item
+                try:
+                    self.processador(topic, payload, ack=ack)
+                    with self._lock:
+                        self._stats['processadas'] += 1
+                except Exception as e:
+                    with self._lock:
+                        self._stats['erros'] += 1
+                    logger.exception(f"[CRITICAL] Erro no worker ao processar {topic}: {e}")
+                    if ack is not None:
+                        ack.abandonar()
+                    # Conexão pode ter ficado inutilizável após o erro
+                    close_old_connections()
+
+                # Respeita CONN_MAX_AGE/health checks sem custo por mensagem
+                if time.monotonic() - ultima_manutencao >= 60:
+                    close_old_connections()
+                    ultima_manutencao = time.monotonic()
+        finally:
+            connection.close()
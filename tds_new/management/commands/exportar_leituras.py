@@ -0,0 +1,118 @@
+# ==============================================================================
+# TDS New - Django Management Command: exportar_leituras
+# ==============================================================================
+# Arquivo: tds_new/management/commands/exportar_leituras.py
+# Responsabilidade: Exportar leituras de uma conta (CSV/NDJSON) em streaming
+# ==============================================================================
+
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tds_new.models import Conta
+from tds_new.services.exportacao import FORMATOS, exportar, leituras_periodo
+
+# ==============================================================================
+# DJANGO MANAGEMENT COMMAND
+# ==============================================================================
+
+class Command(BaseCommand):
+    help = (
+        'Exporta as leituras de uma conta no período [inicio, fim) em CSV ou NDJSON, '
+        'com cursor nomeado e memória constante (gzip opcional)'
+    )
+
+    def add_arguments(self, parser):
+        """Adiciona argumentos CLI ao comando"""
+        parser.add_argument(
+            '--conta',
+            type=int,
+            required=True,
+            help='ID da conta'
+        )
+
+        parser.add_argument(
+            '--inicio',
+            required=True,
+            help='Início do período (ISO 8601, inclusivo; sem fuso = TIME_ZONE)'
+        )
+
+        parser.add_argument(
+            '--fim',
+            required=True,
+            help='Fim do período (ISO 8601, exclusivo; sem fuso = TIME_ZONE)'
+        )
+
+        parser.add_argument(
+            '--formato',
+            choices=list(FORMATOS),
+            default='csv',
+            help='Formato de saída (padrão: csv)'
+        )
+
+        parser.add_argument(
+            '--dispositivo',
+            type=int,
+            action='append',
+            default=None,
+            help='Restringe ao dispositivo (pode repetir)'
+        )
+
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Comprime a saída (gzip)'
+        )
+
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Linhas por fetch do cursor (padrão: settings.TELEMETRY_EXPORT_CHUNK)'
+        )
+
+        parser.add_argument(
+            '--saida',
+            default='-',
+            help="Arquivo de saída ('-' = stdout)"
+        )
+
+    def handle(self, *args, **options):
+        """Executa o comando"""
+        if not Conta.objects.filter(id=options['conta']).exists():
+            raise CommandError(f"Conta {options['conta']} não encontrada")
+
+        inicio = self._instante(options['inicio'])
+        fim = self._instante(options['fim'])
+        if fim <= inicio:
+            raise CommandError('--fim deve ser posterior a --inicio')
+
+        blocos = exportar(
+            leituras_periodo(options['conta'], inicio, fim, options['dispositivo']),
+            options['formato'],
+            options['gzip'],
+            options['chunk_size']
+        )
+
+        if options['saida'] == '-':
+            self._gravar(blocos, sys.stdout.buffer)
+        else:
+            with open(options['saida'], 'wb') as arquivo:
+                self._gravar(blocos, arquivo)
+            self.stderr.write(self.style.SUCCESS(f"[EXPORT] Exportação gravada em {options['saida']}"))
+
+    @staticmethod
+    def _gravar(blocos, destino):
+        for bloco in blocos:
+            destino.write(bloco)
+        destino.flush()
+
+    @staticmethod
+    def _instante(valor):
+        try:
+            instante = datetime.fromisoformat(valor)
+        except ValueError:
+            raise CommandError(f"Data inválida: {valor} (use ISO 8601, ex.: 2026-01-31 ou 2026-01-31T12:00)")
+        return timezone.make_aware(instante) if timezone.is_naive(instante) else instante
@@ -6,8 +6,17 @@
 # ==============================================================================
 
 from django.core.management.base import BaseCommand, CommandError
-from tds_new.consumers.mqtt_telemetry import create_mqtt_client
+from functools import partial
+from tds_new.consumers.mqtt_telemetry import create_mqtt_client, processar_mensagem
 from tds_new.consumers.mqtt_config import MQTTConfig
+from tds_new.consumers.supervisor import ConsumerSupervisor
+from tds_new.consumers.worker_pool import MensagemWorkerPool
+from tds_new.services.ingest_buffer import LeituraBatchWriter
+from tds_new.services.liveness import gateway_liveness, offline_sweeper
+from tds_new.services.lookup_cache import gateway_cache, iniciar_listener_invalidacao
+from tds_new.services.payload_audit import get_auditoria
+import argparse
+import importlib.util
 import logging
 import signal
 import sys
@@ -37,6 +46,96 @@ class Command(BaseCommand):
             help='Override da porta MQTT (padrão: settings.MQTT_BROKER_PORT)'
         )
         
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Flush do writer em lote ao atingir N leituras (padrão: settings.TELEMETRY_BATCH_SIZE)'
+        )
+        
+        parser.add_argument(
+            '--batch-ms',
+            type=int,
+            default=None,
+            help='Flush do writer em lote após T ms (padrão: settings.TELEMETRY_BATCH_MAX_MS)'
+        )
+        
+        parser.add_argument(
+            '--no-batch',
+            action='store_true',
+            help='Desabilitar micro-batching (um commit por mensagem MQTT)'
+        )
+        
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Threads de processamento/gravação fora da thread de rede '
+                 '(padrão: settings.MQTT_CONSUMER_WORKERS; 0 = inline no on_message)'
+        )
+        
+        parser.add_argument(
+            '--queue-size',
+            type=int,
+            default=None,
+            help='Capacidade da fila entre on_message e os workers; na engine asyncio, concorrência '
+                 'e fila de entrada por conexão (padrão: settings.MQTT_CONSUMER_QUEUE_SIZE)'
+        )
+        
+        parser.add_argument(
+            '--queue-policy',
+            choices=MensagemWorkerPool.POLITICAS,
+            default=None,
+            help='Fila cheia: block (espera, sem perda) ou drop (descarta a mensagem nova) '
+                 '(padrão: settings.MQTT_CONSUMER_QUEUE_POLICY)'
+        )
+        
+        parser.add_argument(
+            '--shared-group',
+            type=str,
+            default=None,
+            help="Grupo de shared subscription $share/<grupo>/... "
+                 "(padrão: settings.MQTT_SHARED_GROUP; '' = subscription comum)"
+        )
+        
+        parser.add_argument(
+            '--instances',
+            type=int,
+            default=1,
+            help='Modo supervisor: sobe N processos consumer nesta máquina e os reinicia se caírem'
+        )
+        
+        parser.add_argument(
+            '--instance-id',
+            type=int,
+            default=None,
+            help='Índice da instância, usado no client ID (definido pelo supervisor; padrão: PID)'
+        )
+        
+        parser.add_argument(
+            '--durable',
+            action=argparse.BooleanOptionalAction,
+            default=None,
+            help='Sessão persistente (clean_session=False) com PUBACK após o commit; '
+                 '--no-durable força clean session (padrão: settings.MQTT_DURABLE_SESSION)'
+        )
+        
+        parser.add_argument(
+            '--engine',
+            choices=('paho', 'asyncio'),
+            default=None,
+            help='paho (thread de rede + callbacks) ou asyncio (aiomqtt, várias conexões '
+                 'em um event loop) (padrão: settings.MQTT_CONSUMER_ENGINE)'
+        )
+        
+        parser.add_argument(
+            '--connections',
+            type=int,
+            default=None,
+            help='Engine asyncio: conexões por broker, repartidas via shared subscription '
+                 '(padrão: settings.MQTT_ASYNC_CONNECTIONS)'
+        )
+        
         parser.add_argument(
             '--debug',
             action='store_true',
@@ -46,6 +145,12 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         """Executa o comando"""
         
+        self._politica_fila(options)
+        self._engine(options)
+        
+        if options['instances'] > 1:
+            return self.executar_supervisor(options)
+        
         # Configurar nível de log se --debug
         if options['debug']:
             logging.getLogger('mqtt_consumer').setLevel(logging.DEBUG)
@@ -58,6 +163,12 @@ class Command(BaseCommand):
             MQTTConfig.BROKER_PORT_TLS if MQTTConfig.USE_TLS else MQTTConfig.BROKER_PORT
         )
         
+        shared_group = options.get('shared_group')
+        if shared_group is None:
+            shared_group = MQTTConfig.SHARED_GROUP
+        durable = self._durable(options)
+        client_id = MQTTConfig.get_client_id(options.get('instance_id'), estavel=durable)
+        
         # Mensagem de início
         self.stdout.write(self.style.SUCCESS("╔═══════════════════════════════════════════════════╗"))
         self.stdout.write(self.style.SUCCESS("║   TDS NEW - MQTT TELEMETRY CONSUMER              ║"))
@@ -67,25 +178,97 @@ class Command(BaseCommand):
         # Exibir configurações
         self.stdout.write(self.style.NOTICE("[INFO] Configuracoes:"))
         self.stdout.write(f"   * Broker: {broker_host}:{broker_port}")
-        self.stdout.write(f"   * Client ID: {MQTTConfig.CLIENT_ID}")
-        self.stdout.write(f"   * Topic: {MQTTConfig.TOPIC_TELEMETRY}")
+        self.stdout.write(f"   * Client ID: {client_id}")
+        self.stdout.write(f"   * Topic: {MQTTConfig.get_subscribe_topic(grupo=shared_group)}")
         self.stdout.write(f"   * QoS: {MQTTConfig.QOS_SUBSCRIBE}")
+        self.stdout.write(
+            f"   * Sessão: {'Durável (ack após commit)' if durable else 'Clean session (ack automático)'}"
+        )
         self.stdout.write(f"   * TLS: {'Habilitado [OK]' if MQTTConfig.USE_TLS else 'Desabilitado [WARN]'}")
         self.stdout.write(f"   * Keepalive: {MQTTConfig.KEEPALIVE}s")
+        
+        # Writer em lote (um commit para várias mensagens)
+        writer = None
+        if not options['no_batch']:
+            writer = LeituraBatchWriter(
+                max_linhas=options.get('batch_size'),
+                max_espera_ms=options.get('batch_ms')
+            )
+            self.stdout.write(
+                f"   * Batch: {writer.max_linhas} leituras / {int(writer.max_espera * 1000)}ms"
+            )
+        else:
+            self.stdout.write("   * Batch: Desabilitado (commit por mensagem)")
+        
+        engine = self._engine(options)
+        if engine == 'asyncio':
+            if durable:
+                raise CommandError("--durable não é suportado com --engine=asyncio (aiomqtt sem ack manual)")
+            return self.executar_asyncio(options, writer, shared_group, broker_host, broker_port)
+        
+        # Pool de workers (desacopla a thread de rede das gravações)
+        workers = options.get('workers')
+        if workers is None:
+            workers = MQTTConfig.WORKERS
+        
+        politica = self._politica_fila(options)
+        
+        pool = None
+        if workers > 0:
+            try:
+                pool = MensagemWorkerPool(
+                    processador=partial(processar_mensagem, writer=writer),
+                    workers=workers,
+                    tamanho_fila=options.get('queue_size') or MQTTConfig.QUEUE_SIZE,
+                    politica=politica
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(
+                f"   * Workers: {pool.workers} (fila={pool.tamanho_fila}, política={pool.politica})"
+            )
+        else:
+            self.stdout.write("   * Workers: Desabilitado (processamento inline no on_message)")
         self.stdout.write("")
         
         # Criar cliente MQTT
         try:
             self.stdout.write(self.style.NOTICE("[SETUP] Criando cliente MQTT..."))
-            client = create_mqtt_client()
+            client = create_mqtt_client(
+                writer=writer,
+                pool=pool,
+                client_id=client_id,
+                shared_group=shared_group,
+                durable=durable
+            )
             self.stdout.write(self.style.SUCCESS("   [OK] Cliente criado"))
         except Exception as e:
             raise CommandError(f"Erro ao criar cliente MQTT: {e}")
         
+        # Pré-carregar cache MAC → gateway (evita query por mensagem no on_message)
+        try:
+            self.stdout.write(self.style.NOTICE("[SETUP] Pré-carregando cache de gateways..."))
+            total_gateways = gateway_cache.precarregar()
+            iniciar_listener_invalidacao()
+            self.stdout.write(self.style.SUCCESS(f"   [OK] {total_gateways} gateways em cache"))
+        except Exception as e:
+            raise CommandError(f"Erro ao pré-carregar cache de gateways: {e}")
+        
         # Registrar handler para SIGINT/SIGTERM (graceful shutdown)
         def signal_handler(sig, frame):
             self.stdout.write("")
             self.stdout.write(self.style.WARNING("[SIGNAL] Sinal de interrupcao recebido"))
+            # Fila e writer primeiro: os PUBACKs das leituras gravadas ainda
+            # saem pela conexão aberta (modo durável)
+            if pool is not None:
+                self.stdout.write(self.style.NOTICE("[STOP] Processando mensagens na fila..."))
+                pool.parar()
+            if writer is not None:
+                self.stdout.write(self.style.NOTICE("[STOP] Gravando leituras pendentes..."))
+                writer.parar()
+            gateway_liveness.parar()
+            offline_sweeper.parar()
+            get_auditoria().parar()
             self.stdout.write(self.style.NOTICE("[STOP] Desconectando do broker..."))
             client.disconnect()
             self.stdout.write(self.style.SUCCESS("[OK] Consumer encerrado com sucesso"))
@@ -93,6 +276,18 @@ class Command(BaseCommand):
         
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
+        if hasattr(signal, 'SIGBREAK'):
+            # Windows: encerramento enviado pelo supervisor (CTRL_BREAK_EVENT)
+            signal.signal(signal.SIGBREAK, signal_handler)
+        
+        # Iniciar writers e workers antes de receber mensagens
+        gateway_liveness.iniciar()
+        offline_sweeper.iniciar()
+        get_auditoria().iniciar()
+        if writer is not None:
+            writer.iniciar()
+        if pool is not None:
+            pool.iniciar()
         
         # Conectar ao broker
         try:
@@ -125,5 +320,133 @@ class Command(BaseCommand):
         finally:
             # Cleanup
             self.stdout.write(self.style.NOTICE("[CLEANUP] Limpeza final..."))
+            if pool is not None:
+                pool.parar()
+            if writer is not None:
+                writer.parar()
+            gateway_liveness.parar()
+            offline_sweeper.parar()
+            get_auditoria().parar()
             client.disconnect()
             self.stdout.write(self.style.SUCCESS("[OK] Desconectado do broker"))
+    
+    def _politica_fila(self, options):
+        """
+        Política de fila cheia do pool; drop é recusado em modo durável:
+        a mensagem descartada não recebe PUBACK, ocupa a janela de mensagens
+        em voo do broker e só volta após reconectar
+        """
+        politica = options.get('queue_policy') or MQTTConfig.QUEUE_POLICY
+        workers = options.get('workers')
+        if workers is None:
+            workers = MQTTConfig.WORKERS
+        if politica == 'drop' and workers > 0 and self._durable(options):
+            raise CommandError("--queue-policy drop não é suportado com --durable (use block)")
+        return politica
+    
+    @staticmethod
+    def _durable(options):
+        """--durable/--no-durable; sem nenhum dos dois, settings.MQTT_DURABLE_SESSION"""
+        durable = options.get('durable')
+        return MQTTConfig.DURABLE_SESSION if durable is None else durable
+    
+    def _engine(self, options):
+        """
+        Engine do consumer; asyncio depende de aiomqtt (requirements.txt),
+        verificado antes de subir o supervisor ou o writer
+        """
+        engine = options.get('engine') or MQTTConfig.ENGINE
+        if engine == 'asyncio' and importlib.util.find_spec('aiomqtt') is None:
+            raise CommandError(
+                "--engine=asyncio requer aiomqtt, não instalado "
+                "(pip install -r requirements.txt ou use --engine=paho)"
+            )
+        return engine
+    
+    def executar_supervisor(self, options):
+        """Modo --instances N: supervisiona N processos consumer locais"""
+        shared_group = options.get('shared_group')
+        if shared_group is None:
+            shared_group = MQTTConfig.SHARED_GROUP
+        if not shared_group:
+            raise CommandError(
+                "--instances requer shared subscription: defina MQTT_SHARED_GROUP ou --shared-group"
+            )
+        
+        # Repassa às instâncias as mesmas opções (exceto --instances)
+        argumentos = ['--shared-group', shared_group]
+        for opcao in ('broker', 'port', 'batch_size', 'batch_ms', 'workers', 'queue_size',
+                      'queue_policy', 'engine', 'connections'):
+            if options.get(opcao) is not None:
+                argumentos += [f"--{opcao.replace('_', '-')}", str(options[opcao])]
+        for flag in ('no_batch', 'debug'):
+            if options.get(flag):
+                argumentos.append(f"--{flag.replace('_', '-')}")
+        if options.get('durable') is not None:
+            argumentos.append('--durable' if options['durable'] else '--no-durable')
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"[SUPERVISOR] Iniciando {options['instances']} instâncias "
+            f"({MQTTConfig.get_subscribe_topic(grupo=shared_group)})"
+        ))
+        ConsumerSupervisor(options['instances'], argumentos).executar()
+        self.stdout.write(self.style.SUCCESS("[OK] Supervisor encerrado"))
+    
+    def executar_asyncio(self, options, writer, shared_group, broker_host, broker_port):
+        """Engine asyncio: N conexões (brokers × --connections) em um único event loop"""
+        from tds_new.consumers.mqtt_async import AsyncTelemetryConsumer, conexoes_padrao
+        
+        conexoes_por_broker = options.get('connections') or MQTTConfig.ASYNC_CONNECTIONS
+        if conexoes_por_broker > 1 and not shared_group:
+            raise CommandError("--connections > 1 requer shared subscription (MQTT_SHARED_GROUP ou --shared-group)")
+        
+        conexoes = conexoes_padrao(
+            conexoes_por_broker=conexoes_por_broker,
+            shared_group=shared_group,
+            host=options.get('broker'),
+            port=options.get('port'),
+            instancia=options.get('instance_id')
+        )
+        
+        try:
+            consumer = AsyncTelemetryConsumer(
+                conexoes,
+                writer=writer,
+                concorrencia=options.get('queue_size'),
+                threads=options.get('workers')
+            )
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        
+        self.stdout.write(f"   * Engine: asyncio ({len(conexoes)} conexões, {consumer.threads} threads de ORM)")
+        for conexao in conexoes:
+            self.stdout.write(f"     - {conexao.client_id} → {conexao.host}:{conexao.port} {list(conexao.topics)}")
+        self.stdout.write("")
+        
+        try:
+            self.stdout.write(self.style.NOTICE("[SETUP] Pré-carregando cache de gateways..."))
+            total_gateways = gateway_cache.precarregar()
+            iniciar_listener_invalidacao()
+            self.stdout.write(self.style.SUCCESS(f"   [OK] {total_gateways} gateways em cache"))
+        except Exception as e:
+            raise CommandError(f"Erro ao pré-carregar cache de gateways: {e}")
+        
+        gateway_liveness.iniciar()
+        offline_sweeper.iniciar()
+        get_auditoria().iniciar()
+        if writer is not None:
+            writer.iniciar()
+        
+        self.stdout.write(self.style.NOTICE("[LISTEN] Pressione Ctrl+C para encerrar"))
+        try:
+            consumer.executar()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("[WARN] Interrupcao via teclado"))
+        finally:
+            if writer is not None:
+                self.stdout.write(self.style.NOTICE("[STOP] Gravando leituras pendentes..."))
+                writer.parar()
+            gateway_liveness.parar()
+            offline_sweeper.parar()
+            get_auditoria().parar()
+            self.stdout.write(self.style.SUCCESS("[OK] Consumer encerrado"))
@@ -0,0 +1,402 @@
+# ==============================================================================
+# TDS New - Django Management Command: timescale_policies
+# ==============================================================================
+# Arquivo: tds_new/management/commands/timescale_policies.py
+# Responsabilidade: Aplicar compressão/retenção da hypertable e reportar chunks
+# ==============================================================================
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from tds_new.models import LeituraDispositivo
+
+# Configuração de compressão da hypertable de leituras: um segmento por
+# dispositivo (as queries sempre filtram por dispositivo) e ordem temporal
+COMPRESS_SEGMENTBY = ['dispositivo_id']
+COMPRESS_ORDERBY = ['time DESC']
+
+# ==============================================================================
+# DJANGO MANAGEMENT COMMAND
+# ==============================================================================
+
+class Command(BaseCommand):
+    help = (
+        'Aplica as políticas TimescaleDB da hypertable de leituras (chunk interval, '
+        'compressão, retenção/downsampling) a partir de settings e reporta o tamanho dos chunks'
+    )
+
+    def add_arguments(self, parser):
+        """Adiciona argumentos CLI ao comando"""
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Mostra os comandos SQL que seriam executados, sem alterar o banco'
+        )
+
+        parser.add_argument(
+            '--report',
+            action='store_true',
+            help='Apenas o relatório de chunks (não aplica políticas)'
+        )
+
+        parser.add_argument(
+            '--compress-now',
+            action='store_true',
+            help='Comprime já os chunks elegíveis (mais antigos que TIMESCALE_COMPRESS_AFTER)'
+        )
+
+    def handle(self, *args, **options):
+        """Executa o comando"""
+        self.dry_run = options['dry_run']
+        self.hypertable = LeituraDispositivo._meta.db_table
+
+        if connection.vendor != 'postgresql':
+            raise CommandError("TimescaleDB requer PostgreSQL (banco atual: %s)" % connection.vendor)
+
+        self._verificar_hypertable()
+
+        if not options['report']:
+            self.stdout.write(self.style.NOTICE(f"[POLICY] Hypertable {self.hypertable}"))
+            self.aplicar_chunk_interval(getattr(settings, 'TIMESCALE_CHUNK_INTERVAL', '') or None)
+            self.aplicar_compressao(getattr(settings, 'TIMESCALE_COMPRESS_AFTER', '') or None)
+            # Downsampling validado antes de qualquer drop de chunks brutos
+            self.validar_downsampling(getattr(settings, 'TIMESCALE_RETENTION', '') or None)
+            self.aplicar_retencao(getattr(settings, 'TIMESCALE_RETENTION', '') or None)
+            self.aplicar_retencao_caggs(getattr(settings, 'TIMESCALE_CAGG_RETENTION', {}) or {})
+
+            if options['compress_now']:
+                self.comprimir_agora(getattr(settings, 'TIMESCALE_COMPRESS_AFTER', '') or None)
+
+        self.relatorio_chunks()
+
+    # ==========================================================================
+    # POLÍTICAS
+    # ==========================================================================
+
+    def aplicar_chunk_interval(self, intervalo):
+        """set_chunk_time_interval (vale para os chunks criados a partir de agora)"""
+        if intervalo is None:
+            return
+
+        atual = self._valor(
+            "SELECT time_interval FROM timescaledb_information.dimensions "
+            "WHERE hypertable_name = %s AND column_name = 'time'",
+            [self.hypertable]
+        )
+        if atual is not None and self._mesmo_intervalo(atual, intervalo):
+            self._ok(f"chunk_time_interval = {intervalo}")
+            return
+
+        self._executar(
+            "SELECT set_chunk_time_interval(%s, %s::interval)",
+            [self.hypertable, intervalo],
+            f"chunk_time_interval: {_intervalo(atual) if atual else '?'} → {intervalo} (somente chunks novos)"
+        )
+
+    def aplicar_compressao(self, compress_after):
+        """Habilita a compressão (segmentby/orderby) e a política compress_after"""
+        if compress_after is None:
+            self._remover_job('policy_compression', self.hypertable, 'remove_compression_policy')
+            return
+
+        habilitada = self._valor(
+            "SELECT compression_enabled FROM timescaledb_information.hypertables WHERE hypertable_name = %s",
+            [self.hypertable]
+        )
+        segmentby, orderby = self._compressao_atual() if habilitada else (None, None)
+
+        if segmentby == COMPRESS_SEGMENTBY and orderby == COMPRESS_ORDERBY:
+            self._ok(f"compressão segmentby={','.join(segmentby)} orderby={','.join(orderby)}")
+        else:
+            comprimidos = self._valor(
+                "SELECT COUNT(*) FROM timescaledb_information.chunks WHERE hypertable_name = %s AND is_compressed",
+                [self.hypertable]
+            )
+            if comprimidos:
+                raise CommandError(
+                    f"Compressão configurada como segmentby={segmentby} orderby={orderby} e há "
+                    f"{comprimidos} chunks comprimidos. Descomprima-os (decompress_chunk) antes de "
+                    f"mudar para segmentby={COMPRESS_SEGMENTBY} orderby={COMPRESS_ORDERBY}."
+                )
+            self._executar(
+                f"ALTER TABLE {self.hypertable} SET ("
+                f"timescaledb.compress, "
+                f"timescaledb.compress_segmentby = '{','.join(COMPRESS_SEGMENTBY)}', "
+                f"timescaledb.compress_orderby = '{','.join(COMPRESS_ORDERBY)}')",
+                [],
+                f"compressão: segmentby={','.join(COMPRESS_SEGMENTBY)} orderby={','.join(COMPRESS_ORDERBY)}"
+            )
+
+        self._garantir_job(
+            'policy_compression', self.hypertable, 'compress_after', compress_after,
+            'add_compression_policy', 'remove_compression_policy'
+        )
+
+    def aplicar_retencao(self, drop_after):
+        """Política de retenção das leituras brutas (vazio = remove)"""
+        if drop_after is None:
+            self._remover_job('policy_retention', self.hypertable, 'remove_retention_policy')
+            return
+
+        self._garantir_job(
+            'policy_retention', self.hypertable, 'drop_after', drop_after,
+            'add_retention_policy', 'remove_retention_policy'
+        )
+
+    def aplicar_retencao_caggs(self, retencoes):
+        """Retenção por continuous aggregate (TIMESCALE_CAGG_RETENTION)"""
+        caggs = self._caggs()
+
+        for view, drop_after in retencoes.items():
+            if view not in caggs:
+                self.stdout.write(self.style.WARNING(f"   [WARN] Continuous aggregate inexistente: {view}"))
+                continue
+            if drop_after:
+                self._garantir_job(
+                    'policy_retention', caggs[view], 'drop_after', drop_after,
+                    'add_retention_policy', 'remove_retention_policy', alvo=view
+                )
+            else:
+                self._remover_job('policy_retention', caggs[view], 'remove_retention_policy', alvo=view)
+
+    def validar_downsampling(self, drop_after):
+        """
+        Com retenção das leituras brutas, cada continuous aggregate precisa de
+        janela de refresh (start_offset) menor que a retenção: um refresh sobre
+        chunks já removidos apagaria o histórico agregado.
+        """
+        if drop_after is None:
+            return
+
+        for view, materializada in self._caggs().items():
+            start_offset = self._valor(
+                "SELECT config->>'start_offset' FROM timescaledb_information.jobs "
+                "WHERE proc_name = 'policy_refresh_continuous_aggregate' AND hypertable_name = %s",
+                [materializada]
+            )
+            if start_offset is None or not self._menor_intervalo(start_offset, drop_after):
+                raise CommandError(
+                    f"Downsampling inseguro: {view} tem start_offset={start_offset or 'NULL (tudo)'} "
+                    f"e a retenção das leituras brutas é {drop_after}. Reduza o start_offset do "
+                    f"refresh ou aumente TIMESCALE_RETENTION."
+                )
+            self._ok(f"downsampling: {view} refresh start_offset={start_offset} < retenção {drop_after}")
+
+    def comprimir_agora(self, compress_after):
+        """compress_chunk nos chunks mais antigos que compress_after ainda não comprimidos"""
+        if compress_after is None:
+            raise CommandError("--compress-now requer TIMESCALE_COMPRESS_AFTER")
+
+        self._executar(
+            "SELECT compress_chunk(c, if_not_compressed => TRUE) "
+            "FROM show_chunks(%s, older_than => %s::interval) AS c",
+            [self.hypertable, compress_after],
+            f"compress_chunk em chunks mais antigos que {compress_after}"
+        )
+
+    # ==========================================================================
+    # RELATÓRIO
+    # ==========================================================================
+
+    def relatorio_chunks(self):
+        """Tamanho por chunk antes/depois da compressão e sugestão de chunk interval"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.chunk_name, c.range_start, c.range_end, c.is_compressed, "
+                "       s.total_bytes, cs.before_compression_total_bytes, cs.after_compression_total_bytes "
+                "FROM timescaledb_information.chunks AS c "
+                "LEFT JOIN chunks_detailed_size(%s::regclass) AS s "
+                "       ON s.chunk_schema = c.chunk_schema AND s.chunk_name = c.chunk_name "
+                "LEFT JOIN chunk_compression_stats(%s::regclass) AS cs "
+                "       ON cs.chunk_schema = c.chunk_schema AND cs.chunk_name = c.chunk_name "
+                "WHERE c.hypertable_name = %s "
+                "ORDER BY c.range_start",
+                [self.hypertable, self.hypertable, self.hypertable]
+            )
+            chunks = cursor.fetchall()
+
+        self.stdout.write("")
+        self.stdout.write(self.style.NOTICE(f"[REPORT] {len(chunks)} chunks em {self.hypertable}"))
+        if not chunks:
+            return
+
+        self.stdout.write(
+            f"   {'chunk':<28} {'início':<17} {'fim':<17} {'antes':>10} {'depois':>10} {'taxa':>6}"
+        )
+
+        total_antes = total_depois = 0
+        tamanhos_brutos = []
+        for nome, inicio, fim, comprimido, total, antes, depois in chunks:
+            if comprimido and antes:
+                taxa = f"{antes / depois:.1f}x" if depois else '-'
+                total_antes += antes
+                total_depois += depois or 0
+                tamanhos_brutos.append((fim - inicio, antes))
+            else:
+                antes, depois, taxa = total or 0, None, '-'
+                total_antes += antes
+                total_depois += antes
+                tamanhos_brutos.append((fim - inicio, antes))
+
+            self.stdout.write(
+                f"   {nome:<28} {inicio:%Y-%m-%d %H:%M} {fim:%Y-%m-%d %H:%M} "
+                f"{_mb(antes):>10} {_mb(depois) if depois is not None else '-':>10} {taxa:>6}"
+            )
+
+        self.stdout.write(
+            f"   {'TOTAL':<64} {_mb(total_antes):>10} {_mb(total_depois):>10} "
+            f"{(total_antes / total_depois if total_depois else 0):>5.1f}x"
+        )
+
+        self._sugerir_chunk_interval(tamanhos_brutos[-8:-1] or tamanhos_brutos[-1:])
+
+    def _sugerir_chunk_interval(self, amostra):
+        """
+        Chunk interval para que um chunk bruto (dados + índices) ocupe ~alvo
+
+        Alvo: TIMESCALE_CHUNK_TARGET_MB ou shared_buffers (os chunks ativos
+        devem caber em memória). Amostra: os últimos chunks fechados.
+        """
+        alvo_mb = getattr(settings, 'TIMESCALE_CHUNK_TARGET_MB', 0)
+        if alvo_mb:
+            alvo = alvo_mb * 1024 * 1024
+            origem = 'TIMESCALE_CHUNK_TARGET_MB'
+        else:
+            alvo = self._valor("SELECT pg_size_bytes(current_setting('shared_buffers'))", [])
+            origem = 'shared_buffers'
+
+        segundos = sum(duracao.total_seconds() for duracao, _ in amostra)
+        tamanho = sum(tamanho for _, tamanho in amostra)
+        if not segundos or not tamanho:
+            return
+
+        bytes_por_hora = tamanho / segundos * 3600
+        sugerido = timedelta(hours=max(1, round(alvo / bytes_por_hora)))
+
+        self.stdout.write("")
+        self.stdout.write(
+            f"[REPORT] Ingestão ~{_mb(bytes_por_hora * 24)}/dia (últimos {len(amostra)} chunks); "
+            f"alvo por chunk {_mb(alvo)} ({origem})"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"   Chunk interval sugerido: {_intervalo(sugerido)} "
+            f"(atual: {getattr(settings, 'TIMESCALE_CHUNK_INTERVAL', '') or '-'})"
+        ))
+
+    # ==========================================================================
+    # HELPERS
+    # ==========================================================================
+
+    def _verificar_hypertable(self):
+        if not self._valor("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'", []):
+            raise CommandError("Extensão timescaledb não instalada neste banco")
+        if not self._valor(
+            "SELECT 1 FROM timescaledb_information.hypertables WHERE hypertable_name = %s", [self.hypertable]
+        ):
+            raise CommandError(
+                f"{self.hypertable} não é hypertable (rode scripts/setup_timescaledb.sql)"
+            )
+
+    def _compressao_atual(self):
+        """(segmentby, orderby) configurados, na ordem dos índices"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT attname, segmentby_column_index, orderby_column_index, orderby_asc "
+                "FROM timescaledb_information.compression_settings WHERE hypertable_name = %s",
+                [self.hypertable]
+            )
+            linhas = cursor.fetchall()
+
+        segmentby = [nome for nome, seg, _, _ in sorted(
+            (l for l in linhas if l[1] is not None), key=lambda l: l[1]
+        )]
+        orderby = [f"{nome}{'' if asc else ' DESC'}" for nome, _, _, asc in sorted(
+            (l for l in linhas if l[2] is not None), key=lambda l: l[2]
+        )]
+        return segmentby, orderby
+
+    def _caggs(self):
+        """{view_name: materialization_hypertable_name} dos caggs sobre a hypertable"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT view_name, materialization_hypertable_name "
+                "FROM timescaledb_information.continuous_aggregates WHERE hypertable_name = %s",
+                [self.hypertable]
+            )
+            return dict(cursor.fetchall())
+
+    def _garantir_job(self, proc, hypertable, chave, intervalo, funcao_add, funcao_remove, alvo=None):
+        """Cria a política ou recria se o intervalo configurado divergir"""
+        alvo = alvo or hypertable
+        atual = self._valor(
+            f"SELECT config->>'{chave}' FROM timescaledb_information.jobs "
+            f"WHERE proc_name = %s AND hypertable_name = %s",
+            [proc, hypertable]
+        )
+
+        if atual is not None and self._mesmo_intervalo(atual, intervalo):
+            self._ok(f"{funcao_add}({alvo}, {chave}={intervalo})")
+            return
+
+        if atual is not None:
+            self._executar(
+                f"SELECT {funcao_remove}(%s, if_exists => TRUE)", [alvo],
+                f"{funcao_remove}({alvo}) — {chave} era {atual}"
+            )
+        self._executar(
+            f"SELECT {funcao_add}(%s, %s::interval)", [alvo, intervalo],
+            f"{funcao_add}({alvo}, {chave}={intervalo})"
+        )
+
+    def _remover_job(self, proc, hypertable, funcao_remove, alvo=None):
+        alvo = alvo or hypertable
+        if self._valor(
+            "SELECT 1 FROM timescaledb_information.jobs WHERE proc_name = %s AND hypertable_name = %s",
+            [proc, hypertable]
+        ):
+            self._executar(
+                f"SELECT {funcao_remove}(%s, if_exists => TRUE)", [alvo],
+                f"{funcao_remove}({alvo}) — política desabilitada em settings"
+            )
+
+    def _mesmo_intervalo(self, a, b):
+        return bool(self._valor("SELECT %s::interval = %s::interval", [a, b]))
+
+    def _menor_intervalo(self, a, b):
+        return bool(self._valor("SELECT %s::interval < %s::interval", [a, b]))
+
+    def _valor(self, sql, parametros):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, parametros)
+            linha = cursor.fetchone()
+        return linha[0] if linha else None
+
+    def _executar(self, sql, parametros, descricao):
+        if self.dry_run:
+            texto = connection.ops.compose_sql(sql, parametros) if parametros else sql
+            self.stdout.write(self.style.WARNING(f"   [DRY-RUN] {descricao}"))
+            self.stdout.write(f"      {texto};")
+            return
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, parametros)
+        self.stdout.write(self.style.SUCCESS(f"   [APPLY] {descricao}"))
+
+    def _ok(self, descricao):
+        self.stdout.write(f"   [OK] {descricao}")
+
+
+def _mb(total_bytes):
+    return f"{total_bytes / (1024 * 1024):,.1f} MB"
+
+
+def _intervalo(duracao):
+    horas = int(duracao.total_seconds() // 3600)
+    if horas % 24 == 0:
+        dias = horas // 24
+        return f"{dias} day{'s' if dias > 1 else ''}"
+    return f"{horas} hours"
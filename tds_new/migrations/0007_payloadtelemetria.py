@@ -0,0 +1,52 @@
+"""
+Migration 0007 — PayloadTelemetria (auditoria comprimida das mensagens)
+
+Adiciona tds_new_payload_telemetria: uma linha por mensagem auditada, com o
+payload original comprimido (zlib). Substitui o payload_raw por leitura na
+hypertable (a coluna continua existindo para as leituras antigas).
+
+Gerado manualmente: 2026-10-17
+"""
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tds_new', '0006_registroprovisionamento_csr_pem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayloadTelemetria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time', models.DateTimeField(blank=True, null=True, verbose_name='Timestamp', help_text='Timestamp da mensagem (vazio se o payload não pôde ser lido)')),
+                ('recebido_em', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Recebido em')),
+                ('formato', models.CharField(default='json', max_length=10, verbose_name='Formato', help_text='json, cbor ou msgpack')),
+                ('motivo', models.CharField(
+                    choices=[
+                        ('ERRO', 'Erro — mensagem rejeitada ou com leituras ignoradas'),
+                        ('AMOSTRA', 'Amostra — política sampled:N'),
+                        ('COMPLETO', 'Completo — política full'),
+                    ],
+                    max_length=10,
+                    verbose_name='Motivo',
+                )),
+                ('erro', models.TextField(blank=True, default='', verbose_name='Erro', help_text='Motivo da rejeição / leituras ignoradas (motivo=ERRO)')),
+                ('tamanho_original', models.PositiveIntegerField(verbose_name='Tamanho Original (bytes)')),
+                ('payload', models.BinaryField(verbose_name='Payload (zlib)', help_text='Bytes recebidos do broker, comprimidos com zlib')),
+                ('conta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tds_new.conta', verbose_name='Conta')),
+                ('gateway', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tds_new.gateway', verbose_name='Gateway')),
+            ],
+            options={
+                'verbose_name': 'Payload de Telemetria',
+                'verbose_name_plural': 'Payloads de Telemetria',
+                'db_table': 'tds_new_payload_telemetria',
+                'indexes': [models.Index(fields=['conta', 'recebido_em'], name='tds_new_pay_conta_i_67c881_idx')],
+                'constraints': [models.UniqueConstraint(fields=('gateway', 'time'), name='uq_payload_telemetria_gateway_time')],
+            },
+        ),
+    ]
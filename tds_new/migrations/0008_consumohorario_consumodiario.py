@@ -0,0 +1,53 @@
+"""
+Migration 0008 — ConsumoHorario e ConsumoDiario (continuous aggregates)
+
+Registra os models não gerenciados das views tds_new_consumo_horario e
+tds_new_consumo_diario. As views são criadas pelo TimescaleDB via
+scripts/create_consumo_horario_diario.sql (esta migration não gera DDL).
+
+Gerado manualmente: 2026-10-17
+"""
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _campos_agregado():
+    return [
+        ('bucket', models.DateTimeField(primary_key=True, serialize=False, verbose_name='Bucket', help_text='Início do intervalo (resultado do time_bucket, UTC)')),
+        ('soma', models.DecimalField(decimal_places=4, max_digits=20, verbose_name='Soma', help_text='Soma dos valores das leituras do intervalo')),
+        ('contagem', models.BigIntegerField(verbose_name='Quantidade de Leituras')),
+        ('minimo', models.DecimalField(decimal_places=4, max_digits=15, verbose_name='Mínimo')),
+        ('maximo', models.DecimalField(decimal_places=4, max_digits=15, verbose_name='Máximo')),
+        ('conta', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='tds_new.conta', verbose_name='Conta')),
+        ('dispositivo', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='tds_new.dispositivo', verbose_name='Dispositivo')),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tds_new', '0007_payloadtelemetria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumoHorario',
+            fields=_campos_agregado(),
+            options={
+                'verbose_name': 'Consumo Horário',
+                'verbose_name_plural': 'Consumos Horários',
+                'db_table': 'tds_new_consumo_horario',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ConsumoDiario',
+            fields=_campos_agregado(),
+            options={
+                'verbose_name': 'Consumo Diário',
+                'verbose_name_plural': 'Consumos Diários',
+                'db_table': 'tds_new_consumo_diario',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+"""
+Migration 0009 — MedidorHorario (continuous aggregate)
+
+Registra o model não gerenciado da view tds_new_medidor_horario (primeira,
+última e máxima leitura por hora). A view é criada pelo TimescaleDB via
+scripts/create_medidor_horario.sql (esta migration não gera DDL).
+
+Gerado manualmente: 2026-10-17
+"""
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tds_new', '0008_consumohorario_consumodiario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedidorHorario',
+            fields=[
+                ('bucket', models.DateTimeField(primary_key=True, serialize=False, verbose_name='Bucket', help_text='Início da hora (resultado do time_bucket, UTC)')),
+                ('primeiro', models.DecimalField(decimal_places=4, max_digits=15, verbose_name='Primeira Leitura', help_text='Valor da leitura mais antiga da hora')),
+                ('ultimo', models.DecimalField(decimal_places=4, max_digits=15, verbose_name='Última Leitura', help_text='Valor da leitura mais recente da hora')),
+                ('maximo', models.DecimalField(decimal_places=4, max_digits=15, verbose_name='Máximo')),
+                ('contagem', models.BigIntegerField(verbose_name='Quantidade de Leituras')),
+                ('conta', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='tds_new.conta', verbose_name='Conta')),
+                ('dispositivo', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='tds_new.dispositivo', verbose_name='Dispositivo')),
+            ],
+            options={
+                'verbose_name': 'Medidor Horário',
+                'verbose_name_plural': 'Medidores Horários',
+                'db_table': 'tds_new_medidor_horario',
+                'managed': False,
+            },
+        ),
+    ]
@@ -4,7 +4,8 @@ Pacote de modelos do TDS New
 Estrutura:
 - base.py: Modelos base (CustomUser, Conta, ContaMembership, SaaSBaseModel)
 - dispositivos.py: Modelos de dispositivos IoT (Gateway, Dispositivo)
-- telemetria.py: Modelos de leituras e telemetria (LeituraDispositivo, ConsumoMensal)
+- telemetria.py: Modelos de leituras e telemetria (LeituraDispositivo, ConsumoMensal,
+  ConsumoHorario, ConsumoDiario, MedidorHorario, PayloadTelemetria)
 - certificados.py: Modelos de certificados X.509 (CertificadoDevice)
 """
 
@@ -30,6 +31,10 @@ from .dispositivos import (
 from .telemetria import (
     LeituraDispositivo,
     ConsumoMensal,
+    ConsumoHorario,
+    ConsumoDiario,
+    MedidorHorario,
+    PayloadTelemetria,
 )
 
 # Importa modelos de certificados (Week 6-7)
@@ -52,6 +57,10 @@ __all__ = [
     'Dispositivo',
     'LeituraDispositivo',
     'ConsumoMensal',
+    'ConsumoHorario',
+    'ConsumoDiario',
+    'MedidorHorario',
+    'PayloadTelemetria',
     'CertificadoDevice',
     'BootstrapCertificate',
     'RegistroProvisionamento',
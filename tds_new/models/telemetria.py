@@ -3,10 +3,20 @@ Modelos de Telemetria - TDS New
 
 LeituraDispositivo: TimescaleDB hypertable para leituras de telemetria
 ConsumoMensal: Continuous aggregate para consumo mensal agregado
+ConsumoHorario / ConsumoDiario: Continuous aggregates horário e diário (roteador de consultas)
+MedidorHorario: Continuous aggregate horário de primeira/última leitura (motor de consumo)
+PayloadTelemetria: Auditoria das mensagens MQTT (payload original comprimido)
 """
 
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models, transaction
+from django.utils import timezone
+from datetime import datetime, timezone as dt_timezone
 from decimal import Decimal
+import io
+import json
+import struct
+import zlib
 
 from .base import Conta
 from .dispositivos import Gateway, Dispositivo
@@ -24,9 +34,12 @@ class LeituraDispositivo(models.Model):
     
     Importante:
     - Hypertable deve ser criada manualmente via SQL após migration
-    - Usar bulk_create() para inserções em lote
+    - Usar copy_bulk() (COPY FROM STDIN) ou bulk_create() para inserções em lote
     """
     
+    # Colunas gravadas pelo copy_bulk() (id é BIGSERIAL, preenchido pelo banco)
+    COPY_COLUNAS = ('time', 'conta_id', 'gateway_id', 'dispositivo_id', 'valor', 'unidade', 'payload_raw')
+    
     # Partition key (TimescaleDB)
     time = models.DateTimeField(
         verbose_name="Timestamp",
@@ -124,6 +137,239 @@ class LeituraDispositivo(models.Model):
         """
         objetos = [LeituraDispositivo(**data) for data in leituras_data]
         return LeituraDispositivo.objects.bulk_create(objetos)
+    
+    @classmethod
+    def copy_bulk(cls, leituras, formato='text', using='default', ignorar_duplicadas=False,
+                  retornar_inseridas=False):
+        """
+        Grava leituras via COPY FROM STDIN (mais rápido que bulk_create)
+        
+        As linhas são serializadas sob demanda e transmitidas em streaming ao
+        PostgreSQL: não há INSERT multi-row nem adaptação Decimal/JSON por
+        parâmetro, e a memória não cresce com o tamanho do lote.
+        
+        Em bancos não-PostgreSQL (ex: SQLite em testes) cai para bulk_create.
+        
+        Com ignorar_duplicadas=True o COPY vai para uma tabela temporária de
+        staging e as linhas entram via INSERT ... SELECT ... ON CONFLICT DO
+        NOTHING: leituras já existentes em (dispositivo_id, time) são
+        descartadas (índice único uq_leitura_dispositivo_time, ver
+        scripts/add_unique_leitura_dispositivo_time.sql).
+        
+        Args:
+            leituras (iterable[LeituraDispositivo]): Objetos ainda não salvos
+            formato (str): 'text' (padrão) ou 'binary' (COPY ... FORMAT binary)
+            using (str): Alias do banco
+            ignorar_duplicadas (bool): Descartar conflitos de chave única
+            retornar_inseridas (bool): Retornar as chaves das leituras
+                inseridas (INSERT ... RETURNING) em vez da contagem
+        
+        Returns:
+            int | set[tuple]: Número de leituras efetivamente inseridas, ou
+            {(dispositivo_id, time)} das inseridas com retornar_inseridas
+        
+        Example:
+            leituras = [LeituraDispositivo(time=..., conta_id=1, gateway_id=1,
+                                           dispositivo_id=3, valor=Decimal('1.5'),
+                                           unidade='kWh')]
+            LeituraDispositivo.copy_bulk(leituras, formato='binary')
+        """
+        if formato not in ('text', 'binary'):
+            raise ValueError(f"Formato de COPY inválido: {formato} (use 'text' ou 'binary')")
+        
+        connection = connections[using]
+        if retornar_inseridas:
+            leituras = list(leituras)
+        
+        if connection.vendor != 'postgresql':
+            criadas = cls.objects.using(using).bulk_create(
+                list(leituras), ignore_conflicts=ignorar_duplicadas
+            )
+            return _chaves(criadas) if retornar_inseridas else len(criadas)
+        
+        colunas = ', '.join(cls.COPY_COLUNAS)
+        destino = _COPY_STAGING if ignorar_duplicadas else cls._meta.db_table
+        sql = f"COPY {destino} ({colunas}) FROM STDIN WITH (FORMAT {formato})"
+        linhas = _CopyContador(leituras)
+        gerador = _copy_binario(linhas) if formato == 'binary' else _copy_texto(linhas)
+        
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            if ignorar_duplicadas:
+                # Tabela temporária da sessão (reaproveitada pela conexão do consumer)
+                cursor.execute(
+                    f"CREATE TEMP TABLE IF NOT EXISTS {_COPY_STAGING} ON COMMIT DELETE ROWS AS "
+                    f"SELECT {colunas} FROM {cls._meta.db_table} WITH NO DATA"
+                )
+            
+            if hasattr(cursor.cursor, 'copy_expert'):
+                # psycopg2: lê do "arquivo" em blocos
+                cursor.cursor.copy_expert(sql, _StreamIterador(gerador))
+            else:
+                # psycopg 3: escreve blocos no contexto de COPY
+                with cursor.cursor.copy(sql) as copy:
+                    for bloco in gerador:
+                        copy.write(bloco)
+            
+            if not ignorar_duplicadas:
+                return _chaves(leituras) if retornar_inseridas else linhas.total
+            
+            cursor.execute(
+                f"INSERT INTO {cls._meta.db_table} ({colunas}) "
+                f"SELECT {colunas} FROM {_COPY_STAGING} ON CONFLICT DO NOTHING"
+                + (" RETURNING dispositivo_id, time" if retornar_inseridas else "")
+            )
+            inseridas = set(cursor.fetchall()) if retornar_inseridas else cursor.rowcount
+            # Várias chamadas na mesma transação: esvazia antes do commit
+            cursor.execute(f"TRUNCATE {_COPY_STAGING}")
+        
+        return inseridas
+
+
+# ==============================================================================
+# SERIALIZAÇÃO PARA COPY FROM STDIN (usado por LeituraDispositivo.copy_bulk)
+# ==============================================================================
+
+_PG_EPOCH = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+_COPY_BINARIO_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+_COPY_BINARIO_TRAILER = struct.pack('!h', -1)
+_COPY_TEXTO_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+_COPY_LINHAS_POR_BLOCO = 1000
+_COPY_STAGING = 'tmp_tds_new_leitura_staging'
+
+
+def _chaves(leituras):
+    """Chaves únicas (dispositivo_id, time) das leituras"""
+    return {(leitura.dispositivo_id, leitura.time) for leitura in leituras}
+
+
+class _CopyContador:
+    """Itera as leituras contando quantas foram serializadas"""
+    
+    def __init__(self, leituras):
+        self.leituras = leituras
+        self.total = 0
+    
+    def __iter__(self):
+        for leitura in self.leituras:
+            self.total += 1
+            yield leitura
+
+
+class _StreamIterador(io.RawIOBase):
+    """Adapta um gerador de blocos bytes para a interface de arquivo (read)"""
+    
+    def __init__(self, blocos):
+        self._blocos = iter(blocos)
+        self._resto = b''
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        while not self._resto:
+            try:
+                self._resto = next(self._blocos)
+            except StopIteration:
+                return 0
+        n = min(len(buffer), len(self._resto))
+        buffer[:n] = self._resto[:n]
+        self._resto = self._resto[n:]
+        return n
+
+
+def _copy_time(valor):
+    """Garante datetime timezone-aware (mesma regra do bulk_create com USE_TZ)"""
+    if timezone.is_naive(valor):
+        valor = timezone.make_aware(valor)
+    return valor
+
+
+def _copy_texto(leituras):
+    """Gera blocos no formato COPY text (tab-separated, NULL = \\N)"""
+    linhas = []
+    for leitura in leituras:
+        if leitura.payload_raw is None:
+            payload = '\\N'
+        else:
+            payload = json.dumps(leitura.payload_raw, cls=DjangoJSONEncoder).translate(_COPY_TEXTO_ESCAPES)
+        
+        linhas.append(
+            f"{_copy_time(leitura.time).isoformat()}\t{leitura.conta_id}\t{leitura.gateway_id}\t"
+            f"{leitura.dispositivo_id}\t{leitura.valor}\t"
+            f"{leitura.unidade.translate(_COPY_TEXTO_ESCAPES)}\t{payload}\n"
+        )
+        if len(linhas) >= _COPY_LINHAS_POR_BLOCO:
+            yield ''.join(linhas).encode('utf-8')
+            linhas = []
+    
+    if linhas:
+        yield ''.join(linhas).encode('utf-8')
+
+
+def _numeric_binario(valor):
+    """Codifica Decimal no formato binário NUMERIC do PostgreSQL (dígitos base 10000)"""
+    valor = Decimal(valor)
+    if not valor.is_finite():
+        raise ValueError(f"Valor não finito não suportado em COPY binário: {valor}")
+    
+    sinal = 0x4000 if valor.is_signed() and valor != 0 else 0x0000
+    dscale = max(-valor.as_tuple().exponent, 0)
+    inteiro, _, fracao = format(abs(valor), 'f').partition('.')
+    inteiro = inteiro.lstrip('0')
+    inteiro = '0' * (-len(inteiro) % 4) + inteiro
+    fracao = fracao + '0' * (-len(fracao) % 4)
+    
+    digitos = [int(inteiro[i:i + 4]) for i in range(0, len(inteiro), 4)]
+    peso = len(digitos) - 1
+    digitos += [int(fracao[i:i + 4]) for i in range(0, len(fracao), 4)]
+    
+    while digitos and digitos[0] == 0:
+        digitos.pop(0)
+        peso -= 1
+    while digitos and digitos[-1] == 0:
+        digitos.pop()
+    if not digitos:
+        peso = 0
+    
+    return struct.pack(f'!hhHH{len(digitos)}H', len(digitos), peso, sinal, dscale, *digitos)
+
+
+def _copy_binario(leituras):
+    """Gera blocos no formato COPY binary (PGCOPY)"""
+    campo = struct.Struct('!i')
+    bigint = struct.Struct('!iq')
+    
+    partes = [_COPY_BINARIO_HEADER]
+    contador = 0
+    for leitura in leituras:
+        delta = _copy_time(leitura.time) - _PG_EPOCH
+        micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+        valor = _numeric_binario(leitura.valor)
+        unidade = leitura.unidade.encode('utf-8')
+        
+        partes.append(struct.pack('!h', len(LeituraDispositivo.COPY_COLUNAS)))
+        partes.append(bigint.pack(8, micros))
+        partes.append(bigint.pack(8, leitura.conta_id))
+        partes.append(bigint.pack(8, leitura.gateway_id))
+        partes.append(bigint.pack(8, leitura.dispositivo_id))
+        partes.append(campo.pack(len(valor)) + valor)
+        partes.append(campo.pack(len(unidade)) + unidade)
+        
+        if leitura.payload_raw is None:
+            partes.append(campo.pack(-1))
+        else:
+            # jsonb binário: byte de versão (1) + texto JSON
+            payload = b'\x01' + json.dumps(leitura.payload_raw, cls=DjangoJSONEncoder).encode('utf-8')
+            partes.append(campo.pack(len(payload)) + payload)
+        
+        contador += 1
+        if contador >= _COPY_LINHAS_POR_BLOCO:
+            yield b''.join(partes)
+            partes = []
+            contador = 0
+    
+    partes.append(_COPY_BINARIO_TRAILER)
+    yield b''.join(partes)
 
 
 class ConsumoMensal(models.Model):
@@ -139,6 +385,9 @@ class ConsumoMensal(models.Model):
     Importante:
     - View deve ser criada manualmente via SQL após migration
     - Dados são atualizados automaticamente pelo TimescaleDB
+    - total_consumo é SUM(valor): não vale para medidores acumulados (kWh,
+      m³), cujo consumo mensal vem de MotorConsumo.consumo_mensal()
+      (tds_new/services/consumo.py)
     """
     
     # Aggregation key
@@ -190,3 +439,254 @@ class ConsumoMensal(models.Model):
     
     def __str__(self):
         return f"{self.dispositivo.codigo} - {self.mes_referencia.strftime('%m/%Y')} - {self.total_consumo}"
+
+
+class ConsumoAgregado(models.Model):
+    """
+    Base dos continuous aggregates horário e diário (soma, contagem, mín, máx)
+
+    Lidos pelo roteador de consultas (tds_new/services/query_router.py), que
+    escolhe o agregado mais grosso compatível com o bucket pedido e completa a
+    cauda ainda não materializada com as leituras brutas.
+
+    Importante:
+    - Views criadas via scripts/create_consumo_horario_diario.sql
+    - A view não tem id: bucket é a pk nominal do Django; a chave real é
+      (bucket, dispositivo). Consultar com values()/agregações.
+    """
+
+    bucket = models.DateTimeField(
+        primary_key=True,
+        verbose_name="Bucket",
+        help_text="Início do intervalo (resultado do time_bucket, UTC)"
+    )
+
+    conta = models.ForeignKey(
+        Conta,
+        on_delete=models.DO_NOTHING,
+        verbose_name="Conta"
+    )
+
+    dispositivo = models.ForeignKey(
+        Dispositivo,
+        on_delete=models.DO_NOTHING,
+        verbose_name="Dispositivo"
+    )
+
+    soma = models.DecimalField(
+        max_digits=20,
+        decimal_places=4,
+        verbose_name="Soma",
+        help_text="Soma dos valores das leituras do intervalo"
+    )
+
+    contagem = models.BigIntegerField(
+        verbose_name="Quantidade de Leituras"
+    )
+
+    minimo = models.DecimalField(
+        max_digits=15,
+        decimal_places=4,
+        verbose_name="Mínimo"
+    )
+
+    maximo = models.DecimalField(
+        max_digits=15,
+        decimal_places=4,
+        verbose_name="Máximo"
+    )
+
+    class Meta:
+        abstract = True
+
+    @property
+    def media(self):
+        return self.soma / self.contagem if self.contagem else None
+
+    def __str__(self):
+        return f"{self.dispositivo_id} - {self.bucket.isoformat()} - {self.soma}"
+
+
+class ConsumoHorario(ConsumoAgregado):
+    """Consumo por hora - TimescaleDB Continuous Aggregate (time_bucket('1 hour'))"""
+
+    class Meta:
+        managed = False  # Gerenciado pelo TimescaleDB (continuous aggregate)
+        db_table = 'tds_new_consumo_horario'
+        verbose_name = "Consumo Horário"
+        verbose_name_plural = "Consumos Horários"
+
+
+class ConsumoDiario(ConsumoAgregado):
+    """Consumo por dia local (TIME_ZONE) - TimescaleDB Continuous Aggregate (time_bucket('1 day', time, fuso))"""
+
+    class Meta:
+        managed = False  # Gerenciado pelo TimescaleDB (continuous aggregate)
+        db_table = 'tds_new_consumo_diario'
+        verbose_name = "Consumo Diário"
+        verbose_name_plural = "Consumos Diários"
+
+
+class MedidorHorario(models.Model):
+    """
+    Primeira, última e máxima leitura de cada hora por dispositivo -
+    TimescaleDB Continuous Aggregate (first/last por time)
+
+    Lido pelo motor de consumo (tds_new/services/consumo.py): em medidores
+    acumulados o consumo da hora é a diferença entre leituras, com
+    tratamento de zeramento do contador.
+
+    Importante:
+    - View criada via scripts/create_medidor_horario.sql
+    - Chave real (bucket, dispositivo); bucket é a pk nominal do Django
+    """
+
+    bucket = models.DateTimeField(
+        primary_key=True,
+        verbose_name="Bucket",
+        help_text="Início da hora (resultado do time_bucket, UTC)"
+    )
+
+    conta = models.ForeignKey(
+        Conta,
+        on_delete=models.DO_NOTHING,
+        verbose_name="Conta"
+    )
+
+    dispositivo = models.ForeignKey(
+        Dispositivo,
+        on_delete=models.DO_NOTHING,
+        verbose_name="Dispositivo"
+    )
+
+    primeiro = models.DecimalField(
+        max_digits=15,
+        decimal_places=4,
+        verbose_name="Primeira Leitura",
+        help_text="Valor da leitura mais antiga da hora"
+    )
+
+    ultimo = models.DecimalField(
+        max_digits=15,
+        decimal_places=4,
+        verbose_name="Última Leitura",
+        help_text="Valor da leitura mais recente da hora"
+    )
+
+    maximo = models.DecimalField(
+        max_digits=15,
+        decimal_places=4,
+        verbose_name="Máximo"
+    )
+
+    contagem = models.BigIntegerField(
+        verbose_name="Quantidade de Leituras"
+    )
+
+    class Meta:
+        managed = False  # Gerenciado pelo TimescaleDB (continuous aggregate)
+        db_table = 'tds_new_medidor_horario'
+        verbose_name = "Medidor Horário"
+        verbose_name_plural = "Medidores Horários"
+
+    def __str__(self):
+        return f"{self.dispositivo_id} - {self.bucket.isoformat()} - {self.primeiro} → {self.ultimo}"
+
+
+class PayloadTelemetria(models.Model):
+    """
+    Auditoria de mensagens de telemetria - payload original comprimido (zlib)
+
+    Substitui o payload_raw por leitura na hypertable: uma linha por mensagem,
+    gravada conforme a política TELEMETRY_PAYLOAD_RAW da conta
+    (tds_new/services/payload_audit.py). Chave da mensagem: (gateway, time);
+    reentregas QoS 1 não duplicam a auditoria.
+    """
+
+    MOTIVO_CHOICES = [
+        ('ERRO', 'Erro — mensagem rejeitada ou com leituras ignoradas'),
+        ('AMOSTRA', 'Amostra — política sampled:N'),
+        ('COMPLETO', 'Completo — política full'),
+    ]
+
+    time = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Timestamp",
+        help_text="Timestamp da mensagem (vazio se o payload não pôde ser lido)"
+    )
+
+    recebido_em = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        verbose_name="Recebido em"
+    )
+
+    conta = models.ForeignKey(
+        Conta,
+        on_delete=models.CASCADE,
+        verbose_name="Conta"
+    )
+
+    gateway = models.ForeignKey(
+        Gateway,
+        on_delete=models.CASCADE,
+        verbose_name="Gateway"
+    )
+
+    formato = models.CharField(
+        max_length=10,
+        default='json',
+        verbose_name="Formato",
+        help_text="json, cbor ou msgpack"
+    )
+
+    motivo = models.CharField(
+        max_length=10,
+        choices=MOTIVO_CHOICES,
+        verbose_name="Motivo"
+    )
+
+    erro = models.TextField(
+        blank=True,
+        default='',
+        verbose_name="Erro",
+        help_text="Motivo da rejeição / leituras ignoradas (motivo=ERRO)"
+    )
+
+    tamanho_original = models.PositiveIntegerField(
+        verbose_name="Tamanho Original (bytes)"
+    )
+
+    payload = models.BinaryField(
+        verbose_name="Payload (zlib)",
+        help_text="Bytes recebidos do broker, comprimidos com zlib"
+    )
+
+    class Meta:
+        db_table = 'tds_new_payload_telemetria'
+        verbose_name = "Payload de Telemetria"
+        verbose_name_plural = "Payloads de Telemetria"
+        constraints = [
+            models.UniqueConstraint(fields=['gateway', 'time'], name='uq_payload_telemetria_gateway_time'),
+        ]
+        indexes = [
+            models.Index(fields=['conta', 'recebido_em']),
+        ]
+
+    def __str__(self):
+        return f"{self.gateway_id} @ {self.time or self.recebido_em} ({self.motivo})"
+
+    @staticmethod
+    def comprimir(dados, nivel=6):
+        """bytes/str → bytes zlib"""
+        if isinstance(dados, str):
+            dados = dados.encode('utf-8')
+        return zlib.compress(dados, nivel)
+
+    def descomprimir(self):
+        """
+        Returns:
+            bytes: Payload original, como recebido do broker
+        """
+        return zlib.decompress(bytes(self.payload))
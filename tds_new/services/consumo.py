@@ -0,0 +1,203 @@
+# ==============================================================================
+# TDS New - Motor de Consumo (Medidores Acumulados)
+# ==============================================================================
+# Arquivo: tds_new/services/consumo.py
+# Responsabilidade: Consumo por período como diferença entre leituras (kWh, m³)
+# ==============================================================================
+
+import logging
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from tds_new.models import Dispositivo
+from tds_new.services.query_router import FonteAgregada, alinhar, query_router, sql_bucket
+
+logger = logging.getLogger(__name__)
+
+HORA = timedelta(hours=1)
+
+# Consumo de um bucket (hora, dia, mês) de um dispositivo
+ConsumoBucket = namedtuple('ConsumoBucket', ['bucket', 'dispositivo_id', 'consumo'])
+
+# Consumo do período e última leitura acumulada do dispositivo
+ConsumoTotal = namedtuple('ConsumoTotal', ['consumo', 'ultimo'])
+
+
+def incremento(anterior, primeiro, ultimo, maximo):
+    """
+    Consumo de uma hora a partir dos extremos da hora e da última leitura
+    anterior a ela
+
+    Zeramento do contador (troca de medidor, overflow, reset do gateway):
+        - entre horas: primeira leitura menor que a anterior → o contador
+          recomeçou do zero e consumiu `primeiro`
+        - dentro da hora: última leitura menor que a primeira → subiu até o
+          máximo, zerou e subiu até `ultimo`
+    Um zeramento seguido de subida acima da primeira leitura na mesma hora
+    não é detectável pelos extremos (subestima o consumo da hora).
+
+    Args:
+        anterior (Decimal | None): Última leitura antes da hora (None = sem histórico)
+        primeiro, ultimo, maximo (Decimal): Extremos da hora
+
+    Returns:
+        Decimal: Consumo da hora (>= 0)
+    """
+    consumo = ultimo - primeiro if ultimo >= primeiro else (maximo - primeiro) + ultimo
+    if anterior is not None:
+        consumo += primeiro - anterior if primeiro >= anterior else primeiro
+    return consumo
+
+
+# ==============================================================================
+# MOTOR
+# ==============================================================================
+
+class MotorConsumo:
+    """
+    Consumo de medidores acumulados (valor = leitura do contador) por bucket
+
+    SUM(valor) só faz sentido para leituras de consumo por intervalo; em
+    medidores acumulados o consumo é última − primeira leitura. O motor lê os
+    extremos por hora do continuous aggregate tds_new_medidor_horario (cauda
+    não materializada direto da hypertable, mesma marca d'água do roteador)
+    e acumula os incrementos por hora no bucket pedido: o custo é O(horas do
+    período), não O(leituras).
+
+    O consumo entre a última leitura antes do período e a primeira dentro
+    dele pertence ao período (incremento atribuído à hora da leitura mais
+    nova). O início do período é alinhado à hora.
+    """
+
+    FONTE = FonteAgregada('tds_new_medidor_horario', 3600)
+
+    TABELA_BRUTA = 'tds_new_leitura_dispositivo'
+
+    def __init__(self, router=None):
+        """
+        Args:
+            router (QueryRouter): Fornece a marca d'água cacheada do agregado
+        """
+        self.router = router or query_router
+
+    # ==========================================================================
+    # API
+    # ==========================================================================
+
+    def consumo_por_bucket(self, conta_id, inicio, largura, fim=None, dispositivo_ids=None):
+        """
+        Consumo por (bucket, dispositivo); largura múltipla de 1 hora
+
+        Returns:
+            list[ConsumoBucket]: Ordenada por (bucket, dispositivo_id)
+        """
+        return self._agrupar(conta_id, inicio, fim, dispositivo_ids, lambda hora: alinhar(hora, largura))
+
+    def consumo_mensal(self, conta_id, inicio, fim=None, dispositivo_ids=None):
+        """
+        Consumo por (mês, dispositivo), mês no fuso de TIME_ZONE
+
+        Returns:
+            list[ConsumoBucket]: bucket = date do primeiro dia do mês
+        """
+        return self._agrupar(
+            conta_id, inicio, fim, dispositivo_ids,
+            lambda hora: timezone.localtime(hora).date().replace(day=1)
+        )
+
+    def consumo_total(self, conta_id, inicio, fim=None, dispositivo_ids=None):
+        """
+        Consumo do período por dispositivo
+
+        Returns:
+            dict: {dispositivo_id: ConsumoTotal(consumo, ultimo)} só dos
+            dispositivos com leitura no período
+        """
+        totais = {}
+        for dispositivo_id, hora, consumo, ultimo in self._incrementos(conta_id, inicio, fim, dispositivo_ids):
+            anterior = totais.get(dispositivo_id)
+            totais[dispositivo_id] = ConsumoTotal(consumo + (anterior.consumo if anterior else 0), ultimo)
+        return totais
+
+    # ==========================================================================
+    # INTERNOS
+    # ==========================================================================
+
+    def _agrupar(self, conta_id, inicio, fim, dispositivo_ids, chave):
+        acumulado = defaultdict(int)
+        for dispositivo_id, hora, consumo, _ in self._incrementos(conta_id, inicio, fim, dispositivo_ids):
+            acumulado[(chave(hora), dispositivo_id)] += consumo
+        return sorted(ConsumoBucket(bucket, dispositivo_id, consumo) for (bucket, dispositivo_id), consumo in acumulado.items())
+
+    def _incrementos(self, conta_id, inicio, fim, dispositivo_ids):
+        """
+        Gera (dispositivo_id, hora, consumo da hora, última leitura da hora)
+        para as horas com leitura, em ordem de (dispositivo, hora)
+        """
+        anterior = {}
+        for hora, dispositivo_id, primeiro, ultimo, maximo in self._horas(conta_id, inicio, fim, dispositivo_ids):
+            if hora is None:
+                anterior[dispositivo_id] = ultimo  # Última leitura antes do período
+                continue
+            yield dispositivo_id, hora, incremento(anterior.get(dispositivo_id), primeiro, ultimo, maximo), ultimo
+            anterior[dispositivo_id] = ultimo
+
+    def _horas(self, conta_id, inicio, fim, dispositivo_ids):
+        """
+        Extremos por (hora, dispositivo) do período em uma única query:
+        agregado até a marca d'água + leituras brutas depois dela, mais uma
+        linha com hora NULL por dispositivo com a última leitura anterior ao
+        período (LATERAL no índice dispositivo_id, time DESC)
+
+        Returns:
+            list[tuple]: (hora | None, dispositivo_id, primeiro, ultimo, maximo)
+            ordenada por (dispositivo_id, hora NULLS FIRST)
+        """
+        fim = fim or timezone.now()
+        inicio = alinhar(inicio, HORA)
+        ids = [int(i) for i in dispositivo_ids] if dispositivo_ids else None
+        filtro = " AND dispositivo_id = ANY(%s)" if ids else ""
+
+        watermark = self.router.watermark(self.FONTE)
+        corte = min(max(watermark, inicio), fim) if watermark else inicio
+
+        partes = [
+            f"SELECT NULL::timestamptz, d.id, l.valor, l.valor, l.valor "
+            f"FROM {Dispositivo._meta.db_table} d CROSS JOIN LATERAL ("
+            f"SELECT valor FROM {self.TABELA_BRUTA} WHERE dispositivo_id = d.id AND time < %s "
+            f"ORDER BY time DESC LIMIT 1) l "
+            f"WHERE d.conta_id = %s{filtro.replace('dispositivo_id', 'd.id')}"
+        ]
+        parametros = [inicio, conta_id] + ([ids] if ids else [])
+        if corte > inicio:
+            partes.append(
+                f"SELECT bucket, dispositivo_id, primeiro, ultimo, maximo "
+                f"FROM {self.FONTE.view} WHERE conta_id = %s AND bucket >= %s AND bucket < %s{filtro}"
+            )
+            parametros += [conta_id, inicio, corte] + ([ids] if ids else [])
+        if fim > corte:
+            hora, parametros_hora = sql_bucket('time', HORA)
+            partes.append(
+                f"SELECT {hora}, dispositivo_id, "
+                f"(array_agg(valor ORDER BY time))[1], (array_agg(valor ORDER BY time DESC))[1], MAX(valor) "
+                f"FROM {self.TABELA_BRUTA} WHERE conta_id = %s AND time >= %s AND time < %s{filtro} "
+                f"GROUP BY 1, 2"
+            )
+            parametros += parametros_hora + [conta_id, corte, fim] + ([ids] if ids else [])
+
+        logger.debug(
+            f"[CONSUMO] conta={conta_id} agregado=[{inicio}, {corte}) bruto=[{corte}, {fim})"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT * FROM ({' UNION ALL '.join(partes)}) AS s (hora, dispositivo_id, primeiro, ultimo, maximo) "
+                f"ORDER BY dispositivo_id, hora NULLS FIRST",
+                parametros
+            )
+            return cursor.fetchall()
+
+
+motor_consumo = MotorConsumo()
@@ -0,0 +1,84 @@
+# ==============================================================================
+# TDS New - Dedup Filter (Ingestão de Telemetria)
+# ==============================================================================
+# Arquivo: tds_new/services/dedup_filter.py
+# Responsabilidade: Descartar cedo leituras já gravadas (reentregas QoS 1)
+# ==============================================================================
+
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+# ==============================================================================
+# FILTRO LRU DE CHAVES RECENTES
+# ==============================================================================
+
+class FiltroLeiturasRecentes:
+    """
+    LRU process-local de chaves (dispositivo_id, time) já commitadas
+
+    Reentregas QoS 1 e retries do gateway chegam segundos depois do original;
+    com as chaves recentes em memória elas são descartadas antes do COPY. É
+    apenas um atalho: a garantia é o índice único + ON CONFLICT DO NOTHING
+    (LeituraDispositivo.copy_bulk), que cobre o que o LRU não vê (outro
+    processo, chaves antigas já expulsas).
+
+    As chaves só são registradas APÓS o commit: uma mensagem cuja gravação
+    falhou não pode ser filtrada quando o broker a reentregar.
+    """
+
+    def __init__(self, capacidade=None):
+        """
+        Args:
+            capacidade (int): Máximo de chaves mantidas (TELEMETRY_DEDUP_LRU_SIZE; 0 = desabilitado)
+        """
+        self.capacidade = capacidade if capacidade is not None else getattr(
+            settings, 'TELEMETRY_DEDUP_LRU_SIZE', 100000
+        )
+        self._lock = threading.Lock()
+        self._chaves = OrderedDict()
+
+    def contem(self, dispositivo_id, instante):
+        """
+        Returns:
+            bool: True se a leitura (dispositivo_id, instante) já foi gravada recentemente
+        """
+        if not self.capacidade:
+            return False
+
+        chave = (dispositivo_id, instante)
+        with self._lock:
+            if chave in self._chaves:
+                self._chaves.move_to_end(chave)
+                return True
+        return False
+
+    def registrar(self, leituras):
+        """
+        Registra as chaves de leituras já commitadas
+
+        Args:
+            leituras (iterable[LeituraDispositivo]): Leituras gravadas
+        """
+        if not self.capacidade:
+            return
+
+        with self._lock:
+            for leitura in leituras:
+                chave = (leitura.dispositivo_id, leitura.time)
+                self._chaves[chave] = None
+                self._chaves.move_to_end(chave)
+
+            excesso = len(self._chaves) - self.capacidade
+            for _ in range(max(excesso, 0)):
+                self._chaves.popitem(last=False)
+
+    def limpar(self):
+        """Esvazia o filtro"""
+        with self._lock:
+            self._chaves.clear()
+
+
+# Instância compartilhada pelo consumer (service inline e LeituraBatchWriter)
+filtro_leituras = FiltroLeiturasRecentes()
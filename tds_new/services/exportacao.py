@@ -0,0 +1,156 @@
+# ==============================================================================
+# TDS New - Exportação de Leituras (CSV / NDJSON)
+# ==============================================================================
+# Arquivo: tds_new/services/exportacao.py
+# Responsabilidade: Gerar exportações de leituras em streaming, memória constante
+# ==============================================================================
+
+import csv
+import io
+import json
+import logging
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from tds_new.models import LeituraDispositivo
+
+logger = logging.getLogger(__name__)
+
+FORMATOS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+COLUNAS = ['time', 'dispositivo_id', 'dispositivo', 'valor', 'unidade']
+
+
+def leituras_periodo(conta_id, inicio, fim, dispositivo_ids=None):
+    """
+    Leituras da conta em [inicio, fim), em ordem de tempo
+
+    Returns:
+        QuerySet: values_list na ordem de COLUNAS
+    """
+    queryset = LeituraDispositivo.objects.filter(
+        conta_id=conta_id,
+        time__gte=inicio,
+        time__lt=fim
+    )
+    if dispositivo_ids:
+        queryset = queryset.filter(dispositivo_id__in=dispositivo_ids)
+    return queryset.order_by('time').values_list(
+        'time', 'dispositivo_id', 'dispositivo__codigo', 'valor', 'unidade'
+    )
+
+
+def exportar(queryset, formato='csv', comprimir=True, chunk_size=None):
+    """
+    Gera a exportação em blocos de bytes, sem materializar o resultado
+
+    As linhas vêm de um cursor nomeado do PostgreSQL (.iterator(chunk_size))
+    aberto dentro de uma transação: sem transação o Django declara o cursor
+    WITH HOLD e o servidor materializa o resultado inteiro antes da primeira
+    linha. Cada lote de chunk_size linhas vira um bloco (gzip opcional, um
+    único membro gzip no fluxo todo). Fechar o gerador no meio (cliente
+    desconectou) encerra o cursor e a transação.
+
+    Args:
+        queryset: Saída de leituras_periodo()
+        formato (str): 'csv' (com cabeçalho) ou 'ndjson'
+        comprimir (bool): gzip on the fly
+        chunk_size (int): Linhas por fetch do cursor (TELEMETRY_EXPORT_CHUNK)
+
+    Yields:
+        bytes
+    """
+    chunk_size = chunk_size or getattr(settings, 'TELEMETRY_EXPORT_CHUNK', 5000)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None
+    escrever = _escritor_csv() if formato == 'csv' else _escritor_ndjson()
+    total = 0
+
+    def saida(texto):
+        dados = texto.encode('utf-8')
+        return compressor.compress(dados) if compressor else dados
+
+    with transaction.atomic():
+        cabecalho = escrever(None)
+        if cabecalho:
+            yield saida(cabecalho)
+
+        lote = []
+        for linha in queryset.iterator(chunk_size=chunk_size):
+            lote.append(linha)
+            if len(lote) >= chunk_size:
+                bloco = saida(escrever(lote))
+                total += len(lote)
+                lote = []
+                if bloco:
+                    yield bloco
+        if lote:
+            total += len(lote)
+            yield saida(escrever(lote))
+
+    if compressor:
+        yield compressor.flush()
+    logger.info(f"[EXPORT] {total} leituras exportadas ({formato}{', gzip' if comprimir else ''})")
+
+
+async def exportar_async(gerador):
+    """
+    Adapta exportar() para StreamingHttpResponse sob ASGI
+
+    Um iterador síncrono seria consumido inteiro (list) antes do envio.
+    Cada bloco é obtido com sync_to_async(thread_sensitive=True): o cursor
+    nomeado e a transação ficam sempre na mesma thread/conexão.
+    """
+    proximo = sync_to_async(next, thread_sensitive=True)
+    fim = object()
+    try:
+        while True:
+            bloco = await proximo(gerador, fim)
+            if bloco is fim:
+                break
+            yield bloco
+    finally:
+        await sync_to_async(gerador.close, thread_sensitive=True)()
+
+
+# ==============================================================================
+# FORMATOS
+# ==============================================================================
+
+def _escritor_csv():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+
+    def escrever(lote):
+        buffer.seek(0)
+        buffer.truncate()
+        if lote is None:
+            writer.writerow(COLUNAS)
+        else:
+            writer.writerows((time.isoformat(), *resto) for time, *resto in lote)
+        return buffer.getvalue()
+
+    return escrever
+
+
+def _escritor_ndjson():
+    def escrever(lote):
+        if lote is None:
+            return ''
+        return ''.join(
+            json.dumps({
+                'time': time.isoformat(),
+                'dispositivo_id': dispositivo_id,
+                'dispositivo': codigo,
+                'valor': float(valor),
+                'unidade': unidade,
+            }, separators=(',', ':')) + '\n'
+            for time, dispositivo_id, codigo, valor, unidade in lote
+        )
+
+    return escrever
@@ -0,0 +1,395 @@
+# ==============================================================================
+# TDS New - Ingest Buffer (Micro-batching de Leituras)
+# ==============================================================================
+# Arquivo: tds_new/services/ingest_buffer.py
+# Responsabilidade: Agrupar leituras de várias mensagens MQTT em um único commit
+# ==============================================================================
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from tds_new.services.dedup_filter import filtro_leituras
+from tds_new.services.latest_cache import cache_ultimas
+from tds_new.services.live_feed import publicar_leituras
+
+logger = logging.getLogger('telemetry_service')
+
+# ==============================================================================
+# WRITER EM LOTE (FLUSH POR TAMANHO OU TEMPO)
+# ==============================================================================
+
+class LeituraBatchWriter:
+    """
+    Buffer de escrita para LeituraDispositivo com flush por N linhas ou T ms
+
+    Em vez de uma transação por mensagem MQTT (1-8 linhas), as leituras de
+    muitas mensagens são acumuladas e gravadas em um único COPY (copy_bulk)
+    por uma thread dedicada. O last_seen dos gateways é gravado à parte pelo
+    GatewayLivenessWriter (tds_new/services/liveness.py).
+
+    Idempotência:
+        O COPY usa ON CONFLICT DO NOTHING (TELEMETRY_DEDUP_ON_CONFLICT);
+        conflitos são contados em 'linhas_duplicadas' e as chaves gravadas
+        alimentam o filtro LRU de leituras recentes.
+
+    Após o commit, o lote também atualiza o cache de últimas leituras
+    (tds_new/services/latest_cache.py) lido pelas APIs do dashboard e é
+    publicado para os streams SSE (tds_new/services/live_feed.py).
+
+    Confirmação (modo durável do consumer):
+        adicionar(..., ack=Confirmacao) registra a confirmação MQTT da
+        mensagem; ela só é chamada depois que TODAS as leituras da mensagem
+        foram commitadas. Lote com confirmações não é descartado por falha
+        de conexão/banco enquanto o writer está ativo (retenta com backoff;
+        o buffer cheio segura os produtores). No encerramento, um lote que
+        ainda falha após max_tentativas tem as confirmações abandonadas →
+        o broker reentrega na próxima sessão.
+
+    Linhas inválidas:
+        um erro de dados no COPY (valor fora do tipo, FK inexistente) não é
+        retentado: o lote é dividido até isolar as linhas ruins, descartadas
+        sozinhas (linhas_descartadas); o resto do lote é gravado.
+
+    Backpressure:
+        adicionar() bloqueia quando o buffer atinge max_pendentes linhas
+        (banco lento → buffer cheio → produtores esperam).
+
+    Métricas (estatisticas()):
+        flushes, linhas gravadas/descartadas, latência do flush (última,
+        média, máxima) e tempo total bloqueado por backpressure.
+
+    Uso:
+        writer = LeituraBatchWriter()
+        writer.iniciar()
+        writer.adicionar(leituras)
+        ...
+        writer.parar()  # flush final
+    """
+
+    def __init__(self, max_linhas=None, max_espera_ms=None, max_pendentes=None, max_tentativas=None):
+        """
+        Args:
+            max_linhas (int): Flush ao atingir N linhas (TELEMETRY_BATCH_SIZE)
+            max_espera_ms (int): Flush após T ms da primeira linha pendente (TELEMETRY_BATCH_MAX_MS)
+            max_pendentes (int): Limite do buffer antes de bloquear produtores (TELEMETRY_BATCH_MAX_PENDENTES)
+            max_tentativas (int): Tentativas de gravação de um lote antes de descartá-lo
+        """
+        self.max_linhas = max_linhas or getattr(settings, 'TELEMETRY_BATCH_SIZE', 500)
+        self.max_espera = (max_espera_ms or getattr(settings, 'TELEMETRY_BATCH_MAX_MS', 1000)) / 1000.0
+        self.max_pendentes = max_pendentes or getattr(settings, 'TELEMETRY_BATCH_MAX_PENDENTES', 20000)
+        self.max_tentativas = max_tentativas or getattr(settings, 'TELEMETRY_BATCH_MAX_RETRIES', 3)
+        self.formato_copy = getattr(settings, 'TELEMETRY_COPY_FORMAT', 'text')
+        self.ignorar_duplicadas = getattr(settings, 'TELEMETRY_DEDUP_ON_CONFLICT', True)
+
+        self._cond = threading.Condition()
+        self._buffer = []
+        self._acks = []              # [fim, ack]: ack liberado após commit de buffer[:fim]
+        self._primeira_em = None     # monotonic da primeira linha pendente
+        self._ativo = False
+        self._thread = None
+
+        self._stats = {
+            'flushes': 0,
+            'linhas_gravadas': 0,
+            'linhas_descartadas': 0,
+            'linhas_duplicadas': 0,
+            'erros': 0,
+            'mensagens_confirmadas': 0,
+            'latencia_ultima_ms': 0.0,
+            'latencia_max_ms': 0.0,
+            'latencia_total_ms': 0.0,
+            'bloqueado_ms': 0.0,
+        }
+
+    # ==========================================================================
+    # CICLO DE VIDA
+    # ==========================================================================
+
+    def iniciar(self):
+        """Inicia a thread de flush"""
+        if self._thread is not None:
+            return
+
+        self._ativo = True
+        self._thread = threading.Thread(target=self._loop, name='leitura-batch-writer', daemon=True)
+        self._thread.start()
+        logger.info(
+            f"[BATCH] Writer iniciado (max_linhas={self.max_linhas}, "
+            f"max_espera={int(self.max_espera * 1000)}ms, max_pendentes={self.max_pendentes})"
+        )
+
+    def parar(self, timeout=30):
+        """Encerra a thread após gravar o que estiver pendente"""
+        with self._cond:
+            self._ativo = False
+            self._cond.notify_all()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+        logger.info(f"[BATCH] Writer encerrado: {self.estatisticas()}")
+
+    # ==========================================================================
+    # API DE PRODUTORES
+    # ==========================================================================
+
+    def adicionar(self, leituras, timeout=None, ack=None):
+        """
+        Enfileira leituras para o próximo flush
+
+        Args:
+            leituras (list[LeituraDispositivo]): Objetos ainda não salvos
+            timeout (float): Espera máxima (s) por espaço no buffer (None = indefinida)
+            ack (Confirmacao): Chamada após o commit de todas estas leituras
+                (abandonar() se o lote for descartado)
+
+        Returns:
+            bool: False se o timeout de backpressure expirou (leituras não enfileiradas)
+        """
+        inicio = time.monotonic()
+
+        with self._cond:
+            while len(self._buffer) >= self.max_pendentes and self._ativo:
+                restante = None if timeout is None else timeout - (time.monotonic() - inicio)
+                if restante is not None and restante <= 0:
+                    self._stats['bloqueado_ms'] += (time.monotonic() - inicio) * 1000
+                    return False
+                self._cond.wait(restante)
+
+            bloqueado = time.monotonic() - inicio
+            if bloqueado > 0.001:
+                self._stats['bloqueado_ms'] += bloqueado * 1000
+
+            if not self._buffer:
+                self._primeira_em = time.monotonic()
+
+            self._buffer.extend(leituras)
+            if ack is not None:
+                self._acks.append([len(self._buffer), ack])
+
+            if len(self._buffer) >= self.max_linhas:
+                self._cond.notify_all()
+
+        return True
+
+    def estatisticas(self):
+        """
+        Retorna métricas do writer
+
+        Returns:
+            dict: flushes, linhas (gravadas/descartadas/duplicadas), mensagens confirmadas, latências (ms), pendentes, bloqueado_ms
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pendentes'] = len(self._buffer)
+
+        flushes = stats['flushes'] or 1
+        stats['latencia_media_ms'] = round(stats.pop('latencia_total_ms') / flushes, 2)
+        return stats
+
+    # ==========================================================================
+    # THREAD DE FLUSH
+    # ==========================================================================
+
+    def _loop(self):
+        """Aguarda N linhas ou T ms (o que vier primeiro) e grava o lote"""
+        ultimo_resumo = time.monotonic()
+
+        try:
+            while True:
+                with self._cond:
+                    while self._ativo:
+                        if len(self._buffer) >= self.max_linhas:
+                            break
+                        if self._buffer:
+                            restante = self.max_espera - (time.monotonic() - self._primeira_em)
+                            if restante <= 0:
+                                break
+                            self._cond.wait(restante)
+                        else:
+                            self._cond.wait(self.max_espera)
+
+                    if not self._buffer and not self._ativo:
+                        return
+
+                    lote = self._buffer[:self.max_linhas]
+                    del self._buffer[:self.max_linhas]
+                    acks = self._separar_acks(len(lote))
+                    self._primeira_em = time.monotonic() if self._buffer else None
+                    # Libera produtores bloqueados por backpressure
+                    self._cond.notify_all()
+
+                if lote:
+                    if self._gravar_com_retry(lote, persistente=bool(acks)):
+                        self._confirmar(acks)
+                    else:
+                        self._abandonar(acks)
+
+                if time.monotonic() - ultimo_resumo >= 60:
+                    logger.info(f"[BATCH] Estatísticas: {self.estatisticas()}")
+                    ultimo_resumo = time.monotonic()
+        finally:
+            connection.close()
+
+    def _separar_acks(self, tamanho_lote):
+        """Remove (e retorna) os acks cujas leituras estão todas em buffer[:tamanho_lote]"""
+        acks = []
+        restantes = []
+        for item in self._acks:
+            if item[0] <= tamanho_lote:
+                acks.append(item[1])
+            else:
+                item[0] -= tamanho_lote
+                restantes.append(item)
+        self._acks = restantes
+        return acks
+
+    def _confirmar(self, acks):
+        """Libera as confirmações MQTT das mensagens já commitadas"""
+        for ack in acks:
+            try:
+                ack()
+            except Exception as e:
+                logger.warning(f"⚠️ [BATCH] Falha ao confirmar mensagem: {e}")
+        if acks:
+            with self._cond:
+                self._stats['mensagens_confirmadas'] += len(acks)
+
+    def _abandonar(self, acks):
+        """Mensagens de lote descartado: sem PUBACK, reentregues pelo broker"""
+        for ack in acks:
+            ack.abandonar()
+
+    def _gravar_com_retry(self, lote, persistente=False):
+        """
+        Grava o lote com retentativas; descarta após max_tentativas
+
+        persistente (lote com confirmações do modo durável): enquanto o
+        writer está ativo não há limite de tentativas; descartar só
+        adiaria a reentrega e ocuparia a janela de mensagens em voo.
+
+        Erro de dados (valor fora do tipo, FK de dispositivo removido) não se
+        resolve repetindo: o lote é dividido ao meio até isolar as linhas
+        ruins, que são descartadas sozinhas; as demais mensagens do lote são
+        gravadas normalmente. Só erros de conexão/banco fazem retentativa.
+
+        Returns:
+            bool: True se o lote foi commitado (linhas ruins descartadas contam
+            como tratadas)
+        """
+        tentativa = 0
+        while tentativa < self.max_tentativas or (persistente and self._ativo):
+            tentativa += 1
+            inicio = time.monotonic()
+            try:
+                try:
+                    inseridas = self._gravar(lote)
+                    gravadas = lote
+                except Exception as e:
+                    if not _erro_de_dados(e):
+                        raise
+                    logger.warning(f"⚠️ [BATCH] Erro de dados no flush ({len(lote)} linhas), isolando linhas: {e}")
+                    gravadas, inseridas = self._gravar_dividindo(lote, e)
+            except Exception as e:
+                with self._cond:
+                    self._stats['erros'] += 1
+                logger.exception(
+                    f"💥 [BATCH] Erro no flush ({len(lote)} linhas, tentativa "
+                    f"{tentativa}/{'∞' if persistente and self._ativo else self.max_tentativas}): {e}"
+                )
+                # Conexão pode ter ficado inutilizável: força reconexão
+                connection.close()
+                time.sleep(min(2 ** tentativa, 10))
+                continue
+
+            latencia_ms = (time.monotonic() - inicio) * 1000
+            with self._cond:
+                self._stats['flushes'] += 1
+                self._stats['linhas_gravadas'] += len(inseridas)
+                self._stats['linhas_duplicadas'] += len(gravadas) - len(inseridas)
+                self._stats['latencia_ultima_ms'] = round(latencia_ms, 2)
+                self._stats['latencia_total_ms'] += latencia_ms
+                self._stats['latencia_max_ms'] = round(max(self._stats['latencia_max_ms'], latencia_ms), 2)
+
+            filtro_leituras.registrar(gravadas)
+            cache_ultimas.registrar(gravadas)
+            publicar_leituras(gravadas, inseridas)
+
+            logger.debug(
+                f"[BATCH] Flush: {len(inseridas)}/{len(lote)} linhas em {latencia_ms:.1f}ms"
+            )
+            return True
+
+        with self._cond:
+            self._stats['linhas_descartadas'] += len(lote)
+        logger.error(f"❌ [BATCH] Lote descartado após {tentativa} tentativas ({len(lote)} linhas)")
+        return False
+
+    def _gravar_dividindo(self, lote, erro):
+        """
+        Isola as linhas com erro de dados de um lote que já falhou com `erro`
+
+        O lote não é regravado inteiro: cada metade é gravada e só a metade
+        que falhar é dividida de novo, até a linha ruim, que é descartada.
+
+        Returns:
+            tuple: (leituras commitadas, chaves inseridas sem as duplicadas)
+        """
+        if len(lote) == 1:
+            leitura = lote[0]
+            with self._cond:
+                self._stats['linhas_descartadas'] += 1
+            logger.error(
+                f"❌ [BATCH] Leitura descartada (dispositivo={leitura.dispositivo_id}, "
+                f"time={leitura.time}, valor={leitura.valor}, unidade={leitura.unidade!r}): {erro}"
+            )
+            return [], set()
+
+        gravadas, inseridas = [], set()
+        meio = len(lote) // 2
+        for metade in (lote[:meio], lote[meio:]):
+            try:
+                inseridas_metade = self._gravar(metade)
+                gravadas_metade = metade
+            except Exception as e:
+                if not _erro_de_dados(e):
+                    raise
+                gravadas_metade, inseridas_metade = self._gravar_dividindo(metade, e)
+            gravadas += gravadas_metade
+            inseridas |= inseridas_metade
+        return gravadas, inseridas
+
+    def _gravar(self, lote):
+        """
+        Um commit: COPY de todas as leituras do lote
+
+        Returns:
+            set: Chaves (dispositivo_id, time) inseridas (sem as duplicadas)
+        """
+        from tds_new.models import LeituraDispositivo
+
+        return LeituraDispositivo.copy_bulk(
+            lote,
+            formato=self.formato_copy,
+            ignorar_duplicadas=self.ignorar_duplicadas,
+            retornar_inseridas=True
+        )
+
+
+def _erro_de_dados(erro):
+    """
+    Erro causado pelo conteúdo das linhas (valor fora do tipo, violação de
+    FK/constraint, falha de serialização): repetir o mesmo lote não resolve
+
+    O COPY roda no cursor do driver, então as exceções chegam tanto
+    embrulhadas pelo Django quanto cruas do psycopg.
+    """
+    from django.db import DataError, IntegrityError
+
+    driver = connection.Database
+    return isinstance(erro, (DataError, IntegrityError, driver.DataError, driver.IntegrityError, ValueError, TypeError))
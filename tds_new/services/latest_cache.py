@@ -0,0 +1,414 @@
+# ==============================================================================
+# TDS New - Cache de Últimas Leituras (Ingestão → Dashboard)
+# ==============================================================================
+# Arquivo: tds_new/services/latest_cache.py
+# Responsabilidade: Últimas N leituras por conta e último valor por dispositivo
+# ==============================================================================
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+
+logger = logging.getLogger('telemetry_service')
+
+PREFIXO_LEITURAS = 'tds_new:ultimas_leituras'
+PREFIXO_VALORES = 'tds_new:ultimo_valor'
+PREFIXO_WATERMARK = 'tds_new:watermark'
+PREFIXO_CADASTRO = 'tds_new:cadastro'
+
+# Classe do pg_advisory_xact_lock(classe, conta_id) que serializa o
+# read-modify-write do anel no DatabaseCache entre processos
+TRAVA_ANEL = 0x7D5A4E01
+
+# HSET condicional: só sobrescreve o último valor do dispositivo com leitura
+# mais nova (lotes fora de ordem / backfill não regridem o valor)
+_LUA_ULTIMO_VALOR = """
+for i = 1, #ARGV - 1, 3 do
+    local atual = redis.call('HGET', KEYS[1], ARGV[i])
+    if (not atual) or tonumber(cjson.decode(atual)['s']) < tonumber(ARGV[i + 1]) then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 2])
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[#ARGV])
+"""
+
+
+def _codificar(leitura):
+    """LeituraDispositivo → (score, JSON compacto)"""
+    instante = leitura.time
+    score = instante.timestamp()
+    return score, json.dumps({
+        's': score,
+        'd': leitura.dispositivo_id,
+        't': instante.isoformat(),
+        'v': str(leitura.valor),
+        'u': leitura.unidade,
+    }, separators=(',', ':'))
+
+
+def _decodificar(bruto):
+    """JSON do cache → dict no formato de LeituraDispositivo.objects.values()"""
+    item = json.loads(bruto)
+    return {
+        'time': datetime.fromisoformat(item['t']),
+        'dispositivo_id': item['d'],
+        'valor': Decimal(item['v']),
+        'unidade': item['u'],
+    }
+
+
+def _selecionar(leituras, dispositivo_ids, limite, desde):
+    """
+    Primeiras `limite` leituras (já em ordem decrescente de tempo) dos
+    dispositivos pedidos com time >= desde
+
+    Returns:
+        list | None: None quando o cache não garante a resposta (menos de
+        `limite` leituras e nenhuma anterior a `desde` para delimitar o período)
+    """
+    filtro = {int(i) for i in dispositivo_ids} if dispositivo_ids else None
+    selecionadas = []
+
+    for leitura in leituras:
+        if filtro is not None and leitura['dispositivo_id'] not in filtro:
+            continue
+        if desde is not None and leitura['time'] < desde:
+            return selecionadas
+        selecionadas.append(leitura)
+        if len(selecionadas) >= limite:
+            return selecionadas
+
+    return None
+
+
+# ==============================================================================
+# CACHE
+# ==============================================================================
+
+class UltimasLeiturasCache:
+    """
+    Últimas N leituras por conta e último valor por dispositivo, mantidos pela
+    ingestão logo após o commit de cada lote (LeituraBatchWriter ou gravação
+    direta do TelemetryService)
+
+    Backends:
+        USE_REDIS=True  → Redis: sorted set por conta (score = timestamp,
+                          aparado em N, ordenado por tempo mesmo com lotes
+                          fora de ordem) e hash por conta dispositivo → último
+                          valor (atualização condicional em Lua)
+        USE_REDIS=False → cache 'default' do Django (DatabaseCache em dev,
+                          compartilhado entre consumer e runserver): um dict
+                          por conta, read-modify-write serializado por
+                          pg_advisory_xact_lock (várias instâncias do
+                          consumer, --instances N). LocMemCache é do processo
+                          (lock de thread basta); outros backends não têm
+                          como travar entre processos → anel desabilitado
+
+    Leitura: as APIs de polling consultam o cache e só vão à hypertable no
+    miss (None). O anel contém leituras recebidas desde que a chave existe;
+    ultimas() só responde quando ele garante o resultado (>= limite leituras
+    ou uma leitura anterior ao início do período).
+
+    Watermark: instante (epoch) do último commit de leituras de cada conta,
+    gravado a cada lote mesmo com o anel desabilitado. As APIs do dashboard
+    derivam dele ETag/Last-Modified e respondem 304 sem consultar a hypertable.
+    A versão do cadastro (instante da última alteração de dispositivos ou
+    gateways da conta, avançada pelos signals) entra no mesmo ETag: renomear
+    ou trocar o tipo de um dispositivo muda as respostas sem leitura nova.
+
+    Best-effort: falha de cache é logada e nunca afeta a ingestão; as APIs
+    caem para a hypertable.
+    """
+
+    def __init__(self, tamanho=None, ttl=None, usar_redis=None):
+        """
+        Args:
+            tamanho (int): Leituras mantidas por conta (TELEMETRY_ULTIMAS_LEITURAS_N; 0 = desabilitado)
+            ttl (int): Expiração (s) das chaves de contas sem leituras (TELEMETRY_ULTIMAS_LEITURAS_TTL)
+            usar_redis (bool): Backend Redis (padrão: settings.USE_REDIS)
+        """
+        self.tamanho = tamanho if tamanho is not None else getattr(settings, 'TELEMETRY_ULTIMAS_LEITURAS_N', 200)
+        self.ttl = ttl or getattr(settings, 'TELEMETRY_ULTIMAS_LEITURAS_TTL', 86400)
+        self.usar_redis = usar_redis if usar_redis is not None else getattr(settings, 'USE_REDIS', False)
+        self._lock = threading.Lock()
+        self._redis = None
+        self._script = None
+        self._trava = None
+
+    @property
+    def habilitado(self):
+        return self.tamanho > 0 and (self.usar_redis or self._trava_django() is not None)
+
+    # ==========================================================================
+    # ESCRITA (INGESTÃO)
+    # ==========================================================================
+
+    def registrar(self, leituras):
+        """
+        Registra leituras já commitadas
+
+        Args:
+            leituras (list[LeituraDispositivo]): Lote gravado (time, conta_id,
+                dispositivo_id, valor, unidade)
+        """
+        if not leituras:
+            return
+
+        por_conta = defaultdict(list)
+        for leitura in leituras:
+            por_conta[leitura.conta_id].append(_codificar(leitura) + (leitura.dispositivo_id,))
+
+        try:
+            if self.usar_redis:
+                self._registrar_redis(por_conta)
+            else:
+                self._registrar_django(por_conta)
+        except Exception as e:
+            logger.warning(f"[LATEST] Falha ao atualizar cache de últimas leituras: {e}")
+
+    # ==========================================================================
+    # LEITURA (APIs)
+    # ==========================================================================
+
+    def ultimas(self, conta_id, dispositivo_ids=None, limite=10, desde=None):
+        """
+        Últimas leituras da conta, mais recentes primeiro
+
+        Args:
+            conta_id (int): Conta
+            dispositivo_ids (list): Restringe aos dispositivos (None/vazio = todos)
+            limite (int): Máximo de leituras
+            desde (datetime): Ignora leituras anteriores (início do período)
+
+        Returns:
+            list[dict] | None: Dicts time/dispositivo_id/valor/unidade; None = miss
+        """
+        if not self.habilitado:
+            return None
+
+        try:
+            if self.usar_redis:
+                brutos = self._conexao().zrevrange(f"{PREFIXO_LEITURAS}:{conta_id}", 0, -1)
+                leituras = [_decodificar(b) for b in brutos]
+            else:
+                leituras = (self._django().get(f"{PREFIXO_LEITURAS}:{conta_id}") or {}).get('leituras', [])
+                leituras = [_decodificar(b) for _, b in leituras]
+        except Exception as e:
+            logger.warning(f"[LATEST] Falha ao ler cache de últimas leituras: {e}")
+            return None
+
+        return _selecionar(leituras, dispositivo_ids, limite, desde) if leituras else None
+
+    def ultimos_valores(self, conta_id, dispositivo_ids=None):
+        """
+        Último valor conhecido de cada dispositivo da conta
+
+        Returns:
+            dict | None: {dispositivo_id: dict da leitura}; None = miss
+        """
+        if not self.habilitado:
+            return None
+
+        try:
+            if self.usar_redis:
+                brutos = self._conexao().hgetall(f"{PREFIXO_VALORES}:{conta_id}").values()
+            else:
+                brutos = ((self._django().get(f"{PREFIXO_LEITURAS}:{conta_id}") or {}).get('valores') or {}).values()
+        except Exception as e:
+            logger.warning(f"[LATEST] Falha ao ler cache de últimos valores: {e}")
+            return None
+
+        filtro = {int(i) for i in dispositivo_ids} if dispositivo_ids else None
+        valores = {}
+        for bruto in brutos:
+            leitura = _decodificar(bruto)
+            if filtro is None or leitura['dispositivo_id'] in filtro:
+                valores[leitura['dispositivo_id']] = leitura
+        return valores or None
+
+    def ultima_atualizacao(self, conta_id, dispositivo_ids=None, desde=None):
+        """
+        Timestamp da leitura mais recente (dos dispositivos pedidos)
+
+        Returns:
+            tuple: (encontrado, datetime | None) — encontrado=False é miss;
+            (True, None) quando a leitura mais recente é anterior a `desde`
+        """
+        valores = self.ultimos_valores(conta_id, dispositivo_ids)
+        if not valores:
+            return False, None
+
+        mais_recente = max(leitura['time'] for leitura in valores.values())
+        if desde is not None and mais_recente < desde:
+            return True, None
+        return True, mais_recente
+
+    def watermark(self, conta_id):
+        """
+        Instante do último commit de leituras da conta
+
+        Chave ausente (conta sem leituras no TTL, cache reiniciado) é semeada
+        com o instante atual: qualquer commit posterior grava um valor novo.
+
+        Returns:
+            float | None: Epoch (None se o cache falhar)
+        """
+        return self._marca(f"{PREFIXO_WATERMARK}:{conta_id}")
+
+    def versao_cadastro(self, conta_id):
+        """
+        Instante da última alteração de dispositivos/gateways da conta
+        (mesma semeadura do watermark)
+
+        Returns:
+            float | None: Epoch (None se o cache falhar)
+        """
+        return self._marca(f"{PREFIXO_CADASTRO}:{conta_id}")
+
+    def registrar_cadastro(self, conta_id):
+        """Avança a versão do cadastro da conta (signals de Dispositivo/Gateway)"""
+        chave = f"{PREFIXO_CADASTRO}:{conta_id}"
+        try:
+            if self.usar_redis:
+                self._conexao().set(chave, time.time(), ex=self.ttl)
+            else:
+                self._django().set(chave, time.time(), self.ttl)
+        except Exception as e:
+            logger.warning(f"[LATEST] Falha ao avançar versão do cadastro da conta {conta_id}: {e}")
+
+    def _marca(self, chave):
+        """Epoch gravado na chave; semeia com o instante atual se ausente"""
+        try:
+            if self.usar_redis:
+                conexao = self._conexao()
+                valor = conexao.get(chave)
+                if valor is None:
+                    conexao.set(chave, time.time(), ex=self.ttl, nx=True)
+                    valor = conexao.get(chave)
+            else:
+                cache = self._django()
+                valor = cache.get(chave)
+                if valor is None:
+                    cache.add(chave, time.time(), self.ttl)
+                    valor = cache.get(chave)
+        except Exception as e:
+            logger.warning(f"[LATEST] Falha ao ler {chave}: {e}")
+            return None
+
+        return float(valor) if valor is not None else None
+
+    # ==========================================================================
+    # BACKENDS
+    # ==========================================================================
+
+    def _conexao(self):
+        if self._redis is None:
+            from tds_new.services.lookup_cache import _redis_client
+
+            self._redis = _redis_client()
+            self._script = self._redis.register_script(_LUA_ULTIMO_VALOR)
+        return self._redis
+
+    def _registrar_redis(self, por_conta):
+        conexao = self._conexao()
+        pipe = conexao.pipeline(transaction=False)
+        agora = time.time()
+
+        for conta_id, itens in por_conta.items():
+            pipe.set(f"{PREFIXO_WATERMARK}:{conta_id}", agora, ex=self.ttl)
+            if not self.habilitado:
+                continue
+
+            chave = f"{PREFIXO_LEITURAS}:{conta_id}"
+            pipe.zadd(chave, {bruto: score for score, bruto, _ in itens})
+            pipe.zremrangebyrank(chave, 0, -(self.tamanho + 1))
+            pipe.expire(chave, self.ttl)
+
+            argumentos = []
+            for score, bruto, dispositivo_id in itens:
+                argumentos += [dispositivo_id, score, bruto]
+            self._script(keys=[f"{PREFIXO_VALORES}:{conta_id}"], args=argumentos + [self.ttl], client=pipe)
+
+        pipe.execute()
+
+    @staticmethod
+    def _django():
+        from django.core.cache import caches
+
+        return caches['default']
+
+    def _trava_django(self):
+        """
+        Como serializar o read-modify-write do anel no cache do Django
+
+        Returns:
+            str | None: alias do banco do DatabaseCache no PostgreSQL
+            (advisory lock), 'processo' (LocMemCache) ou None (backend sem
+            trava entre processos: anel desabilitado)
+        """
+        if self._trava is None:
+            from django.core.cache.backends.db import DatabaseCache
+            from django.core.cache.backends.locmem import LocMemCache
+            from django.db import connections, router
+
+            cache = self._django()
+            trava = ''
+            if isinstance(cache, DatabaseCache):
+                alias = router.db_for_write(cache.cache_model_class)
+                if connections[alias].vendor == 'postgresql':
+                    trava = alias
+            elif isinstance(cache, LocMemCache):
+                trava = 'processo'
+            if not trava:
+                logger.warning(
+                    f"[LATEST] Cache {type(cache).__name__} sem trava entre processos: "
+                    f"anel de últimas leituras desabilitado (use USE_REDIS)"
+                )
+            self._trava = trava
+        return self._trava or None
+
+    def _registrar_django(self, por_conta):
+        cache = self._django()
+        agora = time.time()
+        cache.set_many({f"{PREFIXO_WATERMARK}:{conta_id}": agora for conta_id in por_conta}, self.ttl)
+        if not self.habilitado:
+            return
+
+        from django.db import connections, transaction
+
+        trava = self._trava_django()
+        with self._lock:
+            for conta_id, itens in por_conta.items():
+                if trava == 'processo':
+                    self._atualizar_anel(cache, conta_id, itens)
+                    continue
+                # Uma transação por conta: a trava vale até o commit do cache.set
+                with transaction.atomic(using=trava):
+                    with connections[trava].cursor() as cursor:
+                        cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [TRAVA_ANEL, conta_id])
+                    self._atualizar_anel(cache, conta_id, itens)
+
+    def _atualizar_anel(self, cache, conta_id, itens):
+        chave = f"{PREFIXO_LEITURAS}:{conta_id}"
+        atual = cache.get(chave) or {'leituras': [], 'valores': {}}
+
+        # Anel: (score, JSON) em ordem decrescente, sem duplicatas (reentregas)
+        leituras = dict((bruto, score) for score, bruto in atual['leituras'])
+        valores = atual['valores']
+        for score, bruto, dispositivo_id in itens:
+            leituras[bruto] = score
+            anterior = valores.get(dispositivo_id)
+            if anterior is None or json.loads(anterior)['s'] < score:
+                valores[dispositivo_id] = bruto
+
+        anel = sorted(((s, b) for b, s in leituras.items()), reverse=True)[:self.tamanho]
+        cache.set(chave, {'leituras': anel, 'valores': valores}, self.ttl)
+
+
+cache_ultimas = UltimasLeiturasCache()
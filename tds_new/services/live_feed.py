@@ -0,0 +1,174 @@
+# ==============================================================================
+# TDS New - Live Feed (Ingestão → Dashboard em tempo real)
+# ==============================================================================
+# Arquivo: tds_new/services/live_feed.py
+# Responsabilidade: Publicar leituras commitadas e distribuí-las aos streams SSE
+# ==============================================================================
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger('telemetry_service')
+
+# Canal Redis por conta: tds_new:telemetria:<conta_id>
+CANAL_PREFIXO = 'tds_new:telemetria'
+
+# Marcador enfileirado quando o cliente perdeu eventos (fila cheia / Redis caiu)
+RESYNC = object()
+
+
+def push_disponivel():
+    """Push depende do Redis (USE_REDIS): consumer e web são processos distintos"""
+    return getattr(settings, 'USE_REDIS', False)
+
+
+# ==============================================================================
+# PUBLICAÇÃO (CONSUMER MQTT)
+# ==============================================================================
+
+_cliente = None
+
+
+def publicar_leituras(leituras, inseridas=None):
+    """
+    Publica um lote já commitado: um PUBLISH por conta, payload
+    {"leituras": [[dispositivo_id, time ISO, valor, unidade], ...]}
+
+    Só as leituras inseridas vão para o stream: reentregas e duplicadas
+    descartadas pelo ON CONFLICT já estão no dashboard (somá-las de novo
+    inflaria médias, barras e o total de leituras).
+
+    No-op sem USE_REDIS. Falhas não propagam (o dashboard ressincroniza).
+
+    Args:
+        leituras (list[LeituraDispositivo]): Lote gravado
+        inseridas (set): Chaves (dispositivo_id, time) inseridas, de
+            copy_bulk(retornar_inseridas=True) (None = todas)
+    """
+    global _cliente
+    if not leituras or not push_disponivel():
+        return
+
+    pendentes = set(inseridas) if inseridas is not None else None
+    por_conta = defaultdict(list)
+    for leitura in leituras:
+        if pendentes is not None:
+            chave = (leitura.dispositivo_id, leitura.time)
+            if chave not in pendentes:
+                continue
+            pendentes.discard(chave)  # Mesma chave duas vezes no lote: uma inserida
+        por_conta[leitura.conta_id].append(
+            [leitura.dispositivo_id, leitura.time.isoformat(), float(leitura.valor), leitura.unidade]
+        )
+    if not por_conta:
+        return
+
+    try:
+        if _cliente is None:
+            from tds_new.services.lookup_cache import _redis_client
+
+            _cliente = _redis_client()
+        pipe = _cliente.pipeline(transaction=False)
+        for conta_id, itens in por_conta.items():
+            pipe.publish(f"{CANAL_PREFIXO}:{conta_id}", json.dumps({'leituras': itens}, separators=(',', ':')))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"[LIVE] Falha ao publicar leituras no Redis: {e}")
+
+
+# ==============================================================================
+# DISTRIBUIÇÃO (PROCESSO WEB ASGI)
+# ==============================================================================
+
+class DistribuidorTelemetria:
+    """
+    Fan-out das leituras publicadas para os streams SSE abertos no processo
+
+    Uma única assinatura Redis (PSUBSCRIBE tds_new:telemetria:*) por processo
+    web, iniciada com o primeiro stream; cada stream tem uma asyncio.Queue
+    registrada sob a sua conta. Cliente lento (fila cheia) ou Redis
+    reconectado recebe RESYNC e recarrega os dados completos.
+    """
+
+    def __init__(self, tamanho_fila=None):
+        """
+        Args:
+            tamanho_fila (int): Eventos pendentes por stream (TELEMETRY_SSE_FILA)
+        """
+        self.tamanho_fila = tamanho_fila or getattr(settings, 'TELEMETRY_SSE_FILA', 256)
+        self._filas = defaultdict(set)  # conta_id -> {asyncio.Queue}
+        self._tarefa = None
+
+    def assinar(self, conta_id):
+        """
+        Registra um stream da conta (chamar dentro do event loop)
+
+        Returns:
+            asyncio.Queue: Recebe bytes JSON do canal ou RESYNC
+        """
+        if self._tarefa is None or self._tarefa.done() or self._tarefa.get_loop() is not asyncio.get_running_loop():
+            self._tarefa = asyncio.get_running_loop().create_task(self._loop())
+
+        fila = asyncio.Queue(maxsize=self.tamanho_fila)
+        self._filas[conta_id].add(fila)
+        return fila
+
+    def cancelar(self, conta_id, fila):
+        """Remove o stream (cliente desconectou)"""
+        filas = self._filas.get(conta_id)
+        if filas is not None:
+            filas.discard(fila)
+            if not filas:
+                del self._filas[conta_id]
+
+    def conexoes(self):
+        """
+        Returns:
+            dict: {conta_id: streams abertos}
+        """
+        return {conta_id: len(filas) for conta_id, filas in self._filas.items()}
+
+    def _entregar(self, conta_id, dados):
+        for fila in list(self._filas.get(conta_id, ())):
+            try:
+                fila.put_nowait(dados)
+            except asyncio.QueueFull:
+                # Descarta o atrasado: o cliente recarrega tudo no RESYNC
+                while not fila.empty():
+                    fila.get_nowait()
+                fila.put_nowait(RESYNC)
+
+    async def _loop(self):
+        import redis.asyncio as aioredis
+
+        while True:
+            try:
+                cliente = aioredis.Redis(
+                    host=settings.REDIS_HOST,
+                    port=int(settings.REDIS_PORT),
+                    password=settings.REDIS_PASSWORD or None,
+                )
+                pubsub = cliente.pubsub(ignore_subscribe_messages=True)
+                await pubsub.psubscribe(f"{CANAL_PREFIXO}:*")
+                logger.info(f"[LIVE] Assinatura ativa: {CANAL_PREFIXO}:*")
+
+                async for mensagem in pubsub.listen():
+                    try:
+                        conta_id = int(mensagem['channel'].rsplit(b':', 1)[1])
+                    except (ValueError, IndexError):
+                        continue
+                    self._entregar(conta_id, mensagem['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[LIVE] Assinatura Redis desconectada: {e}")
+                for conta_id in list(self._filas):
+                    self._entregar(conta_id, RESYNC)
+                await asyncio.sleep(5)
+
+
+distribuidor = DistribuidorTelemetria()
@@ -0,0 +1,543 @@
+# ==============================================================================
+# TDS New - Liveness Writer (Ingestão de Telemetria)
+# ==============================================================================
+# Arquivo: tds_new/services/liveness.py
+# Responsabilidade: Coalescer last_seen/is_online e detectar gateways/dispositivos offline
+# ==============================================================================
+
+import heapq
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger('telemetry_service')
+
+GATEWAY = 'gateway'
+DISPOSITIVO = 'dispositivo'
+
+# Heartbeat do sweeper no cache compartilhado (presente = há consumer varrendo)
+CHAVE_SWEEPER_ATIVO = 'tds_new:offline:sweeper_ativo'
+# Marca da última varredura completa feita com consumer no ar (reconciliação)
+CHAVE_RECONCILIACAO = 'tds_new:offline:reconciliacao'
+
+# ==============================================================================
+# SWEEPER DE OFFLINE (MIN-HEAP POR PRAZO)
+# ==============================================================================
+
+class OfflineSweeper:
+    """
+    Marca gateways/dispositivos como offline após uma janela sem comunicação
+
+    Min-heap de (prazo, tipo, id), com prazo = last_seen + janela do tipo.
+    Cada tick só desempilha o que venceu: O(vencidos · log n), sem varrer a
+    tabela. Entradas vencidas cujo last_seen avançou nesse meio tempo são
+    reempilhadas com o novo prazo (uma por item por janela, não por mensagem).
+
+    As transições são gravadas em lote, um UPDATE por tipo:
+        is_online=False WHERE id IN (...) AND last_seen < agora - janela
+    O filtro por last_seen protege itens vistos por outra instância do
+    consumer (shared subscription) que esta instância não acompanhou.
+
+    O sweeper é o caminho oficial de detecção de offline. A cada tick ele
+    renova CHAVE_SWEEPER_ATIVO no cache; enquanto a chave existe, a task
+    Celery tds_new.marcar_offline não varre a tabela (ver
+    marcar_offline_expirados).
+    """
+
+    def __init__(self, janela_gateway_s=None, janela_dispositivo_s=None, intervalo_s=None):
+        """
+        Args:
+            janela_gateway_s (int): Silêncio até o gateway ficar offline (TELEMETRY_OFFLINE_GATEWAY_S)
+            janela_dispositivo_s (int): Idem para dispositivos (TELEMETRY_OFFLINE_DISPOSITIVO_S)
+            intervalo_s (float): Período do tick (TELEMETRY_OFFLINE_SWEEP_S)
+        """
+        self.janelas = {
+            GATEWAY: timedelta(seconds=janela_gateway_s or getattr(settings, 'TELEMETRY_OFFLINE_GATEWAY_S', 300)),
+            DISPOSITIVO: timedelta(
+                seconds=janela_dispositivo_s or getattr(settings, 'TELEMETRY_OFFLINE_DISPOSITIVO_S', 600)
+            ),
+        }
+        self.intervalo = intervalo_s or getattr(settings, 'TELEMETRY_OFFLINE_SWEEP_S', 5)
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._heap = []
+        self._ultimo = {}  # (tipo, id) -> last_seen mais recente conhecido
+        self._thread = None
+
+        self._stats = {'ticks': 0, 'gateways_offline': 0, 'dispositivos_offline': 0, 'erros': 0}
+
+    # ==========================================================================
+    # CICLO DE VIDA
+    # ==========================================================================
+
+    def iniciar(self):
+        """Carrega os itens online do banco e inicia a thread de varredura"""
+        if self._thread is not None:
+            return
+
+        self._carregar_online()
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name='offline-sweeper', daemon=True)
+        self._thread.start()
+        logger.info(
+            f"[OFFLINE] Sweeper iniciado ({len(self._ultimo)} itens online; janelas "
+            f"gateway={int(self.janelas[GATEWAY].total_seconds())}s, "
+            f"dispositivo={int(self.janelas[DISPOSITIVO].total_seconds())}s)"
+        )
+
+    def parar(self, timeout=10):
+        """Encerra a thread de varredura"""
+        if self._thread is None:
+            return
+
+        self._parar.set()
+        self._thread.join(timeout)
+        self._thread = None
+        try:
+            cache.delete(CHAVE_SWEEPER_ATIVO)  # outra instância no ar renova no próximo tick
+        except Exception as e:
+            logger.warning(f"[OFFLINE] Falha ao remover heartbeat do sweeper: {e}")
+        logger.info(f"[OFFLINE] Sweeper encerrado: {self.estatisticas()}")
+
+    # ==========================================================================
+    # API
+    # ==========================================================================
+
+    def observar(self, tipo, vistos):
+        """
+        Atualiza o last_seen conhecido (chamado pelo liveness writer a cada flush)
+
+        Args:
+            tipo (str): GATEWAY ou DISPOSITIVO
+            vistos (dict): id → last_seen
+        """
+        if self._thread is None:
+            return
+        self._agendar(tipo, vistos)
+
+    def _agendar(self, tipo, vistos):
+        janela = self.janelas[tipo]
+        with self._lock:
+            for item_id, instante in vistos.items():
+                chave = (tipo, item_id)
+                anterior = self._ultimo.get(chave)
+                if anterior is None:
+                    heapq.heappush(self._heap, (instante + janela, tipo, item_id))
+                if anterior is None or instante > anterior:
+                    self._ultimo[chave] = instante
+
+    def esquecer(self, tipo, desconectados):
+        """
+        Para de acompanhar itens já marcados offline (desconexão anunciada)
+
+        Args:
+            tipo (str): GATEWAY ou DISPOSITIVO
+            desconectados (dict): id → instante da desconexão
+        """
+        with self._lock:
+            for item_id, instante in desconectados.items():
+                chave = (tipo, item_id)
+                ultimo = self._ultimo.get(chave)
+                if ultimo is not None and ultimo <= instante:
+                    del self._ultimo[chave]  # a entrada no heap é descartada ao vencer
+
+    def varrer(self, agora=None):
+        """
+        Um tick: desempilha os prazos vencidos e grava as transições em lote
+
+        Returns:
+            dict: {tipo: ids marcados offline}
+        """
+        agora = agora or timezone.now()
+        vencidos = {GATEWAY: [], DISPOSITIVO: []}
+
+        with self._lock:
+            while self._heap and self._heap[0][0] <= agora:
+                _, tipo, item_id = heapq.heappop(self._heap)
+                chave = (tipo, item_id)
+                ultimo = self._ultimo.get(chave)
+                if ultimo is None:
+                    continue
+
+                prazo = ultimo + self.janelas[tipo]
+                if prazo > agora:
+                    heapq.heappush(self._heap, (prazo, tipo, item_id))
+                else:
+                    del self._ultimo[chave]
+                    vencidos[tipo].append(item_id)
+
+        if not vencidos[GATEWAY] and not vencidos[DISPOSITIVO]:
+            return {}
+        return self._gravar(vencidos, agora)
+
+    def estatisticas(self):
+        """
+        Returns:
+            dict: ticks, gateways_offline, dispositivos_offline, erros, monitorados
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['monitorados'] = len(self._ultimo)
+        return stats
+
+    # ==========================================================================
+    # INTERNOS
+    # ==========================================================================
+
+    def _carregar_online(self):
+        """Estado inicial: itens is_online=True com last_seen (uma query por tipo)"""
+        from tds_new.models import Dispositivo, Gateway
+
+        for tipo, model in ((GATEWAY, Gateway), (DISPOSITIVO, Dispositivo)):
+            online = model.objects.filter(is_online=True, last_seen__isnull=False).order_by()
+            self._agendar(tipo, dict(online.values_list('id', 'last_seen')))
+
+    def _loop(self):
+        try:
+            while not self._parar.wait(self.intervalo):
+                try:
+                    self.varrer()
+                except Exception as e:
+                    with self._lock:
+                        self._stats['erros'] += 1
+                    logger.exception(f"💥 [OFFLINE] Erro na varredura: {e}")
+                    connection.close()
+                with self._lock:
+                    self._stats['ticks'] += 1
+                self._sinalizar_ativo()
+        finally:
+            connection.close()
+
+    def _sinalizar_ativo(self):
+        """Renova o heartbeat (expira em alguns ticks se o consumer cair)"""
+        try:
+            cache.set(CHAVE_SWEEPER_ATIVO, timezone.now().isoformat(), timeout=max(3 * self.intervalo, 30))
+        except Exception as e:
+            logger.warning(f"[OFFLINE] Falha ao renovar heartbeat do sweeper: {e}")
+
+    def _gravar(self, vencidos, agora):
+        """Um UPDATE por tipo; só derruba quem continua sem last_seen recente no banco"""
+        from tds_new.models import Dispositivo, Gateway
+
+        marcados = {}
+        for tipo, model in ((GATEWAY, Gateway), (DISPOSITIVO, Dispositivo)):
+            ids = vencidos[tipo]
+            if not ids:
+                continue
+
+            total = model.objects.filter(
+                pk__in=ids,
+                is_online=True,
+                last_seen__lt=agora - self.janelas[tipo]
+            ).update(is_online=False)
+
+            marcados[tipo] = ids
+            with self._lock:
+                self._stats[f"{tipo}s_offline"] += total
+            logger.info(f"[OFFLINE] {total}/{len(ids)} {tipo}(s) marcados offline")
+
+        return marcados
+
+
+# ==============================================================================
+# WRITER DE LAST_SEEN (COALESCIDO)
+# ==============================================================================
+
+class GatewayLivenessWriter:
+    """
+    Tabelas em memória id → último instante visto (gateways e dispositivos),
+    gravadas a cada T s
+
+    Cada mensagem apenas registra o instante em um dict; a thread de flush
+    grava todos os itens tocados com um único UPDATE por tabela:
+        UPDATE tds_new_gateway ... FROM (VALUES (id, last_seen), ...)
+    sem passar pelo model (Gateway.save() roda full_clean(), com a query de
+    unicidade do MAC) e sem disparar signals.
+
+    O WHERE só avança last_seen (várias instâncias do consumer podem gravar
+    o mesmo gateway fora de ordem).
+
+    Após cada flush os instantes são repassados ao OfflineSweeper.
+
+    Desconexões anunciadas (LWT "offline" no topic de status) entram em um
+    buffer próprio, gravado no mesmo flush logo após os last_seen, com
+    is_online=False só onde last_seen não é posterior ao anúncio.
+
+    Sem a thread iniciada (ex: service usado fora do consumer) registrar()
+    grava na hora.
+    """
+
+    def __init__(self, intervalo_s=None, sweeper=None):
+        """
+        Args:
+            intervalo_s (float): Período de flush (TELEMETRY_LIVENESS_FLUSH_S)
+            sweeper (OfflineSweeper): Recebe os instantes gravados (detecção de offline)
+        """
+        self.intervalo = intervalo_s or getattr(settings, 'TELEMETRY_LIVENESS_FLUSH_S', 5)
+        self.sweeper = sweeper
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._pendentes = {GATEWAY: {}, DISPOSITIVO: {}}  # tipo -> {id: datetime}
+        self._desconectados = {}  # gateway_id -> instante do LWT
+        self._thread = None
+
+        self._stats = {
+            'flushes': 0,
+            'gateways_atualizados': 0,
+            'dispositivos_atualizados': 0,
+            'gateways_desconectados': 0,
+            'erros': 0,
+        }
+
+    # ==========================================================================
+    # CICLO DE VIDA
+    # ==========================================================================
+
+    def iniciar(self):
+        """Inicia a thread de flush periódico"""
+        if self._thread is not None:
+            return
+
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name='gateway-liveness-writer', daemon=True)
+        self._thread.start()
+        logger.info(f"[LIVENESS] Writer iniciado (flush a cada {self.intervalo}s)")
+
+    def parar(self, timeout=10):
+        """Encerra a thread após o flush final"""
+        if self._thread is None:
+            return
+
+        self._parar.set()
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info(f"[LIVENESS] Writer encerrado: {self.estatisticas()}")
+
+    # ==========================================================================
+    # API
+    # ==========================================================================
+
+    def registrar(self, gateway_id, dispositivos=(), instante=None):
+        """
+        Marca o gateway (e os dispositivos lidos) como vistos agora
+
+        Args:
+            gateway_id (int): ID do gateway
+            dispositivos (iterable[int]): IDs dos dispositivos com leitura na mensagem
+            instante (datetime): Momento da mensagem (padrão: agora)
+        """
+        instante = instante or timezone.now()
+
+        with self._lock:
+            self._marcar(self._pendentes[GATEWAY], gateway_id, instante)
+            pendentes_dispositivos = self._pendentes[DISPOSITIVO]
+            for dispositivo_id in dispositivos:
+                self._marcar(pendentes_dispositivos, dispositivo_id, instante)
+
+        if self._thread is None:
+            self.flush()
+
+    def registrar_desconexao(self, gateway_id, instante=None):
+        """
+        Marca o gateway como offline (LWT / status "offline")
+
+        Args:
+            gateway_id (int): ID do gateway
+            instante (datetime): Momento do anúncio (padrão: agora)
+        """
+        instante = instante or timezone.now()
+
+        with self._lock:
+            self._marcar(self._desconectados, gateway_id, instante)
+
+        if self._thread is None:
+            self.flush()
+
+    def estatisticas(self):
+        """
+        Returns:
+            dict: flushes, gateways/dispositivos atualizados, erros, pendentes
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pendentes'] = sum(len(p) for p in self._pendentes.values()) + len(self._desconectados)
+        return stats
+
+    def flush(self):
+        """Grava os itens pendentes (um UPDATE por tabela + um para as desconexões)"""
+        with self._lock:
+            pendentes = self._pendentes
+            desconectados = self._desconectados
+            self._pendentes = {GATEWAY: {}, DISPOSITIVO: {}}
+            self._desconectados = {}
+
+        if not pendentes[GATEWAY] and not pendentes[DISPOSITIVO] and not desconectados:
+            return
+
+        try:
+            atualizados = {tipo: self._gravar(tipo, itens) for tipo, itens in pendentes.items() if itens}
+            total_desconectados = self._gravar_desconexoes(desconectados) if desconectados else 0
+        except Exception as e:
+            # Devolve ao buffer (preservando instantes mais novos) para o próximo flush
+            with self._lock:
+                self._stats['erros'] += 1
+                for tipo, itens in pendentes.items():
+                    for item_id, instante in itens.items():
+                        self._marcar(self._pendentes[tipo], item_id, instante)
+                for gateway_id, instante in desconectados.items():
+                    self._marcar(self._desconectados, gateway_id, instante)
+            logger.exception(f"💥 [LIVENESS] Erro ao gravar last_seen: {e}")
+            connection.close()
+            return
+
+        with self._lock:
+            self._stats['flushes'] += 1
+            for tipo, total in atualizados.items():
+                self._stats[f"{tipo}s_atualizados"] += total
+            self._stats['gateways_desconectados'] += total_desconectados
+
+        if self.sweeper is not None:
+            for tipo, itens in pendentes.items():
+                if itens:
+                    self.sweeper.observar(tipo, itens)
+            if desconectados:
+                self.sweeper.esquecer(GATEWAY, desconectados)
+
+    # ==========================================================================
+    # INTERNOS
+    # ==========================================================================
+
+    @staticmethod
+    def _marcar(pendentes, item_id, instante):
+        anterior = pendentes.get(item_id)
+        if anterior is None or instante > anterior:
+            pendentes[item_id] = instante
+
+    def _loop(self):
+        try:
+            while not self._parar.wait(self.intervalo):
+                self.flush()
+            self.flush()
+        finally:
+            connection.close()
+
+    def _gravar(self, tipo, pendentes):
+        """
+        Returns:
+            int: Linhas efetivamente atualizadas
+        """
+        from tds_new.models import Dispositivo, Gateway
+
+        model = Gateway if tipo == GATEWAY else Dispositivo
+
+        if connection.vendor != 'postgresql':
+            return sum(
+                model.objects.filter(pk=item_id).update(last_seen=instante, is_online=True)
+                for item_id, instante in pendentes.items()
+            )
+
+        valores = ', '.join(['(%s, %s::timestamptz)'] * len(pendentes))
+        parametros = [p for item in pendentes.items() for p in item]
+        tabela = model._meta.db_table
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {tabela} AS t SET last_seen = v.last_seen, is_online = TRUE "
+                f"FROM (VALUES {valores}) AS v(id, last_seen) "
+                f"WHERE t.id = v.id AND (t.last_seen IS NULL OR t.last_seen < v.last_seen)",
+                parametros
+            )
+            return cursor.rowcount
+
+    def _gravar_desconexoes(self, desconectados):
+        """
+        is_online=False só para quem não foi visto depois do anúncio
+
+        Returns:
+            int: Gateways efetivamente marcados offline
+        """
+        from tds_new.models import Gateway
+
+        if connection.vendor != 'postgresql':
+            return sum(
+                Gateway.objects.filter(pk=gateway_id, is_online=True)
+                .exclude(last_seen__gt=instante)
+                .update(is_online=False)
+                for gateway_id, instante in desconectados.items()
+            )
+
+        valores = ', '.join(['(%s, %s::timestamptz)'] * len(desconectados))
+        parametros = [p for item in desconectados.items() for p in item]
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {Gateway._meta.db_table} AS t SET is_online = FALSE "
+                f"FROM (VALUES {valores}) AS v(id, instante) "
+                f"WHERE t.id = v.id AND t.is_online AND (t.last_seen IS NULL OR t.last_seen <= v.instante)",
+                parametros
+            )
+            return cursor.rowcount
+
+
+# ==============================================================================
+# VARREDURA COMPLETA (SAFETY NET)
+# ==============================================================================
+
+def marcar_offline_expirados(agora=None, forcar=False):
+    """
+    Marca offline tudo que está is_online=True com last_seen fora da janela
+
+    Varredura completa (UPDATE ... WHERE last_seen < ...), usada pela task
+    Celery periódica como fallback. Com um consumer no ar (heartbeat
+    CHAVE_SWEEPER_ATIVO no cache), o OfflineSweeper já faz a detecção em
+    O(vencidos) e a varredura só roda uma vez a cada
+    TELEMETRY_OFFLINE_RECONCILIACAO_S. Essa passada cobre itens que só uma
+    instância encerrada do consumer acompanhava (shared subscription).
+
+    Com cache por processo (LocMem) o heartbeat do consumer não é visível
+    no worker Celery e a varredura roda a cada execução da task.
+
+    Args:
+        forcar (bool): Varre mesmo com sweeper ativo
+
+    Returns:
+        dict: {'gateways': int, 'dispositivos': int, 'varredura': bool}
+    """
+    from tds_new.models import Dispositivo, Gateway
+
+    if not forcar and _sweeper_ativo():
+        reconciliacao_s = getattr(settings, 'TELEMETRY_OFFLINE_RECONCILIACAO_S', 3600)
+        if not cache.add(CHAVE_RECONCILIACAO, 1, timeout=reconciliacao_s):
+            return {'gateways': 0, 'dispositivos': 0, 'varredura': False}
+
+    agora = agora or timezone.now()
+    janela_gateway = timedelta(seconds=getattr(settings, 'TELEMETRY_OFFLINE_GATEWAY_S', 300))
+    janela_dispositivo = timedelta(seconds=getattr(settings, 'TELEMETRY_OFFLINE_DISPOSITIVO_S', 600))
+
+    return {
+        'gateways': Gateway.objects.filter(
+            is_online=True, last_seen__lt=agora - janela_gateway
+        ).update(is_online=False),
+        'dispositivos': Dispositivo.objects.filter(
+            is_online=True, last_seen__lt=agora - janela_dispositivo
+        ).update(is_online=False),
+        'varredura': True,
+    }
+
+
+def _sweeper_ativo():
+    try:
+        return cache.get(CHAVE_SWEEPER_ATIVO) is not None
+    except Exception as e:
+        logger.warning(f"[OFFLINE] Heartbeat do sweeper indisponível, varredura completa: {e}")
+        return False
+
+
+# Instâncias compartilhadas do processo (iniciadas pelo start_mqtt_consumer)
+offline_sweeper = OfflineSweeper()
+gateway_liveness = GatewayLivenessWriter(sweeper=offline_sweeper)
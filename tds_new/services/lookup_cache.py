@@ -0,0 +1,344 @@
+# ==============================================================================
+# TDS New - Lookup Cache (Ingestão de Telemetria)
+# ==============================================================================
+# Arquivo: tds_new/services/lookup_cache.py
+# Responsabilidade: Caches process-local para resoluções do hot path do consumer
+# ==============================================================================
+
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+logger = logging.getLogger('telemetry_service')
+
+# Canal Redis pub/sub para invalidação entre processos (web → consumer)
+CANAL_INVALIDACAO = 'tds_new:lookup_cache:invalidar'
+
+# Projeção mínima do Gateway usada no hot path (sem instanciar o model)
+GatewayInfo = namedtuple('GatewayInfo', ['id', 'conta_id', 'codigo', 'mac'])
+
+# ==============================================================================
+# CACHE DE DISPOSITIVOS POR GATEWAY
+# ==============================================================================
+
+class DispositivoLookupCache:
+    """
+    Cache process-local de (gateway_id, codigo) → dispositivo_id
+
+    O mapa é carregado por gateway inteiro (uma única query traz todos os
+    8-32 dispositivos), de modo que um payload completo é resolvido com
+    zero queries (cache quente) ou uma query (cache frio/expirado).
+
+    Invalidação:
+    - TTL (settings.TELEMETRY_LOOKUP_CACHE_TTL, padrão 300s)
+    - Signals post_save/post_delete de Dispositivo (tds_new/signals.py)
+
+    Thread-safe: o lock protege apenas o dict; a query roda fora do lock.
+    """
+
+    def __init__(self, ttl=None):
+        """
+        Args:
+            ttl (int): Tempo de vida (segundos) de cada mapa de gateway
+        """
+        self.ttl = ttl if ttl is not None else getattr(settings, 'TELEMETRY_LOOKUP_CACHE_TTL', 300)
+        self._lock = threading.Lock()
+        self._por_gateway = {}  # gateway_id -> (expira_em, {codigo: dispositivo_id})
+
+    def resolver(self, gateway_id):
+        """
+        Retorna o mapa {codigo: dispositivo_id} de um gateway
+
+        Args:
+            gateway_id (int): ID do gateway
+
+        Returns:
+            dict: Mapa codigo → dispositivo_id (0 ou 1 query)
+        """
+        agora = time.monotonic()
+
+        with self._lock:
+            entrada = self._por_gateway.get(gateway_id)
+
+        if entrada is not None and entrada[0] > agora:
+            return entrada[1]
+
+        mapa = self._carregar(gateway_id)
+
+        with self._lock:
+            self._por_gateway[gateway_id] = (agora + self.ttl, mapa)
+
+        return mapa
+
+    def buscar(self, gateway_id, codigo):
+        """
+        Resolve um único código de dispositivo
+
+        Returns:
+            int | None: dispositivo_id ou None se não pertence ao gateway
+        """
+        return self.resolver(gateway_id).get(codigo)
+
+    def invalidar(self, gateway_id=None, dispositivo_id=None):
+        """
+        Remove mapas do cache
+
+        Args:
+            gateway_id (int): Gateway a invalidar (None + dispositivo_id=None = tudo)
+            dispositivo_id (int): Também remove qualquer gateway que contenha o
+                dispositivo (cobre troca de gateway do dispositivo)
+        """
+        with self._lock:
+            if gateway_id is None and dispositivo_id is None:
+                self._por_gateway.clear()
+                return
+
+            self._por_gateway.pop(gateway_id, None)
+
+            if dispositivo_id is not None:
+                obsoletos = [
+                    gw_id for gw_id, (_, mapa) in self._por_gateway.items()
+                    if dispositivo_id in mapa.values()
+                ]
+                for gw_id in obsoletos:
+                    del self._por_gateway[gw_id]
+
+    def _carregar(self, gateway_id):
+        """Carrega todos os dispositivos do gateway em uma única query"""
+        from tds_new.models import Dispositivo  # import tardio — evita ciclo models ↔ services
+
+        mapa = dict(
+            Dispositivo.objects.filter(gateway_id=gateway_id).order_by().values_list('codigo', 'id')
+        )
+        logger.debug(f"[CACHE] Dispositivos carregados: gateway_id={gateway_id} ({len(mapa)} itens)")
+        return mapa
+
+
+# ==============================================================================
+# CACHE DE GATEWAYS POR MAC
+# ==============================================================================
+
+class GatewayLookupCache:
+    """
+    Cache process-local de MAC → GatewayInfo(id, conta_id, codigo, mac)
+
+    - Pré-carregado no start do consumer (uma query para todos os gateways)
+    - Cache negativo: MACs desconhecidos ficam marcados por
+      settings.TELEMETRY_LOOKUP_NEGATIVE_TTL (padrão 60s), evitando que um
+      gateway não cadastrado gere uma query por mensagem
+    - MAC duplicado: Gateway.mac é único só por conta; um MAC cadastrado em
+      mais de uma conta não identifica o tenant e é tratado como não
+      resolvido (erro no log + cache negativo), nunca atribuído a uma delas
+    - Invalidação: signals de Gateway (mesmo processo) e canal Redis pub/sub
+      CANAL_INVALIDACAO (outros processos, quando USE_REDIS=True)
+    """
+
+    _AUSENTE = object()
+
+    def __init__(self, ttl=None, ttl_negativo=None):
+        """
+        Args:
+            ttl (int): Tempo de vida (segundos) das entradas positivas
+            ttl_negativo (int): Tempo de vida (segundos) das entradas negativas
+        """
+        self.ttl = ttl if ttl is not None else getattr(settings, 'TELEMETRY_LOOKUP_CACHE_TTL', 300)
+        self.ttl_negativo = (
+            ttl_negativo if ttl_negativo is not None
+            else getattr(settings, 'TELEMETRY_LOOKUP_NEGATIVE_TTL', 60)
+        )
+        self._lock = threading.Lock()
+        self._por_mac = {}  # mac -> (expira_em, GatewayInfo | _AUSENTE)
+
+    def precarregar(self):
+        """
+        Carrega todos os gateways cadastrados (start do consumer)
+
+        Returns:
+            int: Quantidade de gateways carregados
+        """
+        from tds_new.models import Gateway
+
+        agora = time.monotonic()
+        entradas = {}
+        duplicados = set()
+        for mac, gw_id, conta_id, codigo in Gateway.objects.order_by().values_list('mac', 'id', 'conta_id', 'codigo'):
+            mac = mac.lower()
+            if mac in entradas:
+                duplicados.add(mac)
+            entradas[mac] = (agora + self.ttl, GatewayInfo(gw_id, conta_id, codigo, mac))
+
+        for mac in duplicados:
+            self._log_duplicado(mac)
+            entradas[mac] = (agora + self.ttl_negativo, self._AUSENTE)
+
+        with self._lock:
+            self._por_mac = entradas
+
+        carregados = len(entradas) - len(duplicados)
+        logger.info(f"[CACHE] {carregados} gateways pré-carregados")
+        return carregados
+
+    def buscar(self, mac):
+        """
+        Resolve um gateway pelo MAC
+
+        Args:
+            mac (str): MAC address extraído do topic
+
+        Returns:
+            GatewayInfo | None: None se o MAC não está cadastrado ou está
+            cadastrado em mais de uma conta
+        """
+        mac = mac.lower()
+        agora = time.monotonic()
+
+        with self._lock:
+            entrada = self._por_mac.get(mac)
+
+        if entrada is not None and entrada[0] > agora:
+            valor = entrada[1]
+            return None if valor is self._AUSENTE else valor
+
+        from tds_new.models import Gateway
+
+        linhas = list(
+            Gateway.objects.filter(mac=mac).order_by()
+            .values_list('id', 'conta_id', 'codigo')[:2]
+        )
+
+        if len(linhas) != 1:
+            if linhas:
+                self._log_duplicado(mac)
+            with self._lock:
+                self._por_mac[mac] = (agora + self.ttl_negativo, self._AUSENTE)
+            return None
+
+        info = GatewayInfo(*linhas[0], mac)
+        with self._lock:
+            self._por_mac[mac] = (agora + self.ttl, info)
+        return info
+
+    def invalidar(self, mac=None, gateway_id=None):
+        """
+        Remove entradas do cache
+
+        Args:
+            mac (str): MAC a invalidar (inclui entradas negativas)
+            gateway_id (int): Remove também a entrada com este ID (cobre troca de MAC)
+                (sem argumentos = limpa tudo)
+        """
+        with self._lock:
+            if mac is None and gateway_id is None:
+                self._por_mac.clear()
+                return
+
+            if mac:
+                self._por_mac.pop(mac.lower(), None)
+
+            if gateway_id is not None:
+                obsoletos = [
+                    chave for chave, (_, valor) in self._por_mac.items()
+                    if valor is not self._AUSENTE and valor.id == gateway_id
+                ]
+                for chave in obsoletos:
+                    del self._por_mac[chave]
+
+    @staticmethod
+    def _log_duplicado(mac):
+        logger.error(
+            f"[CACHE] MAC {mac} cadastrado em mais de uma conta: mensagens ignoradas "
+            f"até o cadastro ser corrigido (não é possível identificar o tenant)"
+        )
+
+
+# Instâncias únicas por processo (compartilhadas entre threads do consumer)
+dispositivo_cache = DispositivoLookupCache()
+gateway_cache = GatewayLookupCache()
+
+
+# ==============================================================================
+# INVALIDAÇÃO ENTRE PROCESSOS (REDIS PUB/SUB)
+# ==============================================================================
+
+def aplicar_invalidacao(mensagem):
+    """
+    Aplica uma invalidação nos caches locais
+
+    Args:
+        mensagem (dict): {'tipo': 'gateway'|'dispositivo', 'gateway_id', 'mac', 'dispositivo_id'}
+    """
+    tipo = mensagem.get('tipo')
+
+    if tipo == 'gateway':
+        gateway_cache.invalidar(mac=mensagem.get('mac'), gateway_id=mensagem.get('gateway_id'))
+        dispositivo_cache.invalidar(gateway_id=mensagem.get('gateway_id'))
+    elif tipo == 'dispositivo':
+        dispositivo_cache.invalidar(
+            gateway_id=mensagem.get('gateway_id'),
+            dispositivo_id=mensagem.get('dispositivo_id')
+        )
+
+
+def _redis_client():
+    """Cliente Redis a partir de settings.REDIS_* (import tardio — redis é opcional em dev)"""
+    import redis
+
+    return redis.Redis(
+        host=settings.REDIS_HOST,
+        port=int(settings.REDIS_PORT),
+        password=settings.REDIS_PASSWORD or None,
+    )
+
+
+def publicar_invalidacao(**mensagem):
+    """
+    Publica invalidação para os demais processos (no-op se USE_REDIS=False)
+
+    Falhas de Redis não propagam: o TTL dos caches cobre a janela de inconsistência.
+    """
+    if not getattr(settings, 'USE_REDIS', False):
+        return
+
+    try:
+        _redis_client().publish(CANAL_INVALIDACAO, json.dumps(mensagem))
+    except Exception as e:
+        logger.warning(f"[CACHE] Falha ao publicar invalidação no Redis: {e}")
+
+
+def iniciar_listener_invalidacao():
+    """
+    Inicia thread daemon que aplica invalidações publicadas por outros processos
+
+    Returns:
+        threading.Thread | None: Thread iniciada (None se USE_REDIS=False)
+    """
+    if not getattr(settings, 'USE_REDIS', False):
+        logger.info("[CACHE] USE_REDIS=False: invalidação entre processos desabilitada (apenas TTL)")
+        return None
+
+    def _loop():
+        while True:
+            try:
+                pubsub = _redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CANAL_INVALIDACAO)
+                logger.info(f"[CACHE] Listener de invalidação ativo: {CANAL_INVALIDACAO}")
+
+                for item in pubsub.listen():
+                    try:
+                        aplicar_invalidacao(json.loads(item['data']))
+                    except (ValueError, TypeError) as e:
+                        logger.warning(f"[CACHE] Mensagem de invalidação inválida: {e}")
+            except Exception as e:
+                # Conexão perdida: limpar tudo (eventos podem ter sido perdidos) e reconectar
+                logger.warning(f"[CACHE] Listener de invalidação desconectado: {e}")
+                gateway_cache.invalidar()
+                dispositivo_cache.invalidar()
+                time.sleep(5)
+
+    thread = threading.Thread(target=_loop, name='lookup-cache-invalidation', daemon=True)
+    thread.start()
+    return thread
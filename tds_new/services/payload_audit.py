@@ -0,0 +1,260 @@
+# ==============================================================================
+# TDS New - Auditoria de Payload (Ingestão de Telemetria)
+# ==============================================================================
+# Arquivo: tds_new/services/payload_audit.py
+# Responsabilidade: Política de payload_raw e gravação da auditoria comprimida
+# ==============================================================================
+
+import itertools
+import logging
+import re
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger('telemetry_service')
+
+# Modos de TELEMETRY_PAYLOAD_RAW (sampled exige N: 'sampled:100' ou 'sampled(1/100)')
+POLITICAS = ('off', 'on_error_only', 'sampled', 'full')
+
+_RE_SAMPLED = re.compile(r'^sampled(?::(\d+)|\(1/(\d+)\))$')
+
+
+def interpretar_politica(valor):
+    """
+    Converte a política configurada em (modo, N)
+
+    Args:
+        valor (str): 'off', 'on_error_only', 'sampled:N' / 'sampled(1/N)' ou 'full'
+
+    Returns:
+        tuple: (modo, N) — N só é usado por 'sampled'
+
+    Raises:
+        ValueError: Política desconhecida ou N inválido
+    """
+    valor = (valor or '').strip().lower()
+    if valor in POLITICAS and valor != 'sampled':
+        return valor, 1
+
+    encontrado = _RE_SAMPLED.match(valor)
+    if encontrado:
+        n = int(encontrado.group(1) or encontrado.group(2))
+        if n >= 1:
+            return 'sampled', n
+
+    raise ValueError(
+        f"Política de payload_raw inválida: {valor!r} "
+        f"(use off, on_error_only, sampled:N ou full)"
+    )
+
+
+# ==============================================================================
+# WRITER DE AUDITORIA
+# ==============================================================================
+
+class AuditoriaPayloadWriter:
+    """
+    Grava o payload original das mensagens em PayloadTelemetria, conforme a
+    política da conta
+
+    Política (settings.TELEMETRY_PAYLOAD_RAW, sobrescrita por conta em
+    settings.TELEMETRY_PAYLOAD_RAW_POR_CONTA = {conta_id: política}):
+        off            → nada é auditado
+        on_error_only  → mensagens rejeitadas ou com leituras ignoradas
+        sampled:N      → erros + 1 a cada N mensagens
+        full           → todas as mensagens
+
+    A hypertable não recebe mais payload_raw por leitura; a auditoria é uma
+    linha por mensagem com os bytes originais comprimidos (zlib). As linhas
+    ficam em memória e são gravadas a cada T s com um bulk_create
+    (ignore_conflicts: reentregas QoS 1 não duplicam). Sem a thread iniciada
+    registrar() grava na hora.
+
+    A auditoria é best-effort: erro de gravação é logado e o lote descartado.
+    """
+
+    def __init__(self, intervalo_s=None, politica=None, por_conta=None, nivel_zlib=None):
+        """
+        Args:
+            intervalo_s (float): Período de flush (TELEMETRY_PAYLOAD_AUDIT_FLUSH_S)
+            politica (str): Política global (TELEMETRY_PAYLOAD_RAW)
+            por_conta (dict): {conta_id: política} (TELEMETRY_PAYLOAD_RAW_POR_CONTA)
+            nivel_zlib (int): Nível de compressão 1-9 (TELEMETRY_PAYLOAD_AUDIT_ZLIB_LEVEL)
+        """
+        self.intervalo = intervalo_s or getattr(settings, 'TELEMETRY_PAYLOAD_AUDIT_FLUSH_S', 5)
+        self.nivel_zlib = nivel_zlib or getattr(settings, 'TELEMETRY_PAYLOAD_AUDIT_ZLIB_LEVEL', 6)
+        self.politica_global = interpretar_politica(
+            politica or getattr(settings, 'TELEMETRY_PAYLOAD_RAW', 'on_error_only')
+        )
+        por_conta = por_conta if por_conta is not None else getattr(settings, 'TELEMETRY_PAYLOAD_RAW_POR_CONTA', {})
+        self.politicas_conta = {int(conta_id): interpretar_politica(p) for conta_id, p in por_conta.items()}
+
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._pendentes = []
+        self._contador = itertools.count(1)  # amostragem sampled:N (next() é atômico no CPython)
+        self._thread = None
+
+        self._stats = {
+            'flushes': 0,
+            'gravados': 0,
+            'bytes_originais': 0,
+            'bytes_comprimidos': 0,
+            'descartados': 0,
+            'erros': 0,
+        }
+
+    # ==========================================================================
+    # CICLO DE VIDA
+    # ==========================================================================
+
+    def iniciar(self):
+        """Inicia a thread de flush periódico"""
+        if self._thread is not None:
+            return
+
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name='payload-audit-writer', daemon=True)
+        self._thread.start()
+        logger.info(
+            f"[AUDIT] Writer iniciado (política global={self._descrever(self.politica_global)}, "
+            f"{len(self.politicas_conta)} contas com política própria, flush a cada {self.intervalo}s)"
+        )
+
+    def parar(self, timeout=10):
+        """Encerra a thread após o flush final"""
+        if self._thread is None:
+            return
+
+        self._parar.set()
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info(f"[AUDIT] Writer encerrado: {self.estatisticas()}")
+
+    # ==========================================================================
+    # API
+    # ==========================================================================
+
+    def politica(self, conta_id):
+        """
+        Returns:
+            tuple: (modo, N) efetivo para a conta
+        """
+        return self.politicas_conta.get(conta_id, self.politica_global)
+
+    def registrar(self, gateway, dados, formato='json', timestamp=None, erro=None, leituras_ignoradas=0):
+        """
+        Audita a mensagem se a política da conta pedir
+
+        Args:
+            gateway (GatewayInfo): Gateway resolvido pelo topic (id, conta_id)
+            dados (bytes): Payload como recebido do broker
+            formato (str): 'json', 'cbor' ou 'msgpack'
+            timestamp (datetime): Timestamp da mensagem (None se não foi lido)
+            erro (str): Motivo da rejeição da mensagem
+            leituras_ignoradas (int): Leituras descartadas pelo service
+
+        Returns:
+            bool: True se a mensagem foi enfileirada para auditoria
+        """
+        modo, n = self.politica(gateway.conta_id)
+        if modo == 'off':
+            return False
+
+        if erro or leituras_ignoradas:
+            motivo = 'ERRO'
+            erro = erro or f"{leituras_ignoradas} leitura(s) ignorada(s)"
+        elif modo == 'full':
+            motivo = 'COMPLETO'
+        elif modo == 'sampled' and next(self._contador) % n == 0:
+            motivo = 'AMOSTRA'
+        else:
+            return False
+
+        from tds_new.models import PayloadTelemetria  # import tardio — evita ciclo models ↔ services
+
+        comprimido = PayloadTelemetria.comprimir(dados, self.nivel_zlib)
+        registro = PayloadTelemetria(
+            time=timestamp,
+            conta_id=gateway.conta_id,
+            gateway_id=gateway.id,
+            formato=formato,
+            motivo=motivo,
+            erro=erro or '',
+            tamanho_original=len(dados),
+            payload=comprimido,
+        )
+
+        with self._lock:
+            self._pendentes.append(registro)
+            self._stats['bytes_originais'] += len(dados)
+            self._stats['bytes_comprimidos'] += len(comprimido)
+
+        if self._thread is None:
+            self.flush()
+        return True
+
+    def estatisticas(self):
+        """
+        Returns:
+            dict: flushes, gravados, bytes originais/comprimidos, descartados, erros, pendentes
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pendentes'] = len(self._pendentes)
+        return stats
+
+    def flush(self):
+        """Grava os registros pendentes (um bulk_create)"""
+        from tds_new.models import PayloadTelemetria
+
+        with self._lock:
+            lote = self._pendentes
+            self._pendentes = []
+
+        if not lote:
+            return
+
+        try:
+            PayloadTelemetria.objects.bulk_create(lote, batch_size=500, ignore_conflicts=True)
+        except Exception as e:
+            with self._lock:
+                self._stats['erros'] += 1
+                self._stats['descartados'] += len(lote)
+            logger.exception(f"💥 [AUDIT] Erro ao gravar auditoria ({len(lote)} mensagens descartadas): {e}")
+            connection.close()
+            return
+
+        with self._lock:
+            self._stats['flushes'] += 1
+            self._stats['gravados'] += len(lote)
+
+    # ==========================================================================
+    # INTERNOS
+    # ==========================================================================
+
+    @staticmethod
+    def _descrever(politica):
+        modo, n = politica
+        return f"sampled:{n}" if modo == 'sampled' else modo
+
+    def _loop(self):
+        try:
+            while not self._parar.wait(self.intervalo):
+                self.flush()
+            self.flush()
+        finally:
+            connection.close()
+
+
+_auditoria = None
+
+
+def get_auditoria():
+    """Writer compartilhado do processo (criado no primeiro uso, após o setup do Django)"""
+    global _auditoria
+    if _auditoria is None:
+        _auditoria = AuditoriaPayloadWriter()
+    return _auditoria
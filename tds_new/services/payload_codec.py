@@ -0,0 +1,312 @@
+# ==============================================================================
+# TDS New - Payload Codec (Ingestão de Telemetria)
+# ==============================================================================
+# Arquivo: tds_new/services/payload_codec.py
+# Responsabilidade: Decodificar e validar o payload de telemetria no hot path
+#                   (JSON e formatos binários compactos CBOR/MessagePack)
+# ==============================================================================
+
+import json
+import logging
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache, partial
+from typing import Any
+
+from django.conf import settings
+from django.utils import timezone
+
+try:
+    import orjson
+except ImportError:  # requirements.txt; sem ele o backend cai para json
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # requirements.txt; sem ele o backend cai para orjson/json
+    msgspec = None
+
+try:
+    import cbor2
+except ImportError:  # dependência opcional (topic .../telemetry/cbor)
+    cbor2 = None
+
+try:
+    import msgpack
+except ImportError:  # dependência opcional (topic .../telemetry/msgpack)
+    msgpack = None
+
+logger = logging.getLogger('telemetry_service')
+
+# Contrato do payload (gateway_mac/timestamp/leituras[]), na ordem das mensagens de erro
+CAMPOS_PAYLOAD = ('gateway_mac', 'timestamp', 'leituras')
+CAMPOS_LEITURA = ('dispositivo_codigo', 'valor', 'unidade')
+
+_CAMPOS_PAYLOAD = frozenset(CAMPOS_PAYLOAD)
+_CAMPOS_LEITURA = frozenset(CAMPOS_LEITURA)
+
+BACKENDS = ('msgspec', 'orjson', 'json')
+
+# Sufixos de topic dos payloads compactos: tds_new/devices/<MAC>/telemetry/<formato>
+FORMATOS_COMPACTOS = ('cbor', 'msgpack')
+
+# ==============================================================================
+# SCHEMA TIPADO (msgspec)
+# ==============================================================================
+
+if msgspec is not None:
+    class _Schema(msgspec.Struct):
+        """Acesso por chave como no dict do json.loads (payload['leituras'])"""
+
+        def __getitem__(self, campo):
+            return getattr(self, campo)
+
+    # Campos sem tipo (Any): o schema exige a estrutura e a presença dos campos,
+    # como os backends orjson/json; valores ruins são tratados por item no service
+    class _LeituraSchema(_Schema):
+        dispositivo_codigo: Any
+        valor: Any
+        unidade: Any
+
+    class _TelemetriaSchema(_Schema):
+        gateway_mac: Any
+        timestamp: Any
+        leituras: list[_LeituraSchema]
+
+# ==============================================================================
+# CODEC
+# ==============================================================================
+
+class PayloadCodec:
+    """
+    Decoder + validador do payload de telemetria com backend plugável
+
+    Backends (TELEMETRY_JSON_DECODER; 'auto' = o mais rápido instalado):
+        msgspec → decode tipado em C: parse e validação da estrutura em uma
+                  passada, sem dict intermediário (structs com acesso por chave)
+        orjson  → decode em C + validação por checagens de conjunto
+        json    → stdlib (fallback, sempre disponível)
+
+    decodificar() devolve o dict do json.loads (status, payloads genéricos);
+    decodificar_telemetria() devolve o dict, ou o struct tipado com msgspec,
+    lido pelo service da mesma forma. Erros de JSON e de schema viram
+    ValueError com mensagem descritiva.
+    """
+
+    def __init__(self, backend=None):
+        """
+        Args:
+            backend (str): 'auto', 'msgspec', 'orjson' ou 'json'
+        """
+        backend = backend or getattr(settings, 'TELEMETRY_JSON_DECODER', 'auto')
+        if backend == 'auto':
+            backend = 'msgspec' if msgspec is not None else 'orjson' if orjson is not None else 'json'
+        if backend not in BACKENDS:
+            raise ValueError(f"Decoder JSON inválido: {backend} (use auto, {', '.join(BACKENDS)})")
+        if (backend == 'msgspec' and msgspec is None) or (backend == 'orjson' and orjson is None):
+            raise ValueError(f"Decoder JSON '{backend}' não instalado (pip install {backend})")
+
+        self.backend = backend
+        self._decoder_telemetria = None
+        if backend == 'msgspec':
+            self._loads = msgspec.json.Decoder().decode
+            self._decoder_telemetria = msgspec.json.Decoder(_TelemetriaSchema)
+        elif backend == 'orjson':
+            self._loads = orjson.loads
+        else:
+            self._loads = json.loads
+
+    def decodificar(self, dados):
+        """
+        Decodifica bytes/str JSON
+
+        Raises:
+            ValueError: JSON inválido (json.JSONDecodeError é subclasse)
+        """
+        try:
+            return self._loads(dados)
+        except ValueError:
+            raise
+        except Exception as e:  # msgspec.DecodeError não herda de ValueError
+            raise ValueError(f"JSON inválido: {e}") from e
+
+    def validar(self, payload):
+        """
+        Valida o contrato gateway_mac/timestamp/leituras[]
+
+        Raises:
+            ValueError: Primeiro erro de schema encontrado
+        """
+        if msgspec is not None and isinstance(payload, _TelemetriaSchema):
+            # Estrutura e campos já validados pelo decoder tipado
+            if not payload.leituras:
+                raise ValueError("Campo 'leituras' está vazio")
+            return
+
+        if not isinstance(payload, dict):
+            raise ValueError(f"Payload deve ser objeto JSON (recebido: {type(payload).__name__})")
+
+        if not _CAMPOS_PAYLOAD <= payload.keys():
+            raise ValueError(f"Campo obrigatório ausente: '{_primeiro_ausente(CAMPOS_PAYLOAD, payload)}'")
+
+        leituras = payload['leituras']
+        if not isinstance(leituras, list):
+            raise ValueError(f"Campo 'leituras' deve ser array (recebido: {type(leituras).__name__})")
+        if not leituras:
+            raise ValueError("Campo 'leituras' está vazio")
+
+        # Caminho rápido: todos os itens são objetos com os campos obrigatórios
+        for idx, item in enumerate(leituras):
+            if not isinstance(item, dict) or not _CAMPOS_LEITURA <= item.keys():
+                campo = _primeiro_ausente(CAMPOS_LEITURA, item if isinstance(item, dict) else {})
+                raise ValueError(f"Campo obrigatório ausente em leituras[{idx}]: '{campo}' (item: {item})")
+
+    def decodificar_telemetria(self, dados):
+        """
+        Decodifica e valida o payload de telemetria
+
+        Com msgspec o decoder tipado (_TelemetriaSchema) faz as duas coisas em
+        uma passada; nos demais backends é decodificar() + validar().
+
+        Returns:
+            dict | _TelemetriaSchema: Payload validado
+
+        Raises:
+            ValueError: JSON ou schema inválido
+        """
+        if self._decoder_telemetria is None:
+            payload = self.decodificar(dados)
+        else:
+            try:
+                payload = self._decoder_telemetria.decode(dados)
+            except msgspec.ValidationError as e:
+                raise ValueError(f"Schema inválido: {e}") from e
+            except msgspec.DecodeError as e:
+                raise ValueError(f"JSON inválido: {e}") from e
+        self.validar(payload)
+        return payload
+
+
+def _primeiro_ausente(campos, objeto):
+    return next(campo for campo in campos if campo not in objeto)
+
+
+@lru_cache(maxsize=4096)
+def parse_timestamp(timestamp_str):
+    """
+    Converte timestamp ISO 8601 para datetime timezone-aware
+
+    Python 3.11+ aceita o sufixo 'Z' direto no fromisoformat; o replace só
+    roda como fallback. Cacheado: gateways do mesmo ciclo enviam o mesmo
+    instante (datetime é imutável, seguro para compartilhar).
+
+    Raises:
+        ValueError: Se timestamp é inválido
+    """
+    try:
+        dt = datetime.fromisoformat(timestamp_str)
+    except ValueError:
+        dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
+# ==============================================================================
+# PAYLOAD COMPACTO (CBOR / MESSAGEPACK)
+# ==============================================================================
+
+@lru_cache(maxsize=None)
+def formatos_compactos_disponiveis():
+    """
+    Formatos compactos cuja biblioteca de decodificação está instalada
+
+    O consumer só assina .../telemetry/<formato> destes: sem decodificador a
+    mensagem seria confirmada como inválida e a leitura perdida; sem
+    subscription ela fica no broker (sessão durável) ou chega a outro consumer.
+    """
+    disponiveis = []
+    for formato in FORMATOS_COMPACTOS:
+        try:
+            _decodificador_compacto(formato)
+        except ValueError as e:
+            logger.warning(f"[CODEC] Topic .../telemetry/{formato} não assinado: {e}")
+        else:
+            disponiveis.append(formato)
+    return tuple(disponiveis)
+
+
+def _decodificador_compacto(formato):
+    """Função bytes → objeto do formato, ou ValueError se a lib não está instalada"""
+    if formato == 'cbor':
+        if cbor2 is None:
+            raise ValueError("Payload CBOR recebido, mas cbor2 não está instalado (pip install cbor2)")
+        return cbor2.loads
+    if formato == 'msgpack':
+        if msgpack is not None:
+            return partial(msgpack.unpackb, use_list=False)
+        if msgspec is not None:
+            return msgspec.msgpack.decode
+        raise ValueError("Payload MessagePack recebido, mas msgpack não está instalado (pip install msgpack)")
+    raise ValueError(f"Formato compacto desconhecido: {formato} (use {', '.join(FORMATOS_COMPACTOS)})")
+
+
+def decodificar_compacto(dados, formato):
+    """
+    Decodifica e valida o payload posicional dos topics .../telemetry/<formato>
+
+    Schema (o gateway vem do MAC no topic):
+        [ts_epoch, [[dispositivo_codigo, valor, unidade], ...]]
+
+    ts_epoch em segundos UTC (int ou float; CBOR também aceita a tag 1 de
+    data). As leituras são devolvidas como saem do decoder (listas/tuplas),
+    sem montar um dict por leitura.
+
+    Returns:
+        tuple: (datetime timezone-aware, sequência de [codigo, valor, unidade])
+
+    Raises:
+        ValueError: Payload, formato ou schema inválido
+    """
+    decodificar = _decodificador_compacto(formato)
+    try:
+        payload = decodificar(dados)
+    except Exception as e:  # erros próprios de cada lib (nem todos herdam de ValueError)
+        raise ValueError(f"Payload {formato} inválido: {e!r}") from e
+
+    if not isinstance(payload, (list, tuple)) or len(payload) != 2:
+        raise ValueError(f"Payload {formato} deve ser [ts_epoch, leituras] (recebido: {type(payload).__name__})")
+
+    ts, leituras = payload
+    if isinstance(ts, datetime):
+        timestamp = ts if timezone.is_aware(ts) else timezone.make_aware(ts)
+    elif isinstance(ts, (int, float)) and not isinstance(ts, bool):
+        try:
+            timestamp = datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError) as e:
+            raise ValueError(f"ts_epoch inválido: {ts} ({e})") from e
+    else:
+        raise ValueError(f"ts_epoch deve ser número (recebido: {type(ts).__name__})")
+
+    if not isinstance(leituras, (list, tuple)):
+        raise ValueError(f"Leituras devem ser array (recebido: {type(leituras).__name__})")
+    if not leituras:
+        raise ValueError("Array de leituras está vazio")
+
+    for idx, item in enumerate(leituras):
+        if not isinstance(item, (list, tuple)) or len(item) != 3 or not isinstance(item[0], str):
+            raise ValueError(f"leituras[{idx}] deve ser [dispositivo_codigo, valor, unidade] (item: {item})")
+
+    return timestamp, leituras
+
+
+_codec = None
+
+
+def get_codec():
+    """Codec compartilhado do processo (criado no primeiro uso, após o setup do Django)"""
+    global _codec
+    if _codec is None:
+        _codec = PayloadCodec()
+        logger.info(f"[CODEC] Decoder de payload: {_codec.backend}")
+    return _codec
@@ -0,0 +1,334 @@
+# ==============================================================================
+# TDS New - Roteador de Consultas (Séries de Telemetria)
+# ==============================================================================
+# Arquivo: tds_new/services/query_router.py
+# Responsabilidade: Escolher entre continuous aggregates e leituras brutas
+# ==============================================================================
+
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Origem dos buckets: a mesma do time_bucket() para intervalos menores que um
+# mês (segunda-feira 2000-01-03 UTC), de modo que date_bin() sobre as leituras
+# brutas e os buckets dos continuous aggregates coincidem
+ORIGEM = datetime(2000, 1, 3, tzinfo=dt_timezone.utc)
+
+# Buckets de N dias começam à meia-noite de TIME_ZONE, como o
+# time_bucket('1 day', time, 'America/Sao_Paulo') do agregado diário: a origem
+# é a mesma segunda-feira no relógio local e o bin é feito sobre a hora local
+# (dias de 23h/25h em mudança de horário de verão seguem o calendário)
+ORIGEM_LOCAL = datetime(2000, 1, 3)
+
+DIA = timedelta(days=1)
+
+FonteAgregada = namedtuple('FonteAgregada', ['view', 'largura'])
+
+# Um ponto da série: agregados do bucket (média = soma / contagem)
+PontoSerie = namedtuple('PontoSerie', ['bucket', 'dispositivo_id', 'soma', 'contagem', 'minimo', 'maximo'])
+
+# Resumo de um período (métricas do dashboard)
+ResumoPeriodo = namedtuple('ResumoPeriodo', ['total_leituras', 'dispositivos_ativos', 'ultima_leitura'])
+
+
+def alinhar(instante, largura):
+    """
+    Início do bucket que contém o instante (mesma regra do time_bucket)
+
+    Larguras múltiplas de 1 dia alinham à meia-noite local (TIME_ZONE);
+    as menores, à origem UTC.
+
+    Args:
+        instante (datetime): Instante aware
+        largura (timedelta): Largura do bucket
+
+    Returns:
+        datetime: Início do bucket
+    """
+    if largura % DIA:
+        return instante - (instante - ORIGEM) % largura
+    dia = timezone.localtime(instante).date()
+    return _meia_noite(dia - timedelta(days=(dia - ORIGEM_LOCAL.date()).days % largura.days))
+
+
+def buckets_periodo(inicio, fim, largura):
+    """
+    Inícios de todos os buckets de [inicio, fim), inclusive os sem leituras
+
+    Returns:
+        list[datetime]: Buckets em ordem crescente
+    """
+    bucket = alinhar(inicio, largura)
+    buckets = []
+    while bucket < fim:
+        buckets.append(bucket)
+        if largura % DIA:
+            bucket += largura
+        else:
+            bucket = _meia_noite(timezone.localtime(bucket).date() + largura)
+    return buckets
+
+
+def sql_bucket(coluna, largura):
+    """
+    Expressão SQL do bucket de uma coluna timestamptz (mesma regra de alinhar)
+
+    Returns:
+        tuple: (SQL com placeholders, parâmetros)
+    """
+    if largura % DIA:
+        return f"date_bin(%s, {coluna}, %s)", [largura, ORIGEM]
+    fuso = settings.TIME_ZONE
+    return f"(date_bin(%s, {coluna} AT TIME ZONE %s, %s) AT TIME ZONE %s)", [largura, fuso, ORIGEM_LOCAL, fuso]
+
+
+def _meia_noite(dia):
+    """
+    Meia-noite local (TIME_ZONE) do dia, em UTC: um instante no vão de uma
+    mudança de horário não seria igual (nem teria o mesmo hash) ao bucket
+    devolvido pelo banco
+    """
+    return timezone.make_aware(datetime.combine(dia, datetime.min.time())).astimezone(dt_timezone.utc)
+
+
+def densificar(pontos, buckets, valor=None):
+    """
+    Séries densas por dispositivo: um valor por bucket, None nos gaps
+
+    Junção em O(pontos + buckets) por um índice bucket → posição (equivale ao
+    time_bucket_gapfill, sem depender do TimescaleDB).
+
+    Args:
+        pontos (list[PontoSerie]): Saída de QueryRouter.consultar_serie
+        buckets (list[datetime]): Eixo do gráfico (buckets_periodo)
+        valor (callable): PontoSerie → valor do bucket (padrão: média)
+
+    Returns:
+        dict: {dispositivo_id: [valor | None, ...]} na ordem de buckets
+    """
+    valor = valor or (lambda ponto: ponto.soma / ponto.contagem)
+    posicao = {bucket: i for i, bucket in enumerate(buckets)}
+    series = {}
+
+    for ponto in pontos:
+        i = posicao.get(ponto.bucket)
+        if i is None:
+            continue
+        serie = series.get(ponto.dispositivo_id)
+        if serie is None:
+            serie = series[ponto.dispositivo_id] = [None] * len(buckets)
+        serie[i] = valor(ponto)
+
+    return series
+
+# ==============================================================================
+# ROTEADOR
+# ==============================================================================
+
+class QueryRouter:
+    """
+    Monta séries agregadas por (bucket, dispositivo) a partir da fonte mais
+    barata que atende o bucket pedido
+
+    Fontes, da mais grossa para a mais fina:
+        tds_new_consumo_diario  (1 dia, meia-noite de TIME_ZONE)
+        tds_new_consumo_horario (1 hora)
+        tds_new_leitura_dispositivo (leituras brutas)
+
+    Um agregado atende quando a largura do bucket pedido é múltipla da dele
+    (6h sai do horário, 1 dia ou 7 dias do diário, 15 min só das brutas).
+    ConsumoMensal fica de fora: meses têm largura variável e a view não tem
+    mínimo/máximo.
+
+    Os agregados são materialized_only; o trecho após a marca d'água (fim do
+    último bucket materializado) vem das leituras brutas, na mesma query
+    (UNION ALL reagrupado com date_bin). Sem os agregados no banco (ambiente
+    sem TimescaleDB ou views ainda não criadas) tudo vem das brutas.
+
+    A marca d'água é cacheada por TELEMETRY_ROUTER_WATERMARK_TTL_S: um valor
+    defasado só desloca mais buckets para a cauda bruta, nunca duplica nem
+    perde leituras.
+    """
+
+    FONTES = (
+        FonteAgregada('tds_new_consumo_diario', 86400),
+        FonteAgregada('tds_new_consumo_horario', 3600),
+    )
+
+    TABELA_BRUTA = 'tds_new_leitura_dispositivo'
+
+    def __init__(self, ttl=None):
+        """
+        Args:
+            ttl (int): Validade (segundos) da marca d'água cacheada de cada agregado
+        """
+        self.ttl = ttl if ttl is not None else getattr(settings, 'TELEMETRY_ROUTER_WATERMARK_TTL_S', 60)
+        self._lock = threading.Lock()
+        self._watermarks = {}  # view -> (expira_em, watermark | None)
+
+    # ==========================================================================
+    # API
+    # ==========================================================================
+
+    def escolher_fonte(self, largura):
+        """
+        Agregado mais grosso compatível com a largura pedida
+
+        Args:
+            largura (timedelta): Largura do bucket pedido
+
+        Returns:
+            tuple: (FonteAgregada, watermark) ou (None, None) para leituras brutas
+        """
+        segundos = largura.total_seconds()
+        for fonte in self.FONTES:
+            if segundos % fonte.largura:
+                continue
+            watermark = self.watermark(fonte)
+            if watermark is not None:
+                return fonte, watermark
+        return None, None
+
+    def consultar_serie(self, conta_id, inicio, largura, fim=None, dispositivo_ids=None):
+        """
+        Série agregada por (bucket, dispositivo) no período [inicio, fim)
+
+        Args:
+            conta_id (int): Conta (isolamento multi-tenant)
+            inicio (datetime): Início do período (alinhado ao bucket para baixo)
+            largura (timedelta): Largura do bucket
+            fim (datetime): Fim do período (padrão: agora)
+            dispositivo_ids (list): Restringe aos dispositivos (None/vazio = todos)
+
+        Returns:
+            list[PontoSerie]: Ordenada por (bucket, dispositivo_id)
+        """
+        origem, parametros, _ = self._origem(conta_id, inicio, largura, fim, dispositivo_ids)
+        if origem is None:
+            return []
+
+        bucket, parametros_bucket = sql_bucket('t', largura)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {bucket} AS bucket, dispositivo_id, "
+                f"SUM(soma), SUM(contagem), MIN(minimo), MAX(maximo) "
+                f"FROM {origem} GROUP BY 1, 2 ORDER BY 1, 2",
+                parametros_bucket + parametros
+            )
+            return [PontoSerie._make(linha) for linha in cursor.fetchall()]
+
+    def resumir(self, conta_id, inicio, fim=None, dispositivo_ids=None, largura=timedelta(hours=1)):
+        """
+        Resumo do período em uma única query: total de leituras, dispositivos
+        com leitura e instante da leitura mais recente
+
+        Total e dispositivos saem da mesma origem da série (agregado + cauda
+        bruta, período alinhado à largura); a última leitura é um MAX(time)
+        na hypertable (índice conta_id, time DESC).
+
+        Returns:
+            ResumoPeriodo
+        """
+        fim = fim or timezone.now()
+        origem, parametros, inicio = self._origem(conta_id, inicio, largura, fim, dispositivo_ids)
+        if origem is None:
+            return ResumoPeriodo(0, 0, None)
+
+        ids = [int(i) for i in dispositivo_ids] if dispositivo_ids else None
+        filtro = " AND dispositivo_id = ANY(%s)" if ids else ""
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COALESCE(SUM(contagem), 0), COUNT(DISTINCT dispositivo_id), "
+                f"(SELECT MAX(time) FROM {self.TABELA_BRUTA} "
+                f"WHERE conta_id = %s AND time >= %s AND time < %s{filtro}) "
+                f"FROM {origem}",
+                [conta_id, inicio, fim] + ([ids] if ids else []) + parametros
+            )
+            return ResumoPeriodo._make(cursor.fetchone())
+
+    def watermark(self, fonte):
+        """
+        Fim do último bucket materializado do agregado (cacheado por ttl)
+
+        Returns:
+            datetime | None: None se a view não existe ou está vazia
+        """
+        agora = time.monotonic()
+        with self._lock:
+            cacheado = self._watermarks.get(fonte.view)
+        if cacheado and cacheado[0] > agora:
+            return cacheado[1]
+
+        watermark = None
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [fonte.view])
+            if cursor.fetchone()[0]:
+                cursor.execute(
+                    f"SELECT MAX(bucket) + make_interval(secs => %s) FROM {fonte.view}",
+                    [fonte.largura]
+                )
+                watermark = cursor.fetchone()[0]
+
+        with self._lock:
+            self._watermarks[fonte.view] = (agora + self.ttl, watermark)
+        return watermark
+
+    def invalidar(self):
+        """Descarta as marcas d'água cacheadas (ex.: após refresh manual)"""
+        with self._lock:
+            self._watermarks.clear()
+
+    # ==========================================================================
+    # INTERNOS
+    # ==========================================================================
+
+    def _origem(self, conta_id, inicio, largura, fim, dispositivo_ids):
+        """
+        Subquery (t, dispositivo_id, soma, contagem, minimo, maximo) do período:
+        agregado até a marca d'água + leituras brutas depois dela
+
+        Returns:
+            tuple: (SQL "(... UNION ALL ...) AS s" | None, parâmetros, inicio alinhado)
+        """
+        fim = fim or timezone.now()
+        inicio = alinhar(inicio, largura)
+        ids = [int(i) for i in dispositivo_ids] if dispositivo_ids else None
+        filtro = " AND dispositivo_id = ANY(%s)" if ids else ""
+
+        fonte, watermark = self.escolher_fonte(largura)
+        corte = min(max(watermark, inicio), fim) if fonte else inicio
+
+        partes, parametros = [], []
+        if corte > inicio:
+            partes.append(
+                f"SELECT bucket AS t, dispositivo_id, soma, contagem, minimo, maximo "
+                f"FROM {fonte.view} WHERE conta_id = %s AND bucket >= %s AND bucket < %s{filtro}"
+            )
+            parametros += [conta_id, inicio, corte] + ([ids] if ids else [])
+        if fim > corte:
+            partes.append(
+                f"SELECT time AS t, dispositivo_id, valor AS soma, 1 AS contagem, valor AS minimo, valor AS maximo "
+                f"FROM {self.TABELA_BRUTA} WHERE conta_id = %s AND time >= %s AND time < %s{filtro}"
+            )
+            parametros += [conta_id, corte, fim] + ([ids] if ids else [])
+
+        if not partes:
+            return None, [], inicio
+
+        logger.debug(
+            f"[ROUTER] conta={conta_id} bucket={largura} fonte={fonte.view if fonte else 'bruta'} "
+            f"agregado=[{inicio}, {corte}) bruto=[{corte}, {fim})"
+        )
+        return f"({' UNION ALL '.join(partes)}) AS s", parametros, inicio
+
+
+query_router = QueryRouter()
@@ -6,13 +6,25 @@
 # ==============================================================================
 
 from decimal import Decimal, InvalidOperation
-from django.db import transaction
-from django.utils import timezone
+from django.conf import settings
 from tds_new.models import Gateway, Dispositivo, LeituraDispositivo
+from tds_new.services.dedup_filter import filtro_leituras
+from tds_new.services.latest_cache import cache_ultimas
+from tds_new.services.live_feed import publicar_leituras
+from tds_new.services.liveness import gateway_liveness
+from tds_new.services.lookup_cache import dispositivo_cache
+from tds_new.services.payload_codec import get_codec, parse_timestamp
 import logging
 
 logger = logging.getLogger('telemetry_service')
 
+# Limites das colunas da hypertable (valor NUMERIC(15,4), unidade VARCHAR(10)):
+# uma linha fora deles faria o COPY do lote inteiro falhar
+_CAMPO_VALOR = LeituraDispositivo._meta.get_field('valor')
+VALOR_LIMITE = Decimal(10) ** (_CAMPO_VALOR.max_digits - _CAMPO_VALOR.decimal_places)
+VALOR_PASSO = Decimal(1).scaleb(-_CAMPO_VALOR.decimal_places)
+UNIDADE_MAX = LeituraDispositivo._meta.get_field('unidade').max_length
+
 # ==============================================================================
 # SERVIÇO DE PROCESSAMENTO DE TELEMETRIA
 # ==============================================================================
@@ -23,11 +35,17 @@ class TelemetryProcessorService:
     
     Responsabilidades:
     - Validar schema JSON do payload
-    - Lookup de dispositivos por código
-    - Converter valores para Decimal (precisão financeira)
-    - Bulk insert em LeituraDispositivo (performance)
-    - Atualizar estado do gateway (last_seen, is_online)
-    - Registrar auditoria de processamento
+    - Lookup de dispositivos por código (cache por gateway, 0-1 query por payload)
+    - Converter valores para Decimal (precisão financeira) e descartar leituras
+      que não cabem nas colunas (valor NUMERIC(15,4), unidade até 10 caracteres)
+    - Bulk insert em LeituraDispositivo via COPY FROM STDIN (performance)
+    - Idempotência em (dispositivo_id, time): filtro LRU de chaves recentes +
+      ON CONFLICT DO NOTHING (reentregas QoS 1 não duplicam leituras)
+    - Opcional: enfileirar no LeituraBatchWriter (um commit para várias mensagens)
+    - Atualizar estado do gateway (last_seen, is_online) via GatewayLivenessWriter
+      (UPDATE coalescido a cada poucos segundos, sem Gateway.save())
+    - payload_raw não é mais gravado por leitura: a auditoria da mensagem
+      inteira fica a cargo do consumer (payload_audit, política por conta)
     
     Schema esperado do payload:
     {
@@ -42,31 +60,46 @@ class TelemetryProcessorService:
             ...
         ]
     }
+    
+    Payload compacto (topics .../telemetry/cbor e .../telemetry/msgpack,
+    decodificado por payload_codec.decodificar_compacto):
+        [ts_epoch, [["D01", 123.45, "kWh"], ...]]
     """
     
-    def __init__(self, conta_id, gateway):
+    def __init__(self, conta_id, gateway, writer=None):
         """
         Inicializa o serviço
         
         Args:
             conta_id (int): ID da conta (multi-tenant)
-            gateway (Gateway): Instância do gateway que enviou telemetria
+            gateway (Gateway | GatewayInfo): Gateway que enviou telemetria
+                (basta expor id e codigo; o consumer passa o GatewayInfo do cache)
+            writer (LeituraBatchWriter): Se informado, as leituras são enfileiradas
+                para gravação em lote em vez de commit imediato
         """
         self.conta_id = conta_id
         self.gateway = gateway
+        self.writer = writer
     
-    def processar_telemetria(self, payload):
+    def processar_telemetria(self, payload, ack=None):
         """
         Processa payload JSON de telemetria e persiste no banco
         
         Args:
-            payload (dict): Payload JSON da mensagem MQTT
+            payload (dict): Payload JSON da mensagem MQTT (dict ou struct tipado
+                de PayloadCodec.decodificar_telemetria, ambos com acesso por chave)
+            ack (callable): Confirmação MQTT repassada ao writer, chamada após o
+                commit do lote (apenas com writer; sem writer o commit já
+                ocorreu quando este método retorna)
         
         Returns:
             dict: Resultado do processamento
                 {
                     'sucesso': True,
                     'leituras_criadas': int,
+                    'leituras_ignoradas': int,
+                    'leituras_duplicadas': int,  # filtro LRU (+ ON CONFLICT se inline)
+                    'enfileirado': bool,  # True = gravação pendente no writer
                     'timestamp': datetime
                 }
         
@@ -84,18 +117,58 @@ class TelemetryProcessorService:
         except Exception as e:
             raise ValueError(f"Timestamp inválido: {e}")
         
-        # Preparar objetos LeituraDispositivo para bulk_create
-        leituras_data = payload.get('leituras', [])
+        leituras = payload['leituras']
+        return self._processar_leituras(
+            timestamp,
+            ((item['dispositivo_codigo'], item['valor'], item['unidade']) for item in leituras),
+            len(leituras),
+            ack=ack
+        )
+    
+    def processar_telemetria_compacta(self, timestamp, leituras, ack=None):
+        """
+        Processa payload compacto (CBOR/MessagePack) já decodificado
+        
+        As leituras posicionais [codigo, valor, unidade] vão direto para os
+        objetos LeituraDispositivo.
+        
+        Args:
+            timestamp (datetime): Instante da leitura (ts_epoch já convertido)
+            leituras (sequence): [[dispositivo_codigo, valor, unidade], ...]
+            ack (callable): Ver processar_telemetria()
+        
+        Returns:
+            dict: Mesmo formato de processar_telemetria()
+        """
+        return self._processar_leituras(
+            timestamp,
+            (item[:3] for item in leituras),
+            len(leituras),
+            ack=ack
+        )
+    
+    def _processar_leituras(self, timestamp, itens, total, ack=None):
+        """
+        Núcleo comum dos formatos JSON e compacto
+        
+        Args:
+            timestamp (datetime): Instante das leituras
+            itens (iterable): Tuplas (dispositivo_codigo, valor, unidade)
+            total (int): Quantidade de leituras no payload (para log)
+            ack (callable): Confirmação MQTT (ver processar_telemetria())
+        """
         leituras_objetos = []
         leituras_ignoradas = 0
+        leituras_duplicadas = 0
+        dispositivos_vistos = set()
         
-        for item in leituras_data:
+        for codigo, valor_bruto, unidade in itens:
             # Lookup de Dispositivo (validar que pertence ao gateway)
             try:
-                dispositivo = self._buscar_dispositivo(item['dispositivo_codigo'])
+                dispositivo_id = self._buscar_dispositivo(codigo)
             except Dispositivo.DoesNotExist:
                 logger.warning(
-                    f"⚠️ Dispositivo não encontrado: {item['dispositivo_codigo']} "
+                    f"⚠️ Dispositivo não encontrado: {codigo} "
                     f"(gateway={self.gateway.codigo})"
                 )
                 leituras_ignoradas += 1
@@ -105,13 +178,24 @@ class TelemetryProcessorService:
                 leituras_ignoradas += 1
                 continue
             
+            dispositivos_vistos.add(dispositivo_id)
+            
             # Converter valor para Decimal (precisão financeira)
             try:
-                valor = Decimal(str(item['valor']))
+                valor = Decimal(str(valor_bruto))
             except (InvalidOperation, ValueError) as e:
                 logger.warning(
-                    f"⚠️ Valor inválido ignorado: {item['valor']} "
-                    f"(dispositivo={item['dispositivo_codigo']})"
+                    f"⚠️ Valor inválido ignorado: {valor_bruto} "
+                    f"(dispositivo={codigo})"
+                )
+                leituras_ignoradas += 1
+                continue
+            
+            # Validar que o valor cabe na coluna (NaN/Infinity, estouro após arredondar)
+            if not valor.is_finite() or abs(valor) >= VALOR_LIMITE or abs(valor.quantize(VALOR_PASSO)) >= VALOR_LIMITE:
+                logger.warning(
+                    f"⚠️ Valor fora do intervalo ignorado: {valor_bruto} "
+                    f"(dispositivo={codigo})"
                 )
                 leituras_ignoradas += 1
                 continue
@@ -120,49 +204,67 @@ class TelemetryProcessorService:
             if valor < 0:
                 logger.warning(
                     f"⚠️ Valor negativo ignorado: {valor} "
-                    f"(dispositivo={item['dispositivo_codigo']})"
+                    f"(dispositivo={codigo})"
+                )
+                leituras_ignoradas += 1
+                continue
+            
+            # Validar unidade (texto de até UNIDADE_MAX caracteres)
+            unidade = unidade or 'unit'
+            if not isinstance(unidade, str) or len(unidade) > UNIDADE_MAX:
+                logger.warning(
+                    f"⚠️ Unidade inválida ignorada: {unidade!r:.40} "
+                    f"(dispositivo={codigo})"
                 )
                 leituras_ignoradas += 1
                 continue
             
+            # Reentrega de leitura já gravada: descarta antes do banco
+            if filtro_leituras.contem(dispositivo_id, timestamp):
+                leituras_duplicadas += 1
+                continue
+            
             # Criar objeto LeituraDispositivo (ainda não salvo no banco)
             leitura = LeituraDispositivo(
                 time=timestamp,
                 conta_id=self.conta_id,
-                gateway=self.gateway,
-                dispositivo=dispositivo,
+                gateway_id=self.gateway.id,
+                dispositivo_id=dispositivo_id,
                 valor=valor,
-                unidade=item.get('unidade', 'unit'),
-                payload_raw=item  # Guardar JSON original para auditoria
+                unidade=unidade
             )
             leituras_objetos.append(leitura)
         
+        # Gateway e dispositivos vivos: last_seen vai no próximo flush do liveness writer
+        gateway_liveness.registrar(self.gateway.id, dispositivos_vistos)
+        
         # Validar se há leituras válidas para processar
         if not leituras_objetos:
-            logger.warning(
-                f"⚠️ Nenhuma leitura válida encontrada no payload "
-                f"(gateway={self.gateway.codigo}, total={len(leituras_data)}, ignoradas={leituras_ignoradas})"
-            )
+            if leituras_duplicadas:
+                logger.debug(
+                    f"[DEDUP] Payload reentregue descartado "
+                    f"(gateway={self.gateway.codigo}, duplicadas={leituras_duplicadas})"
+                )
+            else:
+                logger.warning(
+                    f"⚠️ Nenhuma leitura válida encontrada no payload "
+                    f"(gateway={self.gateway.codigo}, total={total}, ignoradas={leituras_ignoradas})"
+                )
             return {
-                'sucesso': False,
+                'sucesso': leituras_duplicadas > 0,
                 'leituras_criadas': 0,
                 'leituras_ignoradas': leituras_ignoradas,
+                'leituras_duplicadas': leituras_duplicadas,
+                'enfileirado': False,
                 'timestamp': timestamp
             }
         
-        # Transação atômica: bulk_create + update Gateway
-        try:
-            with transaction.atomic():
-                # Bulk insert em hypertable TimescaleDB (performance)
-                LeituraDispositivo.objects.bulk_create(leituras_objetos)
-                
-                # Atualizar estado do gateway
-                self.gateway.last_seen = timezone.now()
-                self.gateway.is_online = True
-                self.gateway.save(update_fields=['last_seen', 'is_online'])
+        # Micro-batching: o writer grava leituras de várias mensagens em um único commit
+        if self.writer is not None:
+            self.writer.adicionar(leituras_objetos, ack=ack)
             
-            logger.info(
-                f"✅ Persistência concluída: {len(leituras_objetos)} leituras criadas "
+            logger.debug(
+                f"[BATCH] {len(leituras_objetos)} leituras enfileiradas "
                 f"(gateway={self.gateway.codigo}, ignoradas={leituras_ignoradas})"
             )
             
@@ -170,6 +272,38 @@ class TelemetryProcessorService:
                 'sucesso': True,
                 'leituras_criadas': len(leituras_objetos),
                 'leituras_ignoradas': leituras_ignoradas,
+                'leituras_duplicadas': leituras_duplicadas,
+                'enfileirado': True,
+                'timestamp': timestamp
+            }
+        
+        # Bulk insert em hypertable TimescaleDB (COPY FROM STDIN, transação própria)
+        try:
+            chaves_inseridas = LeituraDispositivo.copy_bulk(
+                leituras_objetos,
+                formato=getattr(settings, 'TELEMETRY_COPY_FORMAT', 'text'),
+                ignorar_duplicadas=getattr(settings, 'TELEMETRY_DEDUP_ON_CONFLICT', True),
+                retornar_inseridas=True
+            )
+            inseridas = len(chaves_inseridas)
+            
+            filtro_leituras.registrar(leituras_objetos)
+            cache_ultimas.registrar(leituras_objetos)
+            publicar_leituras(leituras_objetos, chaves_inseridas)
+            leituras_duplicadas += len(leituras_objetos) - inseridas
+            
+            logger.info(
+                f"✅ Persistência concluída: {inseridas} leituras criadas "
+                f"(gateway={self.gateway.codigo}, ignoradas={leituras_ignoradas}, "
+                f"duplicadas={leituras_duplicadas})"
+            )
+            
+            return {
+                'sucesso': True,
+                'leituras_criadas': inseridas,
+                'leituras_ignoradas': leituras_ignoradas,
+                'leituras_duplicadas': leituras_duplicadas,
+                'enfileirado': False,
                 'timestamp': timestamp
             }
         
@@ -186,7 +320,7 @@ class TelemetryProcessorService:
     
     def _validar_schema(self, payload):
         """
-        Valida schema básico do payload JSON
+        Valida schema básico do payload JSON (validador compilado do PayloadCodec)
         
         Args:
             payload (dict): Payload a validar
@@ -194,36 +328,12 @@ class TelemetryProcessorService:
         Returns:
             bool: True se válido, False caso contrário
         """
-        # Campos obrigatórios no root
-        campos_obrigatorios = ['gateway_mac', 'timestamp', 'leituras']
-        
-        for campo in campos_obrigatorios:
-            if campo not in payload:
-                logger.error(f"❌ Campo obrigatório ausente: '{campo}'")
-                return False
-        
-        # Validar que 'leituras' é uma lista
-        if not isinstance(payload['leituras'], list):
-            logger.error(f"❌ Campo 'leituras' deve ser array (recebido: {type(payload['leituras']).__name__})")
-            return False
-        
-        # Validar que 'leituras' não está vazio
-        if len(payload['leituras']) == 0:
-            logger.error("❌ Campo 'leituras' está vazio")
+        try:
+            get_codec().validar(payload)
+        except ValueError as e:
+            logger.error(f"❌ {e}")
             return False
         
-        # Validar schema de cada item de leitura
-        for idx, item in enumerate(payload['leituras']):
-            campos_item = ['dispositivo_codigo', 'valor', 'unidade']
-            
-            for campo in campos_item:
-                if campo not in item:
-                    logger.error(
-                        f"❌ Campo obrigatório ausente em leituras[{idx}]: '{campo}' "
-                        f"(item: {item})"
-                    )
-                    return False
-        
         return True
     
     def _parse_timestamp(self, timestamp_str):
@@ -244,18 +354,7 @@ class TelemetryProcessorService:
             ValueError: Se timestamp é inválido
         """
         try:
-            # Substituir 'Z' por '+00:00' (ISO 8601 compliant)
-            timestamp_str = timestamp_str.replace('Z', '+00:00')
-            
-            # Parse com timezone
-            dt = timezone.datetime.fromisoformat(timestamp_str)
-            
-            # Garantir que é timezone-aware
-            if timezone.is_naive(dt):
-                dt = timezone.make_aware(dt)
-            
-            return dt
-        
+            return parse_timestamp(timestamp_str)
         except Exception as e:
             raise ValueError(f"Formato de timestamp inválido: {timestamp_str} ({e})")
     
@@ -263,25 +362,24 @@ class TelemetryProcessorService:
         """
         Busca dispositivo por código, validando que pertence ao gateway
         
+        Usa DispositivoLookupCache: o primeiro lookup de um gateway carrega
+        todos os seus dispositivos em uma query; os demais saem do cache.
+        
         Args:
             dispositivo_codigo (str): Código do dispositivo (ex: "D01")
         
         Returns:
-            Dispositivo: Instância do dispositivo
+            int: ID do dispositivo
         
         Raises:
             Dispositivo.DoesNotExist: Se dispositivo não existe ou não pertence ao gateway
         """
-        try:
-            dispositivo = Dispositivo.objects.get(
-                gateway=self.gateway,
-                codigo=dispositivo_codigo
-            )
-            return dispositivo
+        dispositivo_id = dispositivo_cache.buscar(self.gateway.id, dispositivo_codigo)
         
-        except Dispositivo.DoesNotExist:
-            # Re-raise com mensagem específica
+        if dispositivo_id is None:
             raise Dispositivo.DoesNotExist(
                 f"Dispositivo '{dispositivo_codigo}' não encontrado para gateway "
-                f"'{self.gateway.codigo}' (conta={self.gateway.conta.nome})"
+                f"'{self.gateway.codigo}' (conta_id={self.conta_id})"
             )
+        
+        return dispositivo_id
@@ -0,0 +1,52 @@
+"""
+Signals do TDS New
+
+Mantém os caches process-local de ingestão coerentes com o cadastro:
+- Dispositivo post_save/post_delete → invalida DispositivoLookupCache
+- Gateway post_save/post_delete → invalida GatewayLookupCache (+ dispositivos do gateway)
+
+A invalidação é aplicada no processo local imediatamente e, após o commit,
+publicada no canal Redis para os demais processos (consumer MQTT).
+
+Após o commit, ambos também avançam a versão do cadastro da conta
+(UltimasLeiturasCache.registrar_cadastro), que entra no ETag das APIs do
+dashboard: nome, código ou tipo alterados não ficam presos em respostas 304.
+
+Registrados em TdsNewConfig.ready().
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from tds_new.models import Dispositivo, Gateway
+from tds_new.services.latest_cache import cache_ultimas
+from tds_new.services.lookup_cache import aplicar_invalidacao, publicar_invalidacao
+
+
+@receiver(post_save, sender=Dispositivo, dispatch_uid='tds_new_dispositivo_cache_save')
+@receiver(post_delete, sender=Dispositivo, dispatch_uid='tds_new_dispositivo_cache_delete')
+def invalidar_cache_dispositivo(sender, instance, **kwargs):
+    """Invalida o mapa do gateway do dispositivo (e de um eventual gateway anterior)"""
+    mensagem = {
+        'tipo': 'dispositivo',
+        'gateway_id': instance.gateway_id,
+        'dispositivo_id': instance.pk,
+    }
+    aplicar_invalidacao(mensagem)
+    transaction.on_commit(lambda: publicar_invalidacao(**mensagem))
+    transaction.on_commit(lambda: cache_ultimas.registrar_cadastro(instance.conta_id))
+
+
+@receiver(post_save, sender=Gateway, dispatch_uid='tds_new_gateway_cache_save')
+@receiver(post_delete, sender=Gateway, dispatch_uid='tds_new_gateway_cache_delete')
+def invalidar_cache_gateway(sender, instance, **kwargs):
+    """Invalida a resolução MAC → gateway (inclusive entradas negativas do MAC)"""
+    mensagem = {
+        'tipo': 'gateway',
+        'gateway_id': instance.pk,
+        'mac': instance.mac,
+    }
+    aplicar_invalidacao(mensagem)
+    transaction.on_commit(lambda: publicar_invalidacao(**mensagem))
+    transaction.on_commit(lambda: cache_ultimas.registrar_cadastro(instance.conta_id))
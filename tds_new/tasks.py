@@ -1,11 +1,13 @@
 """
 Tasks Celery — TDS New
 
-Tasks periódicas para gestão do ciclo de vida de certificados X.509.
+Tasks periódicas para gestão do ciclo de vida de certificados X.509
+e detecção de gateways/dispositivos offline.
 
 Schedulers registrados em settings.CELERY_BEAT_SCHEDULE:
   agendar_renovacoes          → diário às 02:00 UTC
   alertar_renovacoes_pendentes → a cada hora
+  marcar_offline              → a cada minuto
 
 Nota OTA:
   A renovação efetiva do certificado requer que o firmware ESP32 solicite
@@ -126,3 +128,31 @@ def alertar_renovacoes_pendentes_task(self):
     )
 
     return {'pendentes': total}
+
+
+@shared_task(bind=True, name='tds_new.marcar_offline')
+def marcar_offline_task(self):
+    """
+    Marca offline gateways/dispositivos com last_seen fora da janela.
+
+    Fallback: o caminho oficial é o OfflineSweeper do consumer MQTT
+    (min-heap, O(vencidos)). Com o heartbeat do sweeper no cache a task não
+    varre a tabela, exceto a reconciliação a cada
+    TELEMETRY_OFFLINE_RECONCILIACAO_S. Sem consumer no ar, a varredura
+    completa roda a cada execução.
+    Janelas: settings.TELEMETRY_OFFLINE_GATEWAY_S / TELEMETRY_OFFLINE_DISPOSITIVO_S.
+
+    Scheduled: a cada minuto (ver settings.CELERY_BEAT_SCHEDULE)
+    """
+    from tds_new.services.liveness import marcar_offline_expirados  # import tardio
+
+    resultado = marcar_offline_expirados()
+
+    if resultado['gateways'] or resultado['dispositivos']:
+        logger.info(
+            "[Task:marcar_offline] %d gateway(s) e %d dispositivo(s) marcados offline.",
+            resultado['gateways'],
+            resultado['dispositivos'],
+        )
+
+    return resultado
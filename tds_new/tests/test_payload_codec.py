@@ -0,0 +1,80 @@
+# ==============================================================================
+# TDS New - Testes: Payload Codec
+# ==============================================================================
+# Arquivo: tds_new/tests/test_payload_codec.py
+# Responsabilidade: Mesmos payloads aceitos/recusados em todos os backends JSON
+# ==============================================================================
+
+import json
+
+from django.test import SimpleTestCase
+
+from tds_new.services import payload_codec
+from tds_new.services.payload_codec import BACKENDS, CAMPOS_LEITURA, PayloadCodec
+
+
+def _leitura(**campos):
+    return {'dispositivo_codigo': 'D01', 'valor': 12.5, 'unidade': 'kWh', **campos}
+
+
+def _payload(**campos):
+    return {'gateway_mac': 'aa:bb:cc:00:00:01', 'timestamp': '2026-02-18T14:30:00Z', 'leituras': [_leitura()], **campos}
+
+
+# Estrutura válida: valores ruins por item ficam para o service (_processar_leituras)
+ACEITOS = {
+    'padrao': _payload(),
+    'codigo numerico': _payload(leituras=[_leitura(dispositivo_codigo=7), _leitura()]),
+    'unidade nula': _payload(leituras=[_leitura(unidade=None)]),
+    'valor texto': _payload(leituras=[_leitura(valor='12,5')]),
+    'timestamp numerico': _payload(timestamp=1771425000),
+    'campos extras': _payload(firmware='1.2', leituras=[_leitura(rssi=-70)]),
+}
+
+RECUSADOS = {
+    'json invalido': b'{"gateway_mac": ',
+    'array': [],
+    'sem leituras': {'gateway_mac': 'aa:bb:cc:00:00:01', 'timestamp': '2026-02-18T14:30:00Z'},
+    'sem timestamp': {'gateway_mac': 'aa:bb:cc:00:00:01', 'leituras': [_leitura()]},
+    'leituras vazia': _payload(leituras=[]),
+    'leituras nao array': _payload(leituras='D01'),
+    'item nao objeto': _payload(leituras=[3]),
+    'item sem unidade': _payload(leituras=[{'dispositivo_codigo': 'D01', 'valor': 1}]),
+}
+
+
+def _codecs():
+    """Backends instalados (msgspec/orjson são opcionais no import)"""
+    instalados = {'msgspec': payload_codec.msgspec, 'orjson': payload_codec.orjson, 'json': json}
+    return [PayloadCodec(backend) for backend in BACKENDS if instalados[backend] is not None]
+
+
+def _contrato(payload):
+    """Campos do contrato, lidos por chave (dict ou struct do msgspec)"""
+    return (
+        payload['gateway_mac'],
+        payload['timestamp'],
+        [tuple(item[campo] for campo in CAMPOS_LEITURA) for item in payload['leituras']],
+    )
+
+
+def _bytes(fixture):
+    return fixture if isinstance(fixture, bytes) else json.dumps(fixture).encode()
+
+
+class PayloadCodecBackendsTest(SimpleTestCase):
+    """A aceitação do payload não pode depender da biblioteca instalada"""
+
+    def test_mesmos_payloads_aceitos(self):
+        for nome, fixture in ACEITOS.items():
+            for codec in _codecs():
+                with self.subTest(payload=nome, backend=codec.backend):
+                    payload = codec.decodificar_telemetria(_bytes(fixture))
+                    self.assertEqual(_contrato(payload), _contrato(fixture))
+
+    def test_mesmos_payloads_recusados(self):
+        for nome, fixture in RECUSADOS.items():
+            for codec in _codecs():
+                with self.subTest(payload=nome, backend=codec.backend):
+                    with self.assertRaises(ValueError):
+                        codec.decodificar_telemetria(_bytes(fixture))
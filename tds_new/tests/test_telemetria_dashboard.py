@@ -0,0 +1,126 @@
+# ==============================================================================
+# TDS New - Testes: Dashboard de Telemetria
+# ==============================================================================
+# Arquivo: tds_new/tests/test_telemetria_dashboard.py
+# Responsabilidade: Número de queries do dashboard com resumo frio e memoizado
+# ==============================================================================
+
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import caches
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from tds_new.models import Conta, Dispositivo, Gateway, LeituraDispositivo
+from tds_new.services.query_router import query_router
+from tds_new.views import telemetria
+
+CACHE_LOCAL = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tds_new_tests',
+    }
+}
+
+
+@override_settings(CACHES=CACHE_LOCAL, TELEMETRY_RESUMO_TTL_S=60)
+class TelemetriaDashboardQueriesTest(TestCase):
+    """
+    Queries de telemetria_dashboard com o resumo fora e dentro do cache
+
+    render() é substituído para contar só as queries da view (context
+    processors e template ficam de fora). O cache é LocMem: com o
+    DatabaseCache cada get/set também seria uma query.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Hypertable é managed=False (criada por scripts/setup_timescaledb.sql);
+        # a transação da classe desfaz o CREATE TABLE no fim
+        with connection.schema_editor() as editor:
+            editor.create_model(LeituraDispositivo)
+
+        cls.usuario = get_user_model().objects.create_user(email='dashboard@teste.com')
+        cls.conta = Conta.objects.create(name='Conta Dashboard')
+        gateway = Gateway.objects.create(
+            conta=cls.conta, codigo='GW-DASH', mac='aa:bb:cc:00:00:01', nome='Gateway Dashboard'
+        )
+        dispositivos = [
+            Dispositivo.objects.create(
+                conta=cls.conta, gateway=gateway, codigo=f'D0{i}', nome=f'Dispositivo {i}', tipo='SENSOR'
+            )
+            for i in (1, 2)
+        ]
+
+        agora = timezone.now()
+        LeituraDispositivo.objects.bulk_create([
+            LeituraDispositivo(
+                time=agora - timedelta(minutes=10 * i),
+                conta=cls.conta,
+                gateway=gateway,
+                dispositivo=dispositivos[i % 2],
+                valor=Decimal(i),
+                unidade='kWh'
+            )
+            for i in range(1, 31)
+        ])
+
+    def setUp(self):
+        caches['default'].clear()
+        query_router.invalidar()
+
+        self.contexto = {}
+        patcher = mock.patch.object(telemetria, 'render', self._render)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _render(self, request, template, contexto=None):
+        self.contexto = contexto or {}
+        return HttpResponse()
+
+    def _dashboard(self, **params):
+        request = RequestFactory().get('/tds_new/telemetria/', {'periodo': '24h', **params})
+        request.user = self.usuario
+        request.session = SessionStore()
+        request.session['conta_ativa_id'] = self.conta.id
+        return telemetria.telemetria_dashboard(request)
+
+    def test_cache_frio(self):
+        # watermark do agregado, resumo (1 query), gateways online,
+        # últimas leituras (hypertable) e dispositivos do filtro
+        with self.assertNumQueries(5):
+            self._dashboard()
+
+        self.assertEqual(self.contexto['total_leituras'], 30)
+        self.assertEqual(self.contexto['dispositivos_ativos'], 2)
+        self.assertEqual(len(self.contexto['ultimas_leituras']), 10)
+
+    def test_cache_quente(self):
+        self._dashboard()
+        esperado = {k: self.contexto[k] for k in ('total_leituras', 'dispositivos_ativos', 'gateways_online')}
+
+        # Resumo memoizado: só últimas leituras e dispositivos do filtro
+        with self.assertNumQueries(2):
+            self._dashboard()
+
+        self.assertEqual(
+            {k: self.contexto[k] for k in esperado},
+            esperado
+        )
+
+    def test_filtro_de_dispositivos_tem_chave_propria(self):
+        self._dashboard()
+        dispositivo_id = Dispositivo.objects.filter(conta=self.conta, codigo='D01').values_list('id', flat=True).get()
+
+        # Outro filtro não reaproveita o resumo da conta inteira
+        with self.assertNumQueries(4):
+            self._dashboard(dispositivos=[dispositivo_id])
+
+        self.assertEqual(self.contexto['total_leituras'], 15)
+        self.assertEqual(self.contexto['dispositivos_ativos'], 1)
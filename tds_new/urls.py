@@ -70,6 +70,8 @@ urlpatterns = [
     path('telemetria/api/timeline/', telemetria.telemetria_api_grafico_timeline, name='telemetria_api_timeline'),
     path('telemetria/api/barras/', telemetria.telemetria_api_grafico_barras, name='telemetria_api_barras'),
     path('telemetria/api/leituras/', telemetria.telemetria_api_ultimas_leituras, name='telemetria_api_leituras'),
+    path('telemetria/api/stream/', telemetria.telemetria_stream, name='telemetria_api_stream'),
+    path('telemetria/exportar/', telemetria.telemetria_exportar, name='telemetria_exportar'),
     
     # =============================================================================
     # ADMIN SISTEMA (Super Admin Only) - Week 8
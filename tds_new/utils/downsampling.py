@@ -0,0 +1,63 @@
+"""
+Downsampling de séries para gráficos — TDS New
+
+Reduz uma série (x crescente, y) a no máximo N pontos preservando a forma
+visual, para que o payload das APIs de gráfico e o custo de renderização no
+navegador não cresçam com o número de leituras do período.
+
+Algoritmo: Largest-Triangle-Three-Buckets (LTTB, Steinarsson 2013). O primeiro
+e o último ponto são mantidos; os demais são divididos em N-2 buckets e de
+cada bucket fica o ponto que forma o maior triângulo com o ponto escolhido no
+bucket anterior e a média do bucket seguinte. Picos e vales sobrevivem à
+redução, ao contrário de uma média por bucket.
+
+As áreas de cada bucket e as médias de todos os buckets são calculadas com
+NumPy; o laço Python percorre só os N-2 buckets (o ponto escolhido em um
+bucket é entrada do seguinte).
+"""
+
+import numpy as np
+
+
+def lttb(x, y, limite):
+    """
+    Índices dos pontos mantidos pelo LTTB
+
+    Args:
+        x (sequence): Abscissas em ordem crescente (ex.: epoch, índice do bucket)
+        y (sequence): Valores (sem None: remova os gaps antes)
+        limite (int): Máximo de pontos na saída (>= 3 para reduzir)
+
+    Returns:
+        numpy.ndarray: Índices crescentes dos pontos selecionados; todos os
+        índices quando a série já cabe no limite
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if limite >= n or limite < 3:
+        return np.arange(n)
+
+    # Bordas dos N-2 buckets sobre os pontos internos [1, n-1)
+    bordas = np.linspace(1, n - 1, limite - 1).astype(np.intp)
+    tamanhos = np.diff(bordas)
+
+    # Média de cada bucket (ponto C do triângulo) + último ponto para o bucket final
+    medias_x = np.append(np.add.reduceat(x[1:n - 1], bordas[:-1] - 1) / tamanhos, x[-1])
+    medias_y = np.append(np.add.reduceat(y[1:n - 1], bordas[:-1] - 1) / tamanhos, y[-1])
+
+    selecionados = np.empty(limite, dtype=np.intp)
+    selecionados[0] = 0
+    selecionados[-1] = n - 1
+
+    a = 0
+    for k in range(limite - 2):
+        inicio, fim = bordas[k], bordas[k + 1]
+        ax, ay = x[a], y[a]
+        cx, cy = medias_x[k + 1], medias_y[k + 1]
+        # Dobro da área do triângulo (A, candidato, C); a constante não muda o argmax
+        areas = np.abs((ax - cx) * (y[inicio:fim] - ay) - (ax - x[inicio:fim]) * (cy - ay))
+        a = inicio + int(np.argmax(areas))
+        selecionados[k + 1] = a
+
+    return selecionados
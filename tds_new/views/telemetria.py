@@ -8,20 +8,167 @@ Criado em: 18/02/2026
 
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.db.models import Q, Max, Avg, Count
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+from django.core.cache import caches
+from asgiref.sync import sync_to_async
+from django.db.models import Q, Max, Count
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 from decimal import Decimal
+import asyncio
+import hashlib
 import json
+import time
 
 from ..models import LeituraDispositivo, Dispositivo, Gateway
+from ..services.consumo import motor_consumo
+from ..services.exportacao import FORMATOS, exportar, exportar_async, leituras_periodo
+from ..services.latest_cache import cache_ultimas
+from ..services.live_feed import RESYNC, distribuidor, push_disponivel
+from ..services.query_router import alinhar, buckets_periodo, densificar, query_router
+from ..utils.downsampling import lttb
 from ..constants import Cenarios
 
 import logging
 logger = logging.getLogger(__name__)
 
 
+# Bucket da série detalhada (timeline com max_points): 5 min das leituras
+# brutas em 24h, agregado horário em 7d/30d
+_LARGURA_DETALHE = {
+    '24h': timedelta(minutes=5),
+    '7d': timedelta(hours=1),
+    '30d': timedelta(hours=1),
+}
+
+
+def _com_dispositivo(conta_id, leituras):
+    """
+    Completa leituras do cache de últimas leituras com dispositivo__codigo e
+    dispositivo__nome (mesmo formato do values() sobre a hypertable)
+    """
+    dispositivos = {
+        id_: (codigo, nome) for id_, codigo, nome in Dispositivo.objects.filter(
+            conta_id=conta_id,
+            id__in={leitura['dispositivo_id'] for leitura in leituras}
+        ).values_list('id', 'codigo', 'nome')
+    }
+    
+    completas = []
+    for leitura in leituras:
+        if leitura['dispositivo_id'] not in dispositivos:
+            continue  # Dispositivo removido após a leitura
+        codigo, nome = dispositivos[leitura['dispositivo_id']]
+        completas.append({**leitura, 'dispositivo__codigo': codigo, 'dispositivo__nome': nome})
+    return completas
+
+
+# =============================================================================
+# GET CONDICIONAL (ETag / Last-Modified pelo watermark de ingestão)
+# =============================================================================
+
+def _watermark(request):
+    """
+    Watermark de ingestão e versão do cadastro da conta da sessão (lidos uma
+    vez por request)
+    
+    Returns:
+        tuple | None: (watermark, versão do cadastro); None sem cache
+    """
+    if not hasattr(request, '_watermark_telemetria'):
+        conta_id = request.session.get('conta_ativa_id')
+        marcas = None
+        if conta_id:
+            marcas = (cache_ultimas.watermark(conta_id), cache_ultimas.versao_cadastro(conta_id))
+            if None in marcas:
+                marcas = None
+        request._watermark_telemetria = marcas
+    return request._watermark_telemetria
+
+
+def _janela_resposta(request):
+    """
+    Segundos em que início e buckets da resposta ficam parados: a largura
+    da série detalhada (?max_points, 5 min em 24h) ou 1 hora (demais séries,
+    alinhadas à hora ou ao dia)
+    """
+    if request.GET.get('max_points'):
+        largura = _LARGURA_DETALHE.get(request.GET.get('periodo', '24h'), _LARGURA_DETALHE['24h'])
+        return int(largura.total_seconds())
+    return 3600
+
+
+def _etag_telemetria(request, *args, **kwargs):
+    """
+    ETag das APIs do dashboard: conta + watermark + versão do cadastro + URL
+    + janela atual
+    
+    Os períodos são relativos a agora, mas início e buckets só avançam na
+    virada da janela (_janela_resposta: 5 min na timeline detalhada de 24h,
+    1 hora nas demais); sem commit novo nem alteração de dispositivos na
+    conta a resposta é a mesma dentro da janela e o condition() devolve 304
+    sem executar a view.
+    """
+    marcas = _watermark(request)
+    if marcas is None:
+        return None  # Cache indisponível: sem GET condicional
+    
+    marca, cadastro = marcas
+    chave = (
+        f"{request.session.get('conta_ativa_id')}|{marca:.6f}|{cadastro:.6f}|{request.path}|"
+        f"{request.GET.urlencode()}|{int(time.time() // _janela_resposta(request))}"
+    )
+    return hashlib.md5(chave.encode()).hexdigest()
+
+
+def _last_modified_telemetria(request, *args, **kwargs):
+    """Maior entre watermark, versão do cadastro e início da janela atual (mesma regra do ETag)"""
+    marcas = _watermark(request)
+    if marcas is None:
+        return None
+    janela = _janela_resposta(request)
+    return datetime.fromtimestamp(max(*marcas, time.time() // janela * janela), tz=dt_timezone.utc)
+
+
+def _get_condicional(view):
+    """Revalidação obrigatória a cada poll (no-cache) + 304 pelo watermark"""
+    view = condition(etag_func=_etag_telemetria, last_modified_func=_last_modified_telemetria)(view)
+    return cache_control(private=True, no_cache=True)(view)
+
+
+def _resumo_dashboard(conta_id, periodo, data_inicio, dispositivo_ids):
+    """
+    Widgets de resumo do dashboard: total de leituras, dispositivos ativos,
+    última leitura e gateways online
+    
+    Total, dispositivos e última leitura saem de uma única query agregada
+    (QueryRouter.resumir: agregado horário + cauda bruta, início alinhado à
+    hora). O resultado é memoizado no cache 'default' por
+    (conta, período, dispositivos) durante TELEMETRY_RESUMO_TTL_S segundos:
+    abas abertas e recargas seguidas não repetem a agregação.
+    """
+    ids = sorted({int(i) for i in dispositivo_ids})
+    referencia = data_inicio.isoformat() if periodo not in ('24h', '7d', '30d') else ''
+    chave = f"tds_new:resumo:{conta_id}:{periodo}:{referencia}:{','.join(map(str, ids))}"
+    
+    cache = caches['default']
+    resumo = cache.get(chave)
+    if resumo is None:
+        total, ativos, ultima = query_router.resumir(conta_id, data_inicio, dispositivo_ids=ids)
+        resumo = {
+            'total_leituras': total,
+            'dispositivos_ativos': ativos,
+            'ultima_leitura': ultima,
+            'gateways_online': Gateway.objects.filter(conta_id=conta_id, is_online=True).count(),
+        }
+        cache.set(chave, resumo, getattr(settings, 'TELEMETRY_RESUMO_TTL_S', 5))
+    return resumo
+
+
 @login_required
 def telemetria_dashboard(request):
     """
@@ -39,7 +186,7 @@ def telemetria_dashboard(request):
     - Tipo de grandeza (kWh, m³, °C, etc.)
     
     Integração:
-    - AJAX polling a cada 30s para atualização automática
+    - Push via SSE (telemetria_stream); AJAX polling a cada 30s como fallback
     - Chart.js para gráficos interativos
     """
     # Configurar título via sessão
@@ -87,33 +234,28 @@ def telemetria_dashboard(request):
     if dispositivo_ids:
         leituras_queryset = leituras_queryset.filter(dispositivo_id__in=dispositivo_ids)
     
-    # Métricas de resumo
-    total_leituras = leituras_queryset.count()
-    
-    # Dispositivos com leituras no período (ativos)
-    dispositivos_ativos = leituras_queryset.values('dispositivo_id').distinct().count()
-    
-    # Última leitura (timestamp)
-    ultima_leitura_obj = leituras_queryset.order_by('-time').first()
-    ultima_atualizacao = ultima_leitura_obj.time if ultima_leitura_obj else None
+    # Métricas de resumo (uma query agregada, memoizada por alguns segundos)
+    resumo = _resumo_dashboard(conta_id, periodo, data_inicio, dispositivo_ids)
     
-    # Gateway online count
-    gateways_online = Gateway.objects.filter(
-        conta_id=conta_id,
-        is_online=True
-    ).count()
-    
-    # Últimas 10 leituras para tabela
-    ultimas_leituras = leituras_queryset.order_by('-time')[:10].values(
-        'time',
-        'dispositivo__codigo',
-        'dispositivo__nome',
-        'valor',
-        'unidade'
+    # Última leitura (timestamp): cache de últimas leituras é mais recente que o resumo
+    encontrado, ultima_atualizacao = cache_ultimas.ultima_atualizacao(
+        conta_id, dispositivo_ids, desde=data_inicio
     )
+    if not encontrado:
+        ultima_atualizacao = resumo['ultima_leitura']
     
-    # Converter para lista para template
-    ultimas_leituras_list = list(ultimas_leituras)
+    # Últimas 10 leituras para tabela (cache; hypertable no miss)
+    ultimas_leituras = cache_ultimas.ultimas(conta_id, dispositivo_ids, limite=10, desde=data_inicio)
+    if ultimas_leituras is not None:
+        ultimas_leituras_list = _com_dispositivo(conta_id, ultimas_leituras)
+    else:
+        ultimas_leituras_list = list(leituras_queryset.order_by('-time')[:10].values(
+            'time',
+            'dispositivo__codigo',
+            'dispositivo__nome',
+            'valor',
+            'unidade'
+        ))
     
     # Todos os dispositivos da conta (para dropdown de filtro)
     todos_dispositivos = Dispositivo.objects.filter(
@@ -121,10 +263,10 @@ def telemetria_dashboard(request):
     ).values('id', 'codigo', 'nome', 'tipo')
     
     context = {
-        'total_leituras': total_leituras,
-        'dispositivos_ativos': dispositivos_ativos,
+        'total_leituras': resumo['total_leituras'],
+        'dispositivos_ativos': resumo['dispositivos_ativos'],
         'ultima_atualizacao': ultima_atualizacao,
-        'gateways_online': gateways_online,
+        'gateways_online': resumo['gateways_online'],
         'ultimas_leituras': ultimas_leituras_list,
         'todos_dispositivos': list(todos_dispositivos),
         'periodo_selecionado': periodo,
@@ -135,11 +277,18 @@ def telemetria_dashboard(request):
 
 
 @login_required
+@_get_condicional
 def telemetria_api_grafico_timeline(request):
     """
     API AJAX: Dados para gráfico de linha (timeline)
     
-    Retorna JSON com série temporal de consumo agrupado por hora.
+    Retorna JSON com série temporal da média por bucket (1h em 24h, 6h em 7d,
+    1 dia em 30d). Todos os buckets do período aparecem em labels; cada
+    dataset é denso (mesmo tamanho de labels, null onde não houve leitura).
+    
+    Com ?max_points=N a série é detalhada (5 min em 24h, 1h em 7d/30d) e
+    cada dataset traz no máximo N pontos {x: índice em labels, y}, escolhidos
+    por LTTB (utils/downsampling.py); "reduzido": true na resposta.
     
     Formato:
     {
@@ -178,81 +327,79 @@ def telemetria_api_grafico_timeline(request):
         data_inicio = now - timedelta(hours=24)
         intervalo_horas = 1
     
-    # Query base
-    leituras_queryset = LeituraDispositivo.objects.filter(
-        conta_id=conta_id,
-        time__gte=data_inicio
-    ).select_related('dispositivo')
-    
-    if dispositivo_ids:
-        leituras_queryset = leituras_queryset.filter(dispositivo_id__in=dispositivo_ids)
+    # max_points: série detalhada reduzida por LTTB (payload limitado por dispositivo)
+    max_points = request.GET.get('max_points')
+    if max_points:
+        try:
+            max_points = min(max(int(max_points), 3), getattr(settings, 'TELEMETRY_TIMELINE_MAX_POINTS', 1000))
+        except ValueError:
+            return JsonResponse({'error': 'max_points inválido'}, status=400)
+        largura = _LARGURA_DETALHE.get(periodo, _LARGURA_DETALHE['24h'])
+    else:
+        largura = timedelta(hours=intervalo_horas)
+    
+    # Série por (bucket, dispositivo): continuous aggregate + cauda bruta (query_router)
+    pontos = query_router.consultar_serie(
+        conta_id,
+        data_inicio,
+        largura,
+        fim=now,
+        dispositivo_ids=dispositivo_ids
+    )
     
-    # Agrupar por dispositivo e hora
-    from django.db.models.functions import TruncHour
-    from collections import defaultdict
-    
-    # Truncar timestamp para hora
-    leituras_agrupadas = leituras_queryset.annotate(
-        hora=TruncHour('time')
-    ).values('hora', 'dispositivo__codigo', 'dispositivo__nome').annotate(
-        valor_medio=Avg('valor')
-    ).order_by('hora', 'dispositivo__codigo')
-    
-    # Estruturar dados para Chart.js
-    series_por_dispositivo = defaultdict(lambda: {'label': '', 'data': [], 'horas': []})
-    
-    for registro in leituras_agrupadas:
-        codigo = registro['dispositivo__codigo']
-        nome = registro['dispositivo__nome']
-        hora = registro['hora']
-        valor = float(registro['valor_medio'])
-        
-        if not series_por_dispositivo[codigo]['label']:
-            series_por_dispositivo[codigo]['label'] = f"{codigo} - {nome}"
-        
-        series_por_dispositivo[codigo]['horas'].append(hora.isoformat())
-        series_por_dispositivo[codigo]['data'].append(round(valor, 2))
+    # Eixo com todos os buckets do período e uma série densa por dispositivo
+    # (None nos buckets sem leitura = gap no gráfico)
+    buckets = buckets_periodo(data_inicio, now, largura)
+    series = densificar(pontos, buckets, valor=lambda p: round(float(p.soma / p.contagem), 2))
+    contagens = densificar(pontos, buckets, valor=lambda p: p.contagem)
     
-    # Gerar labels únicos (todas as horas)
-    todas_horas = sorted(set(
-        h for serie in series_por_dispositivo.values() for h in serie['horas']
-    ))
+    dispositivos = Dispositivo.objects.filter(
+        conta_id=conta_id,
+        id__in=series.keys()
+    ).order_by('codigo').values_list('id', 'codigo', 'nome')
     
     # Datasets formatados para Chart.js
     cores = ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', '#FF9F40']
     datasets = []
     
-    for idx, (codigo, serie) in enumerate(series_por_dispositivo.items()):
-        # Preencher valores ausentes com None (para gaps no gráfico)
-        data_completa = []
-        for hora in todas_horas:
-            try:
-                pos = serie['horas'].index(hora)
-                data_completa.append(serie['data'][pos])
-            except ValueError:
-                data_completa.append(None)  # Gap
-        
-        datasets.append({
-            'label': serie['label'],
-            'data': data_completa,
+    for idx, (dispositivo_id, codigo, nome) in enumerate(dispositivos):
+        dataset = {
+            'label': f"{codigo} - {nome}",
+            'dispositivo_id': dispositivo_id,
             'borderColor': cores[idx % len(cores)],
             'backgroundColor': cores[idx % len(cores)] + '33',  # 20% opacity
             'fill': False,
             'tension': 0.4  # Curva suave
-        })
+        }
+        if max_points:
+            # Pontos esparsos {x: índice do label, y}: só os buckets com leitura, reduzidos
+            indices = [i for i, valor in enumerate(series[dispositivo_id]) if valor is not None]
+            valores = [series[dispositivo_id][i] for i in indices]
+            mantidos = lttb(indices, valores, max_points)
+            dataset['data'] = [{'x': indices[k], 'y': valores[k]} for k in mantidos]
+        else:
+            dataset['data'] = series[dispositivo_id]
+            dataset['contagens'] = contagens[dispositivo_id]  # atualização incremental da média (stream)
+        datasets.append(dataset)
     
     return JsonResponse({
-        'labels': todas_horas,
+        'labels': [bucket.isoformat() for bucket in buckets],
+        'largura_s': int(largura.total_seconds()),
+        'reduzido': bool(max_points),
         'datasets': datasets
     })
 
 
 @login_required
+@_get_condicional
 def telemetria_api_grafico_barras(request):
     """
     API AJAX: Dados para gráfico de barras (consumo por dispositivo)
     
-    Agrupa consumo total por dispositivo no período selecionado.
+    Agrupa consumo total por dispositivo no período selecionado. Medidores
+    (tipo MEDIDOR, leitura acumulada) usam o motor de consumo: diferença
+    entre leituras com tratamento de zeramento, a partir dos extremos por
+    hora. Demais dispositivos: soma das leituras.
     
     Formato:
     {
@@ -272,47 +419,62 @@ def telemetria_api_grafico_barras(request):
     periodo = request.GET.get('periodo', '24h')
     dispositivo_ids = request.GET.getlist('dispositivos')
     
-    # Calcular range de datas
+    # Calcular range de datas (início alinhado à hora: resposta estável dentro
+    # da hora, condição do GET condicional)
     now = timezone.now()
     if periodo == '24h':
-        data_inicio = now - timedelta(hours=24)
+        data_inicio = alinhar(now - timedelta(hours=24), timedelta(hours=1))
     elif periodo == '7d':
-        data_inicio = now - timedelta(days=7)
+        data_inicio = alinhar(now - timedelta(days=7), timedelta(hours=1))
     elif periodo == '30d':
-        data_inicio = now - timedelta(days=30)
+        data_inicio = alinhar(now - timedelta(days=30), timedelta(hours=1))
     else:
-        data_inicio = now - timedelta(hours=24)
+        data_inicio = alinhar(now - timedelta(hours=24), timedelta(hours=1))
+    
+    # Medidores acumulados: consumo = diferença entre leituras (motor de consumo)
+    medidores = Dispositivo.objects.filter(conta_id=conta_id, tipo='MEDIDOR')
+    if dispositivo_ids:
+        medidores = medidores.filter(id__in=dispositivo_ids)
+    medidores = {id_: codigo for id_, codigo in medidores.values_list('id', 'codigo')}
+    
+    registros = []
+    if medidores:
+        totais = motor_consumo.consumo_total(conta_id, data_inicio, fim=now, dispositivo_ids=list(medidores))
+        for dispositivo_id, total in totais.items():
+            registros.append((medidores[dispositivo_id], float(total.consumo), float(total.ultimo)))
     
-    # Query
+    # Demais dispositivos: soma das leituras do período
     from django.db.models import Sum
     consumo_por_dispositivo = LeituraDispositivo.objects.filter(
         conta_id=conta_id,
         time__gte=data_inicio
+    ).exclude(
+        dispositivo_id__in=medidores.keys()
     ).values(
         'dispositivo__codigo',
         'dispositivo__nome',
         'unidade'
     ).annotate(
         total=Sum('valor')
-    ).order_by('-total')
+    )
     
     if dispositivo_ids:
         consumo_por_dispositivo = consumo_por_dispositivo.filter(dispositivo_id__in=dispositivo_ids)
     
+    for registro in consumo_por_dispositivo:
+        registros.append((registro['dispositivo__codigo'], float(registro['total']), None))
+    
     # Estruturar dados
     labels = []
     data = []
+    ultimos = []
     cores = ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', '#FF9F40']
     backgrounds = []
     
-    for idx, registro in enumerate(consumo_por_dispositivo):
-        codigo = registro['dispositivo__codigo']
-        nome = registro['dispositivo__nome']
-        total = float(registro['total'])
-        unidade = registro['unidade']
-        
+    for idx, (codigo, total, ultimo) in enumerate(sorted(registros, key=lambda r: -r[1])):
         labels.append(f"{codigo}")
         data.append(round(total, 2))
+        ultimos.append(ultimo)  # Leitura acumulada (medidores): delta incremental no stream
         backgrounds.append(cores[idx % len(cores)])
     
     return JsonResponse({
@@ -320,12 +482,14 @@ def telemetria_api_grafico_barras(request):
         'datasets': [{
             'label': 'Consumo Total',
             'data': data,
+            'ultimos': ultimos,
             'backgroundColor': backgrounds
         }]
     })
 
 
 @login_required
+@_get_condicional
 def telemetria_api_ultimas_leituras(request):
     """
     API AJAX: Últimas 10 leituras (para atualização da tabela)
@@ -352,19 +516,23 @@ def telemetria_api_ultimas_leituras(request):
     # Filtros
     dispositivo_ids = request.GET.getlist('dispositivos')
     
-    # Query
-    queryset = LeituraDispositivo.objects.filter(conta_id=conta_id)
-    
-    if dispositivo_ids:
-        queryset = queryset.filter(dispositivo_id__in=dispositivo_ids)
-    
-    ultimas = queryset.order_by('-time')[:10].values(
-        'time',
-        'dispositivo__codigo',
-        'dispositivo__nome',
-        'valor',
-        'unidade'
-    )
+    # Cache mantido pela ingestão; hypertable só no miss
+    ultimas = cache_ultimas.ultimas(conta_id, dispositivo_ids, limite=10)
+    if ultimas is not None:
+        ultimas = _com_dispositivo(conta_id, ultimas)
+    else:
+        queryset = LeituraDispositivo.objects.filter(conta_id=conta_id)
+        
+        if dispositivo_ids:
+            queryset = queryset.filter(dispositivo_id__in=dispositivo_ids)
+        
+        ultimas = queryset.order_by('-time')[:10].values(
+            'time',
+            'dispositivo__codigo',
+            'dispositivo__nome',
+            'valor',
+            'unidade'
+        )
     
     leituras_list = []
     for leitura in ultimas:
@@ -380,3 +548,104 @@ def telemetria_api_ultimas_leituras(request):
         'leituras': leituras_list,
         'timestamp': timezone.now().isoformat()
     })
+
+
+@login_required
+async def telemetria_stream(request):
+    """
+    Stream SSE (text/event-stream): leituras da conta assim que a ingestão
+    as commita (tds_new/services/live_feed.py)
+    
+    Eventos:
+    - pronto: stream aberto
+    - leituras: {"leituras": [[dispositivo_id, time, valor, unidade], ...]}
+    - resync: eventos perdidos, o cliente recarrega os dados completos
+    - comentário ": ping" a cada TELEMETRY_SSE_HEARTBEAT_S (mantém proxies abertos)
+    
+    Requer servidor ASGI (uvicorn/daphne) e USE_REDIS; caso contrário responde
+    204 e o dashboard volta ao polling.
+    """
+    if not isinstance(request, ASGIRequest) or not push_disponivel():
+        return HttpResponse(status=204)
+    
+    conta_id = await sync_to_async(request.session.get)('conta_ativa_id')
+    if not conta_id:
+        return JsonResponse({'error': 'Sessão inválida'}, status=401)
+    
+    heartbeat = getattr(settings, 'TELEMETRY_SSE_HEARTBEAT_S', 15)
+    
+    async def eventos():
+        fila = distribuidor.assinar(conta_id)
+        try:
+            yield 'retry: 5000\nevent: pronto\ndata: {}\n\n'
+            while True:
+                try:
+                    dados = await asyncio.wait_for(fila.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                
+                if dados is RESYNC:
+                    yield 'event: resync\ndata: {}\n\n'
+                else:
+                    yield f"event: leituras\ndata: {dados.decode()}\n\n"
+        finally:
+            distribuidor.cancelar(conta_id, fila)
+    
+    response = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: não bufferizar o stream
+    return response
+
+
+@login_required
+def telemetria_exportar(request):
+    """
+    Exportação das leituras da conta em streaming (CSV ou NDJSON, gzip)
+    
+    Parâmetros GET:
+    - data_inicio, data_fim: ISO 8601 (obrigatórios; período [inicio, fim))
+    - formato: csv (padrão) | ndjson
+    - gzip: 1 (padrão) | 0
+    - dispositivos: filtro (lista de IDs)
+    
+    Memória constante: cursor nomeado no PostgreSQL e blocos de
+    TELEMETRY_EXPORT_CHUNK linhas (tds_new/services/exportacao.py).
+    Linha de comando: python manage.py exportar_leituras
+    """
+    conta_id = request.session.get('conta_ativa_id')
+    if not conta_id:
+        return JsonResponse({'error': 'Sessão inválida'}, status=401)
+    
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        return JsonResponse({'error': f"Formato inválido (use {', '.join(FORMATOS)})"}, status=400)
+    comprimir = request.GET.get('gzip', '1') != '0'
+    
+    try:
+        periodo = []
+        for nome in ('data_inicio', 'data_fim'):
+            instante = datetime.fromisoformat(request.GET[nome])
+            periodo.append(timezone.make_aware(instante) if timezone.is_naive(instante) else instante)
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'data_inicio e data_fim (ISO 8601) são obrigatórios'}, status=400)
+    data_inicio, data_fim = periodo
+    
+    gerador = exportar(
+        leituras_periodo(conta_id, data_inicio, data_fim, request.GET.getlist('dispositivos')),
+        formato,
+        comprimir
+    )
+    if isinstance(request, ASGIRequest):
+        gerador = exportar_async(gerador)
+    
+    nome_arquivo = f"leituras_{conta_id}_{data_inicio:%Y%m%d}_{data_fim:%Y%m%d}.{formato}" + ('.gz' if comprimir else '')
+    logger.info(f"[EXPORT] conta={conta_id} usuario={request.user} {nome_arquivo}")
+    
+    response = StreamingHttpResponse(
+        gerador,
+        content_type='application/gzip' if comprimir else f"{FORMATOS[formato]}; charset=utf-8"
+    )
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    response['X-Accel-Buffering'] = 'no'  # nginx: não bufferizar o download
+    return response